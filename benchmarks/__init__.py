@@ -0,0 +1,30 @@
+"""
+Performance benchmarks for the sending and scheduling paths.
+
+Every module can be run on its own, e.g. `python -m benchmarks.send_paths --help`.
+"""
+import os
+from contextlib import contextmanager
+
+
+def setup_django() -> None:
+    """Configures Django with the project settings so benchmarks can be run as plain scripts."""
+    import django
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mailing_service.settings')
+    django.setup()
+
+
+@contextmanager
+def test_database():
+    """Creates a throwaway test database (like the test runner does) for benchmarks that need rows."""
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
@@ -0,0 +1,46 @@
+"""
+Measures async engine throughput for several connection pool sizes against an SMTP sink with artificial latency.
+
+    python -m benchmarks.async_engine --count 5000 --latency 0.002 --connections 10 50 100
+"""
+import argparse
+import json
+
+from . import setup_django
+from .smtp_sink import SMTPSink
+
+
+def run(count: int = 2000, latency: float = 0.002, connections: tuple[int, ...] = (10, 50, 100),
+        per_host: int = 100) -> dict:
+    from django.test import override_settings
+
+    from core.async_delivery import send_async
+
+    recipients = [f"user{n}@example{n % 20}.com" for n in range(count)]
+    results = {"count": count, "latency": latency, "per_host": per_host, "runs": []}
+
+    with SMTPSink(latency=latency) as sink, override_settings(
+            EMAIL_HOST=sink.server_address[0], EMAIL_PORT=sink.port, EMAIL_USE_TLS=False, EMAIL_USE_SSL=False):
+        for connection_count in connections:
+            sink.reset()
+            report = send_async("Subject", "Body", recipients, connections=connection_count, per_host=per_host)
+            results["runs"].append({"connections": connection_count, "seconds": report.elapsed,
+                                    "messages_per_sec": report.rate, "delivered": sink.messages})
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.002, help="Seconds slept before each SMTP reply")
+    parser.add_argument("--connections", type=int, nargs="+", default=[10, 50, 100])
+    parser.add_argument("--per-host", type=int, default=100)
+    args = parser.parse_args()
+
+    setup_django()
+    print(json.dumps(run(args.count, args.latency, tuple(args.connections), args.per_host), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Compares the old in-Python due check of send_dispatches with the indexed `Dispatch.objects.due()` scan.
+
+    python -m benchmarks.due_scan --dispatches 100000 --due 100
+"""
+import argparse
+import datetime
+import json
+import time
+
+from . import setup_django, test_database
+
+
+def seed_dispatches(count: int, due: int, text_size: int = 2000, offset: int = 0) -> None:
+    """
+    Creates `count` dispatches with a large text, `due` of them already due and the rest due tomorrow.
+
+    Titles are numbered from `offset`, so more dispatches can be added to an earlier seed.
+    """
+    from django.utils.timezone import now
+
+    from core.models import Dispatch
+
+    moment = now()
+    Dispatch.objects.bulk_create(
+        (Dispatch(title=f"Dispatch {offset + n}", subject="Subject", text="x" * text_size,
+                  next_due_at=moment - datetime.timedelta(minutes=1) if n < due else moment + datetime.timedelta(days=1))
+         for n in range(count)),
+        batch_size=5000,
+    )
+
+
+def run(dispatches: int = 100_000, due: int = 100, repeat: int = 3) -> dict:
+    from core.models import Dispatch
+
+    results = {"dispatches": dispatches, "due": due}
+    with test_database():
+        seed_dispatches(dispatches, due)
+
+        def best_of(scan) -> float:
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                found = scan()
+                timings.append(time.perf_counter() - started)
+                assert len(found) == due
+            return min(timings)
+
+        results["python_scan_seconds"] = best_of(lambda: [d for d in Dispatch.objects.all() if d.is_due()])
+        results["indexed_scan_seconds"] = best_of(lambda: list(Dispatch.objects.due().values_list("pk", flat=True)))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dispatches", type=int, default=100_000)
+    parser.add_argument("--due", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    setup_django()
+    print(json.dumps(run(args.dispatches, args.due, args.repeat), indent=2))
+
+
+if __name__ == "__main__":
+    main()
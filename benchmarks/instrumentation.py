@@ -0,0 +1,66 @@
+"""
+Overhead of the hot-path metrics of `core.metrics` on sending.
+
+Times the instrumentation a message goes through (timer reads and histogram observations) on its own,
+then sends through `send_batched` to a local SMTP sink with the registry enabled and disabled,
+alternating the two for `--rounds` rounds and comparing the fastest of each.
+
+    python -m benchmarks.instrumentation --count 5000 --rounds 5
+"""
+import argparse
+import json
+import time
+
+from . import setup_django
+from .smtp_sink import SMTPSink
+
+
+def run(count: int = 5000, rounds: int = 5) -> dict:
+    from django.test import override_settings
+
+    from core.delivery import send_batched
+    from core.metrics import MESSAGE_BUILD_SECONDS, SMTP_SEND_SECONDS, registry
+
+    results = {"count": count, "rounds": rounds}
+
+    # Per message: three timer reads around building and sending, one observation of each
+    started = time.perf_counter()
+    for _ in range(count):
+        build_started = time.perf_counter()
+        send_started = time.perf_counter()
+        MESSAGE_BUILD_SECONDS.observe(send_started - build_started)
+        SMTP_SEND_SECONDS.observe(time.perf_counter() - send_started)
+    results["instrumentation_microseconds_per_message"] = (time.perf_counter() - started) / count * 1e6
+    registry.collect()
+
+    recipients = [f"user{n}@example.com" for n in range(count)]
+    best = {True: float("inf"), False: float("inf")}
+    with SMTPSink() as sink, override_settings(
+            EMAIL_BACKEND="django.core.mail.backends.smtp.EmailBackend",
+            EMAIL_HOST=sink.server_address[0], EMAIL_PORT=sink.port, EMAIL_USE_TLS=False):
+        for _ in range(rounds):
+            for enabled in (True, False):
+                registry.enabled = enabled
+                report = send_batched("Subject", "Body", recipients, recipients_per_message=1)
+                best[enabled] = min(best[enabled], report.elapsed)
+        registry.enabled = True
+    registry.collect()
+
+    results["enabled_microseconds_per_message"] = best[True] / count * 1e6
+    results["disabled_microseconds_per_message"] = best[False] / count * 1e6
+    results["overhead_percent"] = (best[True] - best[False]) / best[False] * 100
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=5000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+    print(json.dumps(run(args.count, args.rounds), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Recomputing `next_due_at` of many dispatches: one `update_next_due_at(save=True)` per dispatch against
+the single UPDATE of `Dispatch.objects.recompute_next_due_at()`, plus the queries of a plain `save()`.
+
+The per-instance path is timed on `--sample` dispatches and extrapolated to all of them.
+
+    python -m benchmarks.next_due --dispatches 100000 --sample 2000
+"""
+import argparse
+import datetime
+import json
+import random
+import time
+
+from . import setup_django, test_database
+
+
+def seed(count: int, seed: int = 42) -> None:
+    """`count` active dispatches, each with its own scheduler like the sample data, at quarter-hour times."""
+    from django.utils.timezone import now
+
+    from core.models import Dispatch, Scheduler
+
+    generator = random.Random(seed)
+    frequencies = [frequency for frequency, _ in Scheduler.FREQUENCY_CHOICES]
+    for offset in range(0, count, 10_000):
+        size = min(10_000, count - offset)
+        schedulers = Scheduler.objects.bulk_create(
+            Scheduler(frequency=generator.choice(frequencies),
+                      time_of_day=datetime.time(generator.randrange(24), generator.choice((0, 15, 30, 45))))
+            for _ in range(size))
+        Dispatch.objects.bulk_create(
+            Dispatch(title=f"Next due {offset + n}", subject="Subject", text="Text", scheduler=scheduler,
+                     next_due_at=now())
+            for n, scheduler in enumerate(schedulers))
+
+
+def run(dispatches: int = 100_000, sample: int = 2000) -> dict:
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    from core.models import Dispatch
+
+    results = {"dispatches": dispatches, "sample": sample}
+    with test_database():
+        seed(dispatches)
+
+        loaded = list(Dispatch.objects.select_related('scheduler').order_by('pk')[:sample])
+        started = time.perf_counter()
+        for dispatch in loaded:
+            dispatch.update_next_due_at(save=True)
+        elapsed = time.perf_counter() - started
+        results["per_instance"] = {"sample_seconds": elapsed, "per_second": sample / elapsed,
+                                   "estimated_seconds": elapsed / sample * dispatches}
+
+        started = time.perf_counter()
+        moved = Dispatch.objects.recompute_next_due_at()
+        elapsed = time.perf_counter() - started
+        results["bulk"] = {"seconds": elapsed, "per_second": moved / elapsed, "moved": moved}
+
+        dispatch = Dispatch.objects.first()
+        dispatch.title += " renamed"
+        with CaptureQueriesContext(connection) as queries:
+            dispatch.save()
+        results["queries_per_save"] = len(queries)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dispatches", type=int, default=100_000)
+    parser.add_argument("--sample", type=int, default=2000)
+    args = parser.parse_args()
+
+    setup_django()
+    print(json.dumps(run(args.dispatches, args.sample), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Send curve of dispatches that all become due at the same time of day, with and without load smoothing.
+
+Seeds `--dispatches` dispatches of `--recipients` recipients each on one "daily" scheduler, paces them over
+`--window` minutes with a relay taking `--capacity` messages per second, and reports the messages per slot
+(peak, mean, slots used), the expected finish of each priority and the time spent pacing. Without a window
+every message is due in the first slot.
+
+    python -m benchmarks.pacing --dispatches 10 --recipients 20000 --window 60 --capacity 100
+"""
+import argparse
+import datetime
+import json
+import time
+from collections import Counter
+
+from . import setup_django, test_database
+
+
+def run(dispatches: int = 10, recipients: int = 20_000, window: int = 60, capacity: float = 100.0) -> dict:
+    from django.test import override_settings
+    from django.utils.timezone import now
+
+    from core.models import DeliveryItem, Dispatch, Scheduler, SendList
+    from core.outbox import create_job
+    from core.pacing import pace_job
+    from .recipient_memory import grow_send_list
+
+    results = {"dispatches": dispatches, "recipients": recipients, "window_minutes": window, "capacity": capacity}
+    with test_database(), override_settings(DISPATCH_RELAY_CAPACITY=capacity):
+        send_list = SendList.objects.create(title="Benchmark")
+        grow_send_list(send_list, 0, recipients)
+        scheduler = Scheduler.objects.create(frequency="daily", time_of_day=datetime.time(9), send_window=window)
+        created = [Dispatch.objects.create(title=f"Dispatch {n}", subject="Subject", text="Text", send_list=send_list,
+                                           scheduler=scheduler, priority=n % 3)
+                   for n in range(dispatches)]
+
+        moment = now()
+        jobs = []
+        started = time.perf_counter()
+        for dispatch in sorted(created, key=lambda dispatch: -dispatch.priority):
+            job = create_job(dispatch)
+            pace_job(job, moment)
+            jobs.append(job)
+        results["pacing_seconds"] = time.perf_counter() - started
+
+        slots = Counter(DeliveryItem.objects.values_list('retry_at', flat=True))
+        total = sum(slots.values())
+        results["paced"] = {
+            "slots": len(slots),
+            "peak_per_slot": max(slots.values()),
+            "mean_per_slot": total / len(slots),
+            "finish_minutes_by_priority": {
+                label: max((job.expected_finish_at - moment).total_seconds() / 60
+                           for job in jobs if job.dispatch.priority == priority)
+                for priority, label in Dispatch.PRIORITY_CHOICES if priority < dispatches},
+        }
+        results["burst"] = {"slots": 1, "peak_per_slot": total, "mean_per_slot": total}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dispatches", type=int, default=10)
+    parser.add_argument("--recipients", type=int, default=20_000)
+    parser.add_argument("--window", type=int, default=60, help="Send window in minutes")
+    parser.add_argument("--capacity", type=float, default=100.0, help="Relay capacity in messages per second")
+    args = parser.parse_args()
+
+    setup_django()
+    print(json.dumps(run(args.dispatches, args.recipients, args.window, args.capacity), indent=2))
+
+
+if __name__ == "__main__":
+    main()
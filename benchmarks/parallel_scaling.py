@@ -0,0 +1,49 @@
+"""
+Measures how the parallel engine scales with worker count against an SMTP sink with artificial latency.
+
+    python -m benchmarks.parallel_scaling --count 2000 --latency 0.002 --workers 1 2 4 8
+"""
+import argparse
+import json
+
+from . import setup_django
+from .smtp_sink import SMTPSink
+
+
+def run(count: int = 1000, latency: float = 0.002, workers: tuple[int, ...] = (1, 2, 4, 8),
+        pool: str = "thread", chunk_size: int = 100) -> dict:
+    from django.test import override_settings
+
+    from core.parallel import send_parallel
+
+    recipients = [f"user{n}@example.com" for n in range(count)]
+    results = {"count": count, "latency": latency, "pool": pool, "chunk_size": chunk_size, "runs": []}
+
+    with SMTPSink(latency=latency) as sink, override_settings(
+            EMAIL_BACKEND="django.core.mail.backends.smtp.EmailBackend",
+            EMAIL_HOST=sink.server_address[0], EMAIL_PORT=sink.port, EMAIL_USE_TLS=False):
+        for worker_count in workers:
+            sink.reset()
+            report = send_parallel("Subject", "Body", recipients, workers=worker_count, pool=pool,
+                                   chunk_size=chunk_size)
+            results["runs"].append({"workers": worker_count, "seconds": report.elapsed,
+                                    "messages_per_sec": report.rate, "delivered": sink.messages})
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.002, help="Seconds slept before each SMTP reply")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--pool", choices=["thread", "process"], default="thread")
+    parser.add_argument("--chunk-size", type=int, default=100)
+    args = parser.parse_args()
+
+    setup_django()
+    print(json.dumps(run(args.count, args.latency, tuple(args.workers), args.pool, args.chunk_size), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Peak Python memory (tracemalloc) of resolving the recipients of one send list at growing sizes.
+
+Compares iterating model instances with a complete outbox run, which copies the recipients with
+INSERT ... SELECT and reads them back in claimed batches, through a delivery engine that discards the messages.
+
+    python -m benchmarks.recipient_memory --sizes 10000 100000 1000000
+"""
+import argparse
+import json
+import time
+import tracemalloc
+from typing import TYPE_CHECKING
+
+from . import setup_django, test_database
+
+if TYPE_CHECKING:
+    from core.delivery import SendReport
+
+
+def discard(subject: str, body: str, recipients) -> "SendReport":
+    """Delivery engine that only consumes the recipients, used to measure everything but SMTP."""
+    from core.delivery import SendReport
+
+    return SendReport(sent=sum(1 for _ in recipients))
+
+
+def grow_send_list(send_list, start: int, stop: int, batch_size: int = 10_000) -> None:
+    """Adds emails number `start` to `stop` to `send_list` with bulk inserts."""
+    from core.models import Email
+
+    through = send_list.emails.through
+    for offset in range(start, stop, batch_size):
+        emails = Email.objects.bulk_create(
+            Email(email=f"user{n}@example.com", name=f"User {n}")
+            for n in range(offset, min(stop, offset + batch_size)))
+        through.objects.bulk_create(through(sendlist_id=send_list.pk, email_id=email.pk) for email in emails)
+
+
+def _measure(consume) -> dict:
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        count = consume()
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"recipients": count, "seconds": elapsed, "peak_mib": peak / 2 ** 20}
+
+
+def run(sizes: list[int], chunk_size: int = 1000) -> dict:
+    from django.db import connection
+
+    from core.models import Dispatch, SendList
+    from core.outbox import create_job, run_job
+
+    results = {"chunk_size": chunk_size, "sizes": {}}
+    with test_database():
+        send_list = SendList.objects.create(title="Benchmark")
+        dispatch = Dispatch.objects.create(title="Benchmark", subject="Subject", text="Text", send_list=send_list)
+        seeded = 0
+        for size in sorted(sizes):
+            grow_send_list(send_list, seeded, size)
+            seeded = size
+            # Keep the debug query log (if DEBUG is on) out of the measurements
+            connection.queries_log.clear()
+
+            results["sizes"][size] = {
+                "model_instances": _measure(lambda: sum(1 for _ in send_list.emails.filter(active=True))),
+                "outbox_send": _measure(lambda: run_job(
+                    create_job(dispatch), engine="benchmarks.recipient_memory.discard", batch_size=chunk_size).sent),
+            }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    setup_django()
+    print(json.dumps(run(args.sizes, args.chunk_size), indent=2))
+
+
+if __name__ == "__main__":
+    main()
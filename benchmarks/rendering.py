@@ -0,0 +1,72 @@
+"""
+Measures the CPU cost per message of building a new MIME message for every recipient
+against the pre-rendered dispatch payload, and the end-to-end effect of envelope recipients.
+
+    python -m benchmarks.rendering --count 20000 --body-size 4000 --recipients-per-message 50
+"""
+import argparse
+import json
+import time
+
+from . import setup_django
+from .smtp_sink import SMTPSink
+
+
+def _cpu_per_message(render, recipients: list[str]) -> dict:
+    started = time.process_time()
+    for recipient in recipients:
+        render(recipient)
+    elapsed = time.process_time() - started
+    return {"cpu_seconds": elapsed, "cpu_microseconds_per_message": elapsed / len(recipients) * 1e6}
+
+
+def run(count: int = 10000, body_size: int = 4000, recipients_per_message: int = 50) -> dict:
+    from django.conf import settings
+    from django.core.mail import EmailMessage
+    from django.test import override_settings
+
+    from core.delivery import send_batched
+    from core.rendering import PreparedMessage
+
+    recipients = [f"user{n}@example.com" for n in range(count)]
+    subject = "Weekly digest"
+    body = ("Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * (body_size // 57 + 1))[:body_size]
+    results = {"count": count, "body_size": body_size, "recipients_per_message": recipients_per_message}
+
+    def per_recipient(recipient):
+        message = EmailMessage(subject=subject, body=body, from_email=settings.DEFAULT_FROM_EMAIL, to=[recipient])
+        return message.message().as_bytes(linesep="\r\n")
+
+    prepared = PreparedMessage(subject, body, settings.DEFAULT_FROM_EMAIL)
+    results["per_recipient_mime"] = _cpu_per_message(per_recipient, recipients)
+    results["prepared"] = _cpu_per_message(lambda recipient: prepared.render([recipient], "\r\n"), recipients)
+    results["cpu_speedup"] = (results["per_recipient_mime"]["cpu_seconds"]
+                              / max(results["prepared"]["cpu_seconds"], 1e-9))
+
+    with SMTPSink() as sink, override_settings(
+            EMAIL_BACKEND="django.core.mail.backends.smtp.EmailBackend",
+            EMAIL_HOST=sink.server_address[0], EMAIL_PORT=sink.port, EMAIL_USE_TLS=False):
+        for name, per_message in (("one_recipient_per_message", 1), ("envelope_recipients", recipients_per_message)):
+            sink.reset()
+            started = time.process_time()
+            report = send_batched(subject, body, recipients, recipients_per_message=per_message)
+            results[name] = {"seconds": report.elapsed, "messages_per_sec": report.rate,
+                             "cpu_seconds": time.process_time() - started,
+                             "smtp_transactions": sink.messages, "delivered": sink.recipients}
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=10000)
+    parser.add_argument("--body-size", type=int, default=4000, help="Characters in the message body")
+    parser.add_argument("--recipients-per-message", type=int, default=50)
+    args = parser.parse_args()
+
+    setup_django()
+    print(json.dumps(run(args.count, args.body_size, args.recipients_per_message), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Throughput of several scheduler nodes, separate `run_scheduler --burst` processes sharing one database,
+sending `--dispatches` due dispatches of `--recipients` recipients each to an SMTP sink with latency.
+
+Every node count starts from the same due dispatches. The nodes are registered before they start so
+each of them sees the full ring at once, and the sink counts the messages to check none was sent twice.
+Needs PostgreSQL, SQLite fails the writes of concurrent processes instead of waiting for them.
+
+    python -m benchmarks.scale_out --dispatches 16 --recipients 200 --latency 0.001 --nodes 1 2 4
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from . import setup_django, test_database
+from .smtp_sink import SMTPSink
+
+
+def run_node(name: str, port: int) -> None:
+    """One node, started by `run` in its own process."""
+    from django.core.management import call_command
+    from django.test import override_settings
+
+    with override_settings(EMAIL_BACKEND="django.core.mail.backends.smtp.EmailBackend", EMAIL_HOST="127.0.0.1",
+                           EMAIL_PORT=port, EMAIL_USE_TLS=False):
+        # Failed sends are retried at once instead of after a minute
+        call_command('run_scheduler', '--burst', '--node-name', name, '--retry-delay', '0',
+                     stdout=open(os.devnull, 'w'))
+
+
+def run(dispatches: int = 16, recipients: int = 200, latency: float = 0.001, nodes: tuple[int, ...] = (1, 2, 4)
+        ) -> dict:
+    import datetime
+
+    from django.db import connection
+    from django.utils.timezone import now
+
+    from core.models import DeliveryJob, Dispatch, Scheduler, SendList, WorkerNode
+    from .recipient_memory import grow_send_list
+
+    if connection.vendor == 'sqlite':
+        raise SystemExit("The nodes need row locks shared between processes, run this against PostgreSQL")
+    results = {"dispatches": dispatches, "recipients": recipients, "latency": latency, "runs": []}
+    with test_database(), SMTPSink(latency=latency) as sink:
+        send_list = SendList.objects.create(title="Benchmark")
+        grow_send_list(send_list, 0, recipients)
+        scheduler = Scheduler.objects.create(frequency="daily", time_of_day=datetime.time(9))
+        Dispatch.objects.bulk_create(
+            Dispatch(title=f"Scale out {n}", subject="Subject", text="Text", send_list=send_list, scheduler=scheduler)
+            for n in range(dispatches))
+        env = {**os.environ, "POSTGRES_DB": connection.settings_dict['NAME'], "LOG_LEVEL": "WARNING"}
+
+        for node_count in nodes:
+            DeliveryJob.objects.all().delete()
+            Dispatch.objects.update(next_due_at=now() - datetime.timedelta(minutes=1))
+            names = [f"bench-{node_count}-{n}" for n in range(node_count)]
+            WorkerNode.objects.all().delete()
+            WorkerNode.objects.bulk_create(WorkerNode(name=name, heartbeat_at=now()) for name in names)
+            sink.reset()
+
+            started = time.perf_counter()
+            processes = [subprocess.Popen([sys.executable, "-m", "benchmarks.scale_out", "--node", name,
+                                           "--port", str(sink.port)], env=env) for name in names]
+            for process in processes:
+                process.wait()
+            elapsed = time.perf_counter() - started
+            results["runs"].append({"nodes": node_count, "seconds": elapsed, "messages": sink.messages,
+                                    "messages_per_sec": sink.messages / elapsed,
+                                    "left_due": Dispatch.objects.due().count()})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dispatches", type=int, default=16)
+    parser.add_argument("--recipients", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.001, help="Seconds slept before each SMTP reply")
+    parser.add_argument("--nodes", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--node", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    setup_django()
+    if args.node:
+        run_node(args.node, args.port)
+        return
+    print(json.dumps(run(args.dispatches, args.recipients, args.latency, tuple(args.nodes)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Compares the per-recipient `send_mail` path with the pooled `send_batched` path against a local SMTP sink.
+
+    python -m benchmarks.send_paths --count 2000 --latency 0.001
+"""
+import argparse
+import json
+import time
+
+from . import setup_django
+from .smtp_sink import SMTPSink
+
+
+def run(count: int = 1000, chunk_size: int = 500, latency: float = 0.0) -> dict:
+    from django.core.mail import send_mail
+    from django.test import override_settings
+
+    from core.delivery import send_batched
+
+    recipients = [f"user{n}@example.com" for n in range(count)]
+    results = {"count": count, "chunk_size": chunk_size, "latency": latency}
+
+    with SMTPSink(latency=latency) as sink, override_settings(
+            EMAIL_BACKEND="django.core.mail.backends.smtp.EmailBackend",
+            EMAIL_HOST=sink.server_address[0], EMAIL_PORT=sink.port, EMAIL_USE_TLS=False):
+        started = time.perf_counter()
+        for recipient in recipients:
+            send_mail("Subject", "Body", None, [recipient], fail_silently=False)
+        elapsed = time.perf_counter() - started
+        results["per_recipient"] = {"seconds": elapsed, "messages_per_sec": count / elapsed,
+                                    "delivered": sink.messages}
+
+        sink.reset()
+        report = send_batched("Subject", "Body", recipients, chunk_size=chunk_size)
+        results["batched"] = {"seconds": report.elapsed, "messages_per_sec": report.rate,
+                              "delivered": sink.messages,
+                              "slowest_chunk_seconds": max(report.chunk_timings, default=0.0)}
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=1000)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds slept before each SMTP reply")
+    args = parser.parse_args()
+
+    setup_django()
+    print(json.dumps(run(args.count, args.chunk_size, args.latency), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Minimal threaded SMTP sink for local benchmarks.
+
+Accepts every message and discards it, counting deliveries. An artificial `latency` is slept
+before every reply to emulate the round trip to a remote relay.
+"""
+import socketserver
+import threading
+import time
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+
+    def reply(self, line: str) -> None:
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        self.reply("220 sink ESMTP ready")
+        in_data = False
+        recipients = 0
+        while line := self.rfile.readline():
+            if in_data:
+                if line.rstrip(b"\r\n") == b".":
+                    in_data = False
+                    self.server.record(recipients)
+                    recipients = 0
+                    self.reply("250 OK queued")
+                continue
+
+            command = line[:4].upper()
+            if command == b"EHLO":
+                self.reply("250-sink\r\n250-8BITMIME\r\n250 SMTPUTF8")
+            elif command == b"RCPT":
+                recipients += 1
+                self.reply("250 OK")
+            elif command == b"DATA":
+                in_data = True
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+            elif command == b"QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                # HELO, MAIL, RSET, NOOP and anything else are simply acknowledged
+                self.reply("250 OK")
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    # Connection pools open many sockets at once, the default backlog of 5 drops SYNs and stalls for seconds
+    request_queue_size = 1024
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0):
+        super().__init__((host, port), _SMTPHandler)
+        self.latency = latency
+        self.messages = 0
+        self.recipients = 0
+        self._lock = threading.Lock()
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def record(self, recipients: int) -> None:
+        with self._lock:
+            self.messages += 1
+            self.recipients += recipients
+
+    def reset(self) -> None:
+        with self._lock:
+            self.messages = 0
+            self.recipients = 0
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,217 @@
+"""
+Baseline suite of the sending and scheduling hot paths, written as one JSON document per run.
+
+Covers `Dispatch.send()` through the locmem backend at several send list sizes, the due scan of
+`send_dispatches` at growing dispatch counts, `update_next_due_at`, the `real_time_stats` view
+and the rendering of `DispatchListView`. Every timing is the fastest of `--repeat` runs, so two
+documents written on different commits can be compared with `--compare`:
+
+    python -m benchmarks.suite --output baseline.json
+    python -m benchmarks.suite --compare baseline.json --max-regression 20
+
+The same runs are available as `python manage.py run_benchmarks`.
+"""
+import argparse
+import datetime
+import json
+import platform
+import subprocess
+import time
+
+from . import setup_django, test_database
+
+SEND_SIZES = (100, 1000, 10_000)
+DUE_SIZES = (1000, 10_000, 100_000)
+
+
+def best_of(repeat: int, function) -> float:
+    """Fastest of `repeat` calls of `function`, in seconds."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def bench_dispatch_send(sizes, repeat: int) -> dict:
+    from django.core import mail
+    from django.test import override_settings
+
+    from core.models import Dispatch, SendList
+    from .recipient_memory import grow_send_list
+
+    results = {}
+    send_list = SendList.objects.create(title="Benchmark send")
+    dispatch = Dispatch.objects.create(title="Benchmark send", subject="Subject", text="Text", send_list=send_list)
+    seeded = 0
+    with override_settings(EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend"):
+        for size in sorted(sizes):
+            grow_send_list(send_list, seeded, size)
+            seeded = size
+
+            def send():
+                mail.outbox = []
+                dispatch.send(engine="batched")
+
+            seconds = best_of(repeat, send)
+            results[f"dispatch_send[{size}]"] = {"seconds": seconds, "per_second": size / seconds}
+    mail.outbox = []
+    return results
+
+
+def bench_due_scan(sizes, repeat: int, due: int = 100) -> dict:
+    from core.models import Dispatch
+    from .due_scan import seed_dispatches
+
+    results = {}
+    seeded = 0
+    for size in sorted(sizes):
+        # Only the first batch holds due rows, the rest is due tomorrow
+        seed_dispatches(size - seeded, due if not seeded else 0, text_size=200, offset=seeded)
+        seeded = size
+
+        def scan():
+            found = list(Dispatch.objects.due().order_by('next_due_at').values_list('pk', flat=True))
+            assert len(found) == due
+
+        results[f"due_scan[{size}]"] = {"seconds": best_of(repeat, scan)}
+    Dispatch.objects.filter(title__startswith="Dispatch ").delete()
+    return results
+
+
+def bench_update_next_due_at(count: int, saves: int, repeat: int) -> dict:
+    from core.models import Dispatch, Scheduler
+
+    schedulers = [Scheduler.objects.create(frequency=frequency, time_of_day=datetime.time(12))
+                  for frequency, _ in Scheduler.FREQUENCY_CHOICES]
+    dispatches = [Dispatch(title=f"Next due {n}", subject="Subject", text="Text", scheduler=schedulers[n % 3])
+                  for n in range(count)]
+
+    def compute():
+        for dispatch in dispatches:
+            dispatch.update_next_due_at()
+
+    stored = Dispatch.objects.bulk_create(dispatches[:saves])
+
+    def save():
+        for dispatch in stored:
+            dispatch.update_next_due_at(save=True)
+
+    compute_seconds = best_of(repeat, compute)
+    save_seconds = best_of(repeat, save)
+    Dispatch.objects.filter(title__startswith="Next due ").delete()
+    return {"update_next_due_at": {"seconds": compute_seconds, "per_second": count / compute_seconds},
+            "update_next_due_at_save": {"seconds": save_seconds, "per_second": saves / save_seconds}}
+
+
+def bench_views(requests: int, dispatches: int, repeat: int) -> dict:
+    from django.test import Client
+    from django.urls import reverse
+
+    from core.models import Dispatch, Email, SendList
+
+    send_list = SendList.objects.create(title="Benchmark views")
+    send_list.emails.set(Email.objects.order_by('pk')[:100])
+    Dispatch.objects.bulk_create(
+        Dispatch(title=f"Listed {n}", subject="Subject", text="Text " * 200, send_list=send_list)
+        for n in range(dispatches))
+    pk = Dispatch.objects.filter(title__startswith="Listed ").values_list('pk', flat=True).first()
+    client = Client()
+
+    def get(url):
+        def requests_to_url():
+            for _ in range(requests):
+                assert client.get(url).status_code == 200
+        return requests_to_url
+
+    results = {}
+    for name, url in (("real_time_stats", reverse('real_time_stats', args=[pk])),
+                      ("dispatch_list", reverse('dispatch-list'))):
+        seconds = best_of(repeat, get(url))
+        results[name] = {"seconds": seconds, "per_second": requests / seconds}
+    return results
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(send_sizes=SEND_SIZES, due_sizes=DUE_SIZES, repeat: int = 3, next_due_count: int = 100_000,
+        next_due_saves: int = 1000, requests: int = 200, listed: int = 1000) -> dict:
+    import django
+    from django.db import connection
+
+    results = {
+        "commit": git_commit(),
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "repeat": repeat,
+        "benchmarks": {},
+    }
+    with test_database():
+        results["database"] = connection.vendor
+        benchmarks = results["benchmarks"]
+        benchmarks.update(bench_dispatch_send(send_sizes, repeat))
+        benchmarks.update(bench_due_scan(due_sizes, repeat))
+        benchmarks.update(bench_update_next_due_at(next_due_count, next_due_saves, repeat))
+        benchmarks.update(bench_views(requests, listed, repeat))
+    return results
+
+
+def compare(results: dict, baseline: dict) -> dict[str, float]:
+    """Change of every timing against `baseline` in percent, positive is slower."""
+    return {name: (timing["seconds"] - baseline["benchmarks"][name]["seconds"])
+            / baseline["benchmarks"][name]["seconds"] * 100
+            for name, timing in results["benchmarks"].items() if name in baseline["benchmarks"]}
+
+
+def add_arguments(parser) -> None:
+    parser.add_argument("--send-sizes", type=int, nargs="+", default=list(SEND_SIZES),
+                        help="Send list sizes of the Dispatch.send() runs")
+    parser.add_argument("--due-sizes", type=int, nargs="+", default=list(DUE_SIZES),
+                        help="Dispatch counts of the due scans, e.g. 1000 10000 100000 1000000")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="File to write the results to, printed otherwise")
+    parser.add_argument("--compare", help="Results of an earlier run to compare with")
+    parser.add_argument("--max-regression", type=float,
+                        help="Fail when a timing is more than this many percent slower than in --compare")
+
+
+def execute(options: dict, write) -> list[str]:
+    """Runs the suite for the parsed `options`, returns the benchmarks slower than allowed."""
+    results = run(options["send_sizes"], options["due_sizes"], options["repeat"])
+    document = json.dumps(results, indent=2)
+    if options["output"]:
+        with open(options["output"], "w") as file:
+            file.write(document + "\n")
+    else:
+        write(document)
+
+    regressions = []
+    if options["compare"]:
+        with open(options["compare"]) as file:
+            baseline = json.load(file)
+        for name, change in compare(results, baseline).items():
+            write(f"{name}: {change:+.1f}%")
+            if options["max_regression"] is not None and change > options["max_regression"]:
+                regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    setup_django()
+    if regressions := execute(vars(args), print):
+        raise SystemExit(f"Slower than allowed: {', '.join(regressions)}")
+
+
+if __name__ == "__main__":
+    main()
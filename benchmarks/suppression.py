@@ -0,0 +1,76 @@
+"""
+Cost of the suppression check per recipient with `--suppressed` addresses on the list: the in-process Bloom
+filter with its exact fallback against one indexed query per recipient, plus the filter's load time and size.
+
+Batches of `--batch-size` recipients are checked, `--hit-rate` of them suppressed like on a real list.
+
+    python -m benchmarks.suppression --suppressed 1000000 --batches 50 --batch-size 1000 --hit-rate 0.01
+"""
+import argparse
+import json
+import sys
+import time
+
+from . import setup_django, test_database
+
+
+def run(suppressed: int = 1_000_000, batches: int = 50, batch_size: int = 1000, hit_rate: float = 0.01) -> dict:
+    from core.models import Suppression
+    from core.suppression import SuppressionList, normalize_address
+
+    results = {"suppressed": suppressed, "batches": batches, "batch_size": batch_size, "hit_rate": hit_rate}
+    with test_database():
+        for offset in range(0, suppressed, 10_000):
+            Suppression.objects.bulk_create(
+                Suppression(address=f"blocked{n}@example.com", reason=Suppression.UNSUBSCRIBE)
+                for n in range(offset, min(suppressed, offset + 10_000)))
+
+        suppression_list = SuppressionList()
+        started = time.perf_counter()
+        suppression_list.refresh()
+        results["load_seconds"] = time.perf_counter() - started
+        results["filter_bytes"] = len(suppression_list.filter.bits)
+        addresses = [f"blocked{n}@example.com" for n in range(min(suppressed, 100_000))]
+        results["set_bytes_estimate"] = int((sys.getsizeof(set(addresses)) + sum(map(sys.getsizeof, addresses)))
+                                            * suppressed / len(addresses))
+
+        hits = int(batch_size * hit_rate)
+        recipient_batches = [[f"blocked{(n * batch_size + i) % suppressed}@example.com" for i in range(hits)]
+                             + [f"reader{n}-{i}@example.com" for i in range(batch_size - hits)]
+                             for n in range(batches)]
+        recipients = batches * batch_size
+
+        bloom = suppression_list.filter
+        keys = [normalize_address(address) for batch in recipient_batches for address in batch]
+        started = time.perf_counter()
+        for key in keys:
+            key in bloom
+        results["filter_ns_per_check"] = (time.perf_counter() - started) / recipients * 1e9
+
+        started = time.perf_counter()
+        found = sum(len(suppression_list.suppressed(batch)) for batch in recipient_batches)
+        elapsed = time.perf_counter() - started
+        results["filter_with_fallback"] = {"us_per_recipient": elapsed / recipients * 1e6, "found": found}
+
+        sample = recipient_batches[0]
+        started = time.perf_counter()
+        found = sum(Suppression.objects.filter(address=normalize_address(address)).exists() for address in sample)
+        elapsed = time.perf_counter() - started
+        results["query_per_recipient"] = {"us_per_recipient": elapsed / len(sample) * 1e6, "found_in_sample": found}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--suppressed", type=int, default=1_000_000)
+    parser.add_argument("--batches", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--hit-rate", type=float, default=0.01, help="Share of recipients that are suppressed")
+    args = parser.parse_args()
+
+    setup_django()
+    print(json.dumps(run(args.suppressed, args.batches, args.batch_size, args.hit_rate), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Per-recipient CPU cost of personalizing a dispatch with `{{ name }}` / `{{ email }}`.
+
+Compares parsing the template for every recipient, rendering a template compiled once with the
+template engine, the flattened substitution of `CompiledTemplate`, and the complete personalized
+message against the shared payload of non-templated content.
+
+    python -m benchmarks.templating --count 100000 --body-size 4000
+"""
+import argparse
+import json
+import textwrap
+import time
+
+from . import setup_django
+
+
+def _cpu_per_recipient(render, recipients: list) -> dict:
+    started = time.process_time()
+    for recipient in recipients:
+        render(recipient)
+    elapsed = time.process_time() - started
+    return {"cpu_seconds": elapsed, "cpu_microseconds_per_recipient": elapsed / len(recipients) * 1e6}
+
+
+def run(count: int = 100_000, body_size: int = 4000) -> dict:
+    from django.conf import settings
+    from django.template import Context
+
+    from core.rendering import PersonalizedMessage, PreparedMessage
+    from core.templating import CompiledTemplate, Recipient, engine, recipient_context
+
+    recipients = [Recipient(f"user{n}@example.com", f"User {n}") for n in range(count)]
+    subject = "Weekly digest for {{ name }}"
+    filler = ("Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * (body_size // 57 + 1))[:body_size]
+    # Wrapped like real mail text, lines over 998 characters would force quoted-printable encoding
+    filler = textwrap.fill(filler, 76)
+    body = f"Dear {{{{ name }}}},\n\n{filler}\n\nThis digest was sent to {{{{ email }}}}."
+    results = {"count": count, "body_size": len(body)}
+
+    results["parse_per_recipient"] = _cpu_per_recipient(
+        lambda recipient: engine.from_string(body).render(Context(recipient_context(recipient))), recipients)
+    template = engine.from_string(body)
+    results["engine_render"] = _cpu_per_recipient(
+        lambda recipient: template.render(Context(recipient_context(recipient))), recipients)
+    compiled = CompiledTemplate(body)
+    results["compiled_substitution"] = _cpu_per_recipient(
+        lambda recipient: compiled.render(recipient_context(recipient)), recipients)
+
+    personalized = PersonalizedMessage(subject, body, settings.DEFAULT_FROM_EMAIL)
+    results["personalized_message"] = _cpu_per_recipient(
+        lambda recipient: personalized.render([recipient], "\r\n"), recipients)
+    shared = PreparedMessage("Weekly digest", filler, settings.DEFAULT_FROM_EMAIL)
+    results["shared_payload"] = _cpu_per_recipient(lambda recipient: shared.render([recipient], "\r\n"), recipients)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=100_000)
+    parser.add_argument("--body-size", type=int, default=4000, help="Characters of text around the variables")
+    args = parser.parse_args()
+
+    setup_django()
+    print(json.dumps(run(args.count, args.body_size), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,16 @@
+import io
+
 from django import forms
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.core.exceptions import PermissionDenied
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
 
+from .importing import FORMATS, guess_format, import_emails, read_rows
 from .models import *
+from .suppression import normalize_address
+from .tasks import enqueue_send
 
 
 @admin.register(Email)
@@ -9,9 +18,48 @@ class EmailAdmin(admin.ModelAdmin):
     ...
 
 
+class EmailImportForm(forms.Form):
+    send_list = forms.ModelChoiceField(queryset=SendList.objects.all(), required=False,
+                                       help_text="Leave empty to only add the addresses.")
+    file = forms.FileField(help_text="CSV with email and name columns, or JSONL with email and name keys.")
+    format = forms.ChoiceField(choices=[('', 'Guess from the file name')] + [(fmt, fmt.upper()) for fmt in FORMATS],
+                               required=False)
+
+
 @admin.register(SendList)
 class SendListAdmin(admin.ModelAdmin):
-    ...
+    list_display = ('title', 'active_count')
+    change_list_template = 'admin/core/sendlist/change_list.html'
+
+    def get_urls(self):
+        return [
+            path('import/', self.admin_site.admin_view(self.import_view), name='core_sendlist_import'),
+        ] + super().get_urls()
+
+    def import_view(self, request):
+        """Streams an uploaded address file into the database, see `core.importing.import_emails`."""
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+        form = EmailImportForm(request.POST or None, request.FILES or None)
+        if form.is_valid():
+            upload = form.cleaned_data['file']
+            fmt = form.cleaned_data['format'] or guess_format(upload.name)
+            # Large uploads are spooled to a temporary file by Django, read it line by line from there
+            stream = io.TextIOWrapper(upload.file, encoding='utf-8', newline='')
+            try:
+                report = import_emails(read_rows(stream, fmt), send_list=form.cleaned_data['send_list'])
+            except (ValueError, UnicodeDecodeError) as e:
+                self.message_user(request, f"Import failed: {e}", messages.ERROR)
+            else:
+                self.message_user(request, f"Imported {report}", messages.SUCCESS)
+                return redirect('admin:core_sendlist_changelist')
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Import email addresses',
+            'form': form,
+        }
+        return TemplateResponse(request, 'admin/core/sendlist/import_emails.html', context)
 
 
 class FooterAdminForm(forms.ModelForm):
@@ -30,20 +78,39 @@ class FooterAdmin(admin.ModelAdmin):
 
 @admin.register(Dispatch)
 class DispatchAdmin(admin.ModelAdmin):
-    list_display = ('title', 'last_sent_at', 'next_due_at', 'get_recipient_count_display')
-    actions = ['send_now', 'toggle_activation']
+    list_display = ('title', 'priority', 'last_sent_at', 'next_due_at', 'get_recipient_count_display')
+    list_select_related = ('send_list',)
+    # The changelist runs a fixed number of queries per page: the recipient count comes from the joined
+    # send list counter, the text is only loaded on the change form, and the unfiltered total is not counted
+    show_full_result_count = False
+    actions = ['send_now', 'send_now_parallel', 'toggle_activation']
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        if request.resolver_match and request.resolver_match.url_name == 'core_dispatch_changelist':
+            queryset = queryset.defer('text')
+        return queryset
 
     def get_recipient_count_display(self, obj):
         return obj.get_recipient_count()
 
     get_recipient_count_display.short_description = 'Recipient Count'
+    get_recipient_count_display.admin_order_field = 'send_list__active_count'
 
     def send_now(self, request, queryset):
         for dispatch in queryset:
-            dispatch.send()
+            enqueue_send(dispatch)
+        self.message_user(request, f"Queued sends: {len(queryset)}", messages.SUCCESS)
 
     send_now.short_description = "Send selected dispatches now"
 
+    def send_now_parallel(self, request, queryset):
+        for dispatch in queryset:
+            enqueue_send(dispatch, engine='parallel')
+        self.message_user(request, f"Queued sends: {len(queryset)}", messages.SUCCESS)
+
+    send_now_parallel.short_description = "Send selected dispatches now using the worker pool"
+
     def toggle_activation(self, request, queryset):
         for dispatch in queryset:
             dispatch.toggle_activation()
@@ -57,3 +124,36 @@ class SchedulerAdmin(admin.ModelAdmin):
         if obj:
             return ["frequency", "time_of_day"]
         return super().get_readonly_fields(request, obj)
+
+
+@admin.register(DeliveryJob)
+class DeliveryJobAdmin(admin.ModelAdmin):
+    list_display = ('dispatch', 'status', 'total', 'sent', 'failed', 'created_at', 'expected_finish_at', 'finished_at')
+    list_filter = ('status',)
+    list_select_related = ('dispatch',)
+    readonly_fields = ('dispatch', 'status', 'total', 'sent', 'failed', 'expected_finish_at', 'finished_at')
+
+
+@admin.register(SendTask)
+class SendTaskAdmin(admin.ModelAdmin):
+    list_display = ('dispatch', 'status', 'engine', 'created_at', 'started_at', 'finished_at')
+    list_filter = ('status',)
+    list_select_related = ('dispatch',)
+    readonly_fields = ('dispatch', 'engine', 'status', 'error', 'started_at', 'finished_at')
+
+
+@admin.register(WorkerNode)
+class WorkerNodeAdmin(admin.ModelAdmin):
+    list_display = ('name', 'started_at', 'heartbeat_at')
+    readonly_fields = ('name', 'started_at', 'heartbeat_at')
+
+
+@admin.register(Suppression)
+class SuppressionAdmin(admin.ModelAdmin):
+    list_display = ('address', 'reason', 'created_at')
+    list_filter = ('reason',)
+    search_fields = ('address',)
+
+    def save_model(self, request, obj, form, change):
+        obj.address = normalize_address(obj.address)
+        super().save_model(request, obj, form, change)
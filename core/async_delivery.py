@@ -0,0 +1,205 @@
+import asyncio
+import threading
+import time
+from collections import defaultdict
+from typing import Iterable
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.mail.utils import DNS_NAME
+
+from .delivery import SendReport, classify_failure, is_throttle_response, iter_chunks, smtp_code
+from .metrics import MESSAGE_BUILD_SECONDS, MESSAGES, SMTP_SEND_SECONDS, THROTTLED_SECONDS
+from .rendering import prepare_message
+from .throttling import get_rate_limiter
+
+try:
+    import aiosmtplib
+except ImportError:
+    aiosmtplib = None
+
+
+class AsyncDeliveryPool:
+    """
+    Bounded pool of asyncio SMTP connections fed from a bounded queue of envelopes.
+
+    An envelope is the list of recipients of one SMTP transaction, a single one unless
+    `recipients_per_message` is above 1 and the content is not personalized.
+    Producers await `put`, which blocks while `max_in_flight` envelopes are waiting (backpressure).
+    At most `per_host` deliveries run at the same time for one recipient domain, the domain of
+    an envelope's first recipient.
+    Unlike the other engines this one speaks SMTP directly using the EMAIL_* settings,
+    it does not go through EMAIL_BACKEND.
+    """
+
+    def __init__(self, subject: str, body: str, connections: int, per_host: int, max_in_flight: int,
+                 recipients_per_message: int = 1):
+        self.prepared = prepare_message(subject, body)
+        self.recipients_per_message = 1 if self.prepared.personalized else recipients_per_message
+        self.connections = connections
+        self.queue = asyncio.Queue(max_in_flight)
+        self.host_limits = defaultdict(lambda: asyncio.Semaphore(per_host))
+        self.report = SendReport()
+        self.error = None
+        self.workers = []
+        self.limiter = get_rate_limiter()
+
+    async def start(self) -> None:
+        self.workers = [asyncio.create_task(self._worker()) for _ in range(self.connections)]
+
+    async def put(self, recipients: list[str]) -> None:
+        for envelope in iter_chunks(recipients, self.recipients_per_message):
+            if self.error:
+                raise self.error
+            await self.queue.put(envelope)
+
+    async def join(self) -> SendReport:
+        for _ in self.workers:
+            await self.queue.put(None)
+        await asyncio.gather(*self.workers)
+        if self.error:
+            raise self.error
+        return self.report
+
+    async def _connect(self):
+        smtp = aiosmtplib.SMTP(
+            hostname=settings.EMAIL_HOST,
+            port=settings.EMAIL_PORT,
+            username=settings.EMAIL_HOST_USER or None,
+            password=settings.EMAIL_HOST_PASSWORD or None,
+            use_tls=settings.EMAIL_USE_SSL,
+            start_tls=settings.EMAIL_USE_TLS,
+            timeout=settings.EMAIL_TIMEOUT,
+            # aiosmtplib would otherwise do a blocking FQDN lookup inside the event loop for every connection
+            local_hostname=DNS_NAME.get_fqdn(),
+        )
+        await smtp.connect()
+        return smtp
+
+    async def _close(self, smtp) -> None:
+        if smtp.is_connected:
+            try:
+                await smtp.quit()
+            except (aiosmtplib.SMTPException, OSError):
+                smtp.close()
+
+    async def _send(self, smtp, envelope: list[str]):
+        """
+        Sends the prepared message to `envelope` after waiting for the rate limiter
+        and retries it on throttling responses.
+
+        Returns the connection to keep using, None when it broke and has to be reopened.
+        """
+        build_started = time.perf_counter()
+        data = self.prepared.render(envelope, linesep="\r\n")
+        build_seconds = time.perf_counter() - build_started
+        self.report.build_seconds += build_seconds
+        MESSAGE_BUILD_SECONDS.observe(build_seconds)
+        smtp_seconds = 0.0
+        for attempt in range(settings.DISPATCH_THROTTLE_RETRIES + 1):
+            if self.limiter is not None and (
+                    delay := max(self.limiter.reserve(recipient) for recipient in envelope)):
+                self.report.throttled += delay
+                await asyncio.sleep(delay)
+            started = time.perf_counter()
+            try:
+                smtp = smtp or await self._connect()
+                async with self.host_limits[envelope[0].rpartition("@")[2].lower()]:
+                    await smtp.sendmail(self.prepared.from_email, envelope, data)
+            except (aiosmtplib.SMTPException, OSError) as e:
+                smtp_seconds += time.perf_counter() - started
+                if isinstance(e, OSError) or smtp_code(e) == 421:
+                    # The connection itself is gone (aiosmtplib's disconnect and timeout errors are OSErrors too)
+                    if smtp is not None:
+                        smtp.close()
+                    smtp = None
+                if self.limiter is not None and is_throttle_response(e):
+                    for recipient in envelope:
+                        self.limiter.throttled(recipient)
+                    if attempt < settings.DISPATCH_THROTTLE_RETRIES:
+                        continue
+                kind = classify_failure(e)
+                self.report.failures += [(recipient, str(e), kind) for recipient in envelope]
+                break
+            smtp_seconds += time.perf_counter() - started
+            if self.limiter is not None:
+                for recipient in envelope:
+                    self.limiter.success(recipient)
+            self.report.sent += len(envelope)
+            break
+        self.report.smtp_seconds += smtp_seconds
+        SMTP_SEND_SECONDS.observe(smtp_seconds)
+        return smtp
+
+    async def _worker(self) -> None:
+        smtp = None
+        on_connection = 0
+        per_connection = settings.DISPATCH_MAX_MESSAGES_PER_CONNECTION
+        while (envelope := await self.queue.get()) is not None:
+            if self.error:
+                # Keep draining after a failure so producers never block on a full queue
+                continue
+            try:
+                if smtp is not None and per_connection and on_connection >= per_connection:
+                    await self._close(smtp)
+                    smtp = None
+                if smtp is None:
+                    on_connection = 0
+                smtp = await self._send(smtp, envelope)
+                on_connection += 1
+            except Exception as e:
+                self.error = self.error or e
+        if smtp is not None:
+            await self._close(smtp)
+
+
+def send_async(subject: str, body: str, recipients: Iterable[str], connections: int | None = None,
+               per_host: int | None = None, max_in_flight: int | None = None,
+               chunk_size: int | None = None, recipients_per_message: int | None = None) -> SendReport:
+    """
+    Delivers messages from an asyncio event loop running in a helper thread.
+
+    The calling (synchronous) thread keeps iterating `recipients`, so ORM querysets can be passed
+    in directly, and hands them over to the loop chunk by chunk.
+    """
+    if aiosmtplib is None:
+        raise ImproperlyConfigured("The async delivery engine requires the aiosmtplib package.")
+
+    connections = connections or settings.DISPATCH_ASYNC_CONNECTIONS
+    per_host = per_host or settings.DISPATCH_ASYNC_PER_HOST_LIMIT
+    max_in_flight = max_in_flight or settings.DISPATCH_MAX_IN_FLIGHT
+    chunk_size = chunk_size or settings.DISPATCH_CHUNK_SIZE
+    recipients_per_message = recipients_per_message or settings.DISPATCH_RECIPIENTS_PER_MESSAGE
+    started = time.perf_counter()
+
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, name="async-delivery", daemon=True)
+    thread.start()
+
+    def run(coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, loop).result()
+
+    async def create_pool():
+        pool = AsyncDeliveryPool(subject, body, connections, per_host, max_in_flight, recipients_per_message)
+        await pool.start()
+        return pool
+
+    try:
+        pool = run(create_pool())
+        try:
+            for chunk in iter_chunks(recipients, chunk_size):
+                chunk_started = time.perf_counter()
+                run(pool.put(chunk))
+                pool.report.chunk_timings.append(time.perf_counter() - chunk_started)
+        finally:
+            report = run(pool.join())
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+    report.elapsed = time.perf_counter() - started
+    MESSAGES.inc(report.sent, result="sent")
+    MESSAGES.inc(len(report.failures), result="failed")
+    THROTTLED_SECONDS.inc(report.throttled)
+    return report
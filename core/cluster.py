@@ -0,0 +1,76 @@
+import bisect
+import datetime
+import hashlib
+import os
+import socket
+from typing import Iterable
+
+from django.conf import settings
+from django.utils.timezone import now
+
+from .models import WorkerNode
+
+
+def _point(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'big')
+
+
+class HashRing:
+    """
+    Consistent hash ring of node names, every node is placed CLUSTER_RING_REPLICAS times.
+
+    A node joining or leaving only moves the keys of the ring segments it takes or gives up, about
+    1/n of them, the other nodes keep theirs. Leaving nodes out never moves a key between the remaining ones,
+    so a node that does not see a newcomer yet still claims every key the newer views assign to it: while the
+    views differ a key may be claimed twice, never by no one.
+    """
+
+    def __init__(self, nodes: Iterable[str], replicas: int | None = None):
+        self.nodes = frozenset(nodes)
+        replicas = replicas or settings.CLUSTER_RING_REPLICAS
+        points = sorted((_point(f"{node}#{n}"), node) for node in self.nodes for n in range(replicas))
+        self.points = [point for point, _ in points]
+        self.owners = [node for _, node in points]
+
+    def owner(self, key) -> str | None:
+        """Name of the node owning `key`, None on an empty ring."""
+        if not self.points:
+            return None
+        return self.owners[bisect.bisect(self.points, _point(str(key))) % len(self.points)]
+
+
+class ClusterNode:
+    """
+    This process as one of the scheduler nodes sharing the dispatches.
+
+    `beat` keeps the node alive in the WorkerNode table, `refresh` reads the live nodes and rebuilds the ring.
+    A node without a heartbeat for CLUSTER_NODE_TIMEOUT seconds is dropped, and its dispatches go to the
+    nodes next to it on the ring. Claiming a dispatch still locks its row, so two nodes briefly owning the
+    same dispatch while their views differ never send it twice.
+    """
+
+    def __init__(self, name: str | None = None):
+        self.name = name or f"{socket.gethostname()}-{os.getpid()}"
+        self.ring = HashRing([])
+
+    def beat(self) -> None:
+        WorkerNode.objects.update_or_create(name=self.name, defaults={'heartbeat_at': now()})
+
+    def refresh(self) -> bool:
+        """Sends a heartbeat and reloads the live nodes, returns True when they changed since the last refresh."""
+        self.beat()
+        cutoff = now() - datetime.timedelta(seconds=settings.CLUSTER_NODE_TIMEOUT)
+        WorkerNode.objects.filter(heartbeat_at__lt=cutoff).delete()
+        nodes = set(WorkerNode.objects.values_list('name', flat=True))
+        if nodes == self.ring.nodes:
+            return False
+        self.ring = HashRing(nodes)
+        return True
+
+    def owns(self, pk: int) -> bool:
+        """Whether dispatch `pk` is this node's to send. Before the first refresh it owns everything."""
+        return self.ring.owner(pk) in (self.name, None)
+
+    def leave(self) -> None:
+        """Removes the node at once instead of after the timeout, the others take over on their next refresh."""
+        WorkerNode.objects.filter(name=self.name).delete()
@@ -0,0 +1,216 @@
+import logging
+import smtplib
+import time
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Iterable, Iterator
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.utils.module_loading import import_string
+
+from .metrics import MESSAGE_BUILD_SECONDS, MESSAGES, SMTP_SEND_SECONDS, THROTTLED_SECONDS
+from .rendering import prepare_message
+from .throttling import get_rate_limiter
+
+logger = logging.getLogger(__name__)
+
+# Short names accepted by DISPATCH_ENGINE, any other value is treated as a dotted path to a callable
+DELIVERY_ENGINES = {
+    "batched": "core.delivery.send_batched",
+    "parallel": "core.parallel.send_parallel",
+    "async": "core.async_delivery.send_async",
+}
+
+
+def compose_message(message: str, footer_text: str = "") -> str:
+    """Joins dispatch text and footer the same way for every delivery path."""
+    return f"{message}\n\n{footer_text}" if footer_text else message
+
+
+def iter_chunks(iterable: Iterable, size: int) -> Iterator[list]:
+    """Yields lists of at most `size` items without materializing the whole iterable."""
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+@dataclass
+class SendReport:
+    sent: int = 0
+    elapsed: float = 0.0
+    chunk_timings: list[float] = field(default_factory=list)
+    # (recipient, error, kind) for every message the backend refused or could not deliver,
+    # kind is one of TRANSIENT, PERMANENT or BOUNCE
+    failures: list[tuple[str, str, str]] = field(default_factory=list)
+    # Seconds spent waiting for the rate limiter, summed over all senders
+    throttled: float = 0.0
+    # Seconds spent building messages and waiting for the relay, summed over all senders
+    build_seconds: float = 0.0
+    smtp_seconds: float = 0.0
+
+    @property
+    def rate(self) -> float:
+        """Messages per second over the whole send."""
+        return self.sent / self.elapsed if self.elapsed else 0.0
+
+    def add(self, other: "SendReport") -> None:
+        """Adds the counters of another (partial) report, `elapsed` is left to the caller."""
+        self.sent += other.sent
+        self.chunk_timings += other.chunk_timings
+        self.failures += other.failures
+        self.throttled += other.throttled
+        self.build_seconds += other.build_seconds
+        self.smtp_seconds += other.smtp_seconds
+
+
+# Relay responses that mean "slow down" rather than "this message is bad"
+THROTTLE_CODES = {421, 451}
+
+# Failure kinds: worth retrying later, never going to succeed, or rejected because of the address itself
+TRANSIENT = "transient"
+PERMANENT = "permanent"
+BOUNCE = "bounce"
+
+
+def smtp_code(error: Exception) -> int | None:
+    """Reply code of an smtplib or aiosmtplib error, if the server sent one."""
+    code = getattr(error, "smtp_code", None) or getattr(error, "code", None)
+    if code is None and getattr(error, "recipients", None):
+        # All recipients refused, the codes are per recipient (a dict for smtplib, a list for aiosmtplib)
+        refusals = error.recipients
+        first = next(iter(refusals.values())) if isinstance(refusals, dict) else refusals[0]
+        code = first[0] if isinstance(first, tuple) else getattr(first, "code", None)
+    return code if isinstance(code, int) else None
+
+
+def classify_failure(error: Exception) -> str:
+    """Tells transient failures (4xx replies, connection problems) from permanent 5xx ones."""
+    code = smtp_code(error)
+    if code is None or code < 500:
+        return TRANSIENT
+    # smtplib reports refused recipients in `recipients`, aiosmtplib per recipient in `recipient`
+    if hasattr(error, "recipients") or hasattr(error, "recipient"):
+        return BOUNCE
+    return PERMANENT
+
+
+def is_throttle_response(error: Exception) -> bool:
+    return smtp_code(error) in THROTTLE_CODES
+
+
+def is_connection_error(error: Exception) -> bool:
+    """Whether `error` broke the connection itself rather than rejecting a single message."""
+    return (isinstance(error, smtplib.SMTPServerDisconnected) or not isinstance(error, smtplib.SMTPException)
+            or smtp_code(error) == 421)
+
+
+def _reconnect(connection) -> None:
+    # Reopen right away, send_messages would otherwise open and close a connection per message
+    connection.close()
+    try:
+        connection.open()
+    except OSError:
+        pass
+
+
+def _send_one(connection, message: EmailMessage, limiter, report: SendReport) -> bool:
+    """
+    Sends `message`, waiting for the rate limiter first, and records a failure in `report`.
+
+    Throttling responses (421/451) slow the limiter down and the message is tried again,
+    up to DISPATCH_THROTTLE_RETRIES times. Every envelope recipient of the message counts
+    as one delivery towards the limiter and the report. The time spent in the backend,
+    retries included and rate limiter waits excluded, is recorded as the message's SMTP latency.
+    """
+    recipients = message.recipients()
+    delivered = False
+    smtp_seconds = 0.0
+    for attempt in range(settings.DISPATCH_THROTTLE_RETRIES + 1):
+        if limiter is not None:
+            report.throttled += sum(limiter.wait(recipient) for recipient in recipients)
+        started = time.perf_counter()
+        try:
+            sent = connection.send_messages([message]) or 0
+        except OSError as e:
+            smtp_seconds += time.perf_counter() - started
+            if is_connection_error(e):
+                _reconnect(connection)
+            if limiter is not None and is_throttle_response(e):
+                for recipient in recipients:
+                    limiter.throttled(recipient)
+                if attempt < settings.DISPATCH_THROTTLE_RETRIES:
+                    continue
+            kind = classify_failure(e)
+            report.failures += [(recipient, str(e), kind) for recipient in recipients]
+            break
+        smtp_seconds += time.perf_counter() - started
+        if limiter is not None:
+            for recipient in recipients:
+                limiter.success(recipient)
+        report.sent += len(recipients) if sent else 0
+        delivered = True
+        break
+    report.smtp_seconds += smtp_seconds
+    SMTP_SEND_SECONDS.observe(smtp_seconds)
+    return delivered
+
+
+def send_batched(subject: str, body: str, recipients: Iterable[str], chunk_size: int | None = None,
+                 connection=None, recipients_per_message: int | None = None) -> SendReport:
+    """
+    Sends one message per recipient through a single reused backend connection.
+
+    Messages are built lazily in chunks of `chunk_size` and pushed with `send_messages`,
+    so the connection handshake is paid once per dispatch instead of once per address.
+    The MIME payload is rendered once and only the per-message headers change between recipients.
+    With `recipients_per_message` above 1 each message goes to that many Bcc recipients in one
+    SMTP transaction, personalized (templated) content always gets one recipient per message.
+    The connection is renewed every DISPATCH_MAX_MESSAGES_PER_CONNECTION messages
+    when that is set. A failed message is recorded in `SendReport.failures` and does not stop the rest.
+    """
+    chunk_size = chunk_size or settings.DISPATCH_CHUNK_SIZE
+    recipients_per_message = recipients_per_message or settings.DISPATCH_RECIPIENTS_PER_MESSAGE
+    per_connection = settings.DISPATCH_MAX_MESSAGES_PER_CONNECTION
+    connection = connection or get_connection(fail_silently=False)
+    prepared = prepare_message(subject, body)
+    if prepared.personalized:
+        recipients_per_message = 1
+    limiter = get_rate_limiter()
+    report = SendReport()
+    started = time.perf_counter()
+    on_connection = 0
+
+    with connection:
+        for number, chunk in enumerate(iter_chunks(recipients, chunk_size), start=1):
+            chunk_started = time.perf_counter()
+            for envelope in iter_chunks(chunk, recipients_per_message):
+                if per_connection and on_connection >= per_connection:
+                    _reconnect(connection)
+                    on_connection = 0
+                build_started = time.perf_counter()
+                message = prepared.message_for(envelope)
+                # Serialized up front (and kept for the backend) so build time and SMTP latency are measured apart
+                message.message().as_bytes(linesep="\r\n")
+                build_seconds = time.perf_counter() - build_started
+                report.build_seconds += build_seconds
+                MESSAGE_BUILD_SECONDS.observe(build_seconds)
+                _send_one(connection, message, limiter, report)
+                on_connection += 1
+            chunk_elapsed = time.perf_counter() - chunk_started
+            report.chunk_timings.append(chunk_elapsed)
+            logger.info("Chunk %d: %d messages in %.3fs", number, len(chunk), chunk_elapsed)
+
+    report.elapsed = time.perf_counter() - started
+    MESSAGES.inc(report.sent, result="sent")
+    MESSAGES.inc(len(report.failures), result="failed")
+    THROTTLED_SECONDS.inc(report.throttled)
+    if report.throttled:
+        logger.info("Waited %.3fs for the rate limiter while sending %d messages", report.throttled, report.sent)
+    return report
+
+
+def get_engine(name: str | None = None):
+    """Returns the send callable for `name`, defaulting to the DISPATCH_ENGINE setting."""
+    name = name or settings.DISPATCH_ENGINE
+    return import_string(DELIVERY_ENGINES.get(name, name))
@@ -0,0 +1,191 @@
+import datetime
+import time
+from typing import Iterable
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Max, Q
+from django.db.models.functions import TruncHour
+from django.utils.timezone import now
+
+from .models import DeliveryEvent, DeliveryRollup, Dispatch
+
+# Events reach the table up to DELIVERY_EVENT_FLUSH_INTERVAL after they happened and transactions commit late,
+# every rollup run recomputes this much before the last rolled-up hour
+ROLLUP_OVERLAP = datetime.timedelta(hours=1)
+
+
+class EventWriter:
+    """
+    Buffers delivery events and writes them with one bulk insert per `buffer_size` events,
+    or as soon as the oldest buffered event is `flush_interval` seconds old.
+
+    Events still buffered when a worker dies are lost, the delivery items remain the authoritative state.
+    """
+
+    def __init__(self, buffer_size: int | None = None, flush_interval: float | None = None):
+        self.buffer_size = buffer_size or settings.DELIVERY_EVENT_BUFFER_SIZE
+        self.flush_interval = flush_interval if flush_interval is not None else settings.DELIVERY_EVENT_FLUSH_INTERVAL
+        self.buffer = []
+        self.oldest = None
+
+    def add(self, dispatch_id: int, kind: int, email_ids: Iterable[int]) -> None:
+        moment = now()
+        self.buffer += [DeliveryEvent(created_at=moment, dispatch_id=dispatch_id, email_id=email_id, kind=kind)
+                        for email_id in email_ids]
+        if self.buffer and self.oldest is None:
+            self.oldest = time.monotonic()
+        if len(self.buffer) >= self.buffer_size or (
+                self.oldest is not None and time.monotonic() - self.oldest >= self.flush_interval):
+            self.flush()
+
+    def flush(self) -> int:
+        written = len(self.buffer)
+        if written:
+            DeliveryEvent.objects.bulk_create(self.buffer, batch_size=self.buffer_size)
+        self.buffer = []
+        self.oldest = None
+        return written
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.flush()
+
+
+def _month_start(moment: datetime.datetime) -> datetime.datetime:
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _next_month(month: datetime.datetime) -> datetime.datetime:
+    return (month + datetime.timedelta(days=32)).replace(day=1)
+
+
+def partition_name(month: datetime.datetime) -> str:
+    return f"{DeliveryEvent._meta.db_table}_y{month.year}m{month.month:02d}"
+
+
+def default_partition() -> str:
+    return f"{DeliveryEvent._meta.db_table}_default"
+
+
+def is_partitioned() -> bool:
+    """Only PostgreSQL stores the event log as a partitioned table, see the 0013 migration."""
+    return connection.vendor == "postgresql"
+
+
+def _create_partition(cursor, name: str, month: datetime.datetime) -> None:
+    """
+    PostgreSQL refuses a partition for rows the default partition already holds, e.g. when the rollup did not
+    run for a month. The default partition is then detached while its rows of `month` move to the new one.
+    """
+    qn = connection.ops.quote_name
+    table, default = DeliveryEvent._meta.db_table, default_partition()
+    bounds = [month, _next_month(month)]
+    with transaction.atomic():
+        cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {qn(default)} WHERE created_at >= %s AND created_at < %s)",
+                       bounds)
+        misplaced, = cursor.fetchone()
+        if misplaced:
+            cursor.execute(f"ALTER TABLE {qn(table)} DETACH PARTITION {qn(default)}")
+        cursor.execute(f"CREATE TABLE {qn(name)} PARTITION OF {qn(table)} FOR VALUES FROM (%s) TO (%s)", bounds)
+        if misplaced:
+            cursor.execute(f"WITH moved AS (DELETE FROM {qn(default)} WHERE created_at >= %s AND created_at < %s "
+                           f"RETURNING *) INSERT INTO {qn(name)} SELECT * FROM moved", bounds)
+            cursor.execute(f"ALTER TABLE {qn(table)} ATTACH PARTITION {qn(default)} DEFAULT")
+
+
+def ensure_partitions(months_ahead: int | None = None) -> list[str]:
+    """
+    Creates the monthly partitions from the current month to `months_ahead` months later, returns new ones.
+    Events of those months that landed in the default partition are moved to theirs.
+    """
+    if not is_partitioned():
+        return []
+    months_ahead = settings.DELIVERY_EVENT_PARTITIONS_AHEAD if months_ahead is None else months_ahead
+    table = DeliveryEvent._meta.db_table
+    month = _month_start(datetime.datetime.now(datetime.timezone.utc))
+    created = []
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                       "WHERE i.inhparent = %s::regclass", [table])
+        existing = {name for name, in cursor.fetchall()}
+        for _ in range(months_ahead + 1):
+            name = partition_name(month)
+            if name not in existing:
+                _create_partition(cursor, name, month)
+                created.append(name)
+            month = _next_month(month)
+    return created
+
+
+def drop_events(before: datetime.datetime) -> int:
+    """
+    Removes events older than `before`.
+
+    Partitioned storage drops every monthly partition that ends before `before`, which costs
+    the same however many rows it holds, and only deletes rows from the default partition.
+    Returns the number of partitions dropped there, of rows deleted otherwise.
+    """
+    if not is_partitioned():
+        return DeliveryEvent.objects.filter(created_at__lt=before).delete()[0]
+
+    qn = connection.ops.quote_name
+    table = DeliveryEvent._meta.db_table
+    dropped = 0
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                       "WHERE i.inhparent = %s::regclass", [table])
+        for name, in cursor.fetchall():
+            suffix = name[len(table):]
+            if not (suffix.startswith("_y") and "m" in suffix):
+                # The default partition
+                cursor.execute(f"DELETE FROM {qn(name)} WHERE created_at < %s", [before])
+                continue
+            year, month = suffix[2:].split("m")
+            end = _next_month(datetime.datetime(int(year), int(month), 1, tzinfo=datetime.timezone.utc))
+            if end <= before:
+                with transaction.atomic():
+                    cursor.execute(f"ALTER TABLE {qn(table)} DETACH PARTITION {qn(name)}")
+                    cursor.execute(f"DROP TABLE {qn(name)}")
+                dropped += 1
+    return dropped
+
+
+def rollup_events(since: datetime.datetime | None = None) -> int:
+    """
+    Recomputes the hourly rollups of every hour from `since` on and returns how many rows were written.
+
+    By default it starts ROLLUP_OVERLAP before the last rolled-up hour, so a run only reads the events
+    of the last hours through the `created_at` index (and only their partitions).
+    """
+    if since is None:
+        last = DeliveryRollup.objects.aggregate(last=Max('hour'))['last']
+        since = last - ROLLUP_OVERLAP if last else None
+    events = DeliveryEvent.objects.filter(dispatch_id__in=Dispatch.objects.values('pk'))
+    if since is not None:
+        events = events.filter(created_at__gte=since.replace(minute=0, second=0, microsecond=0))
+
+    rows = (events.annotate(hour=TruncHour('created_at'))
+            .values('dispatch_id', 'hour')
+            .annotate(sent=Count('pk', filter=Q(kind=DeliveryEvent.SENT)),
+                      failed=Count('pk', filter=Q(kind=DeliveryEvent.FAILED)),
+                      bounced=Count('pk', filter=Q(kind=DeliveryEvent.BOUNCED)))
+            .order_by())
+    rollups = [DeliveryRollup(**row) for row in rows]
+    DeliveryRollup.objects.bulk_create(rollups, update_conflicts=True, unique_fields=['dispatch', 'hour'],
+                                       update_fields=['sent', 'failed', 'bounced'], batch_size=1000)
+    return len(rollups)
+
+
+def delivery_history(dispatch_id: int, hours: int = 24) -> dict:
+    """Hourly counts of the last `hours` hours and their totals with the error rate, read from the rollups."""
+    rows = list(DeliveryRollup.objects
+                .filter(dispatch_id=dispatch_id, hour__gte=now() - datetime.timedelta(hours=hours))
+                .order_by('hour')
+                .values('hour', 'sent', 'failed', 'bounced'))
+    totals = {kind: sum(row[kind] for row in rows) for kind in ('sent', 'failed', 'bounced')}
+    attempts = sum(totals.values())
+    totals['error_rate'] = (totals['failed'] + totals['bounced']) / attempts if attempts else 0.0
+    return {'hours': rows, 'totals': totals}
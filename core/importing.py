@@ -0,0 +1,174 @@
+import csv
+import json
+import resource
+import time
+from dataclasses import dataclass
+from typing import IO, Iterable, Iterator
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import connection, transaction
+from django.db.models import F
+from django.db.models.functions import Lower
+from django.utils.timezone import now
+
+from .delivery import iter_chunks
+from .models import Email, SendList
+
+FORMATS = ("csv", "jsonl")
+
+
+@dataclass
+class ImportReport:
+    rows: int = 0
+    created: int = 0
+    # Valid addresses that were already stored, including repeats of addresses from earlier batches
+    existing: int = 0
+    duplicates: int = 0
+    invalid: int = 0
+    # Memberships added to the send list, addresses already on it are not counted
+    attached: int = 0
+    elapsed: float = 0.0
+    peak_memory_mib: float = 0.0
+
+    @property
+    def rate(self) -> float:
+        """Rows per second over the whole import."""
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self):
+        return (f"{self.rows} rows ({self.created} new addresses, {self.existing} existing, "
+                f"{self.duplicates} duplicates, {self.invalid} invalid, {self.attached} added to the send list) "
+                f"in {self.elapsed:.1f}s, {self.rate:.0f} rows/sec, peak memory {self.peak_memory_mib:.0f} MiB")
+
+
+def normalize_email(address: str) -> str | None:
+    """Trimmed, lowercased address, None when it is not a valid email address."""
+    address = address.strip().lower()
+    try:
+        validate_email(address)
+    except ValidationError:
+        return None
+    return address
+
+
+def guess_format(filename: str) -> str:
+    return "jsonl" if filename.lower().endswith((".jsonl", ".ndjson", ".json")) else "csv"
+
+
+def read_rows(stream: IO[str], fmt: str = "csv") -> Iterator[tuple[str, str]]:
+    """
+    Yields `(email, name)` from a text stream line by line.
+
+    CSV files may have a header with `email` and `name` columns, otherwise the first column is
+    the address and the second one the name. JSONL lines are objects with `email` and `name` keys.
+    """
+    if fmt == "jsonl":
+        for line in stream:
+            if line.strip():
+                row = json.loads(line)
+                yield str(row.get("email") or ""), str(row.get("name") or "")
+        return
+    if fmt != "csv":
+        raise ValueError(f"Unknown import format: {fmt!r}")
+
+    reader = csv.reader(stream)
+    first = next(reader, None)
+    if first is None:
+        return
+    header = [column.strip().lower() for column in first]
+    if "email" in header:
+        email_column = header.index("email")
+        name_column = header.index("name") if "name" in header else None
+    else:
+        email_column, name_column = 0, 1
+        reader = (row for rows in ([first], reader) for row in rows)
+    for row in reader:
+        if len(row) > email_column:
+            name = row[name_column] if name_column is not None and len(row) > name_column else ""
+            yield row[email_column], name.strip()
+
+
+def _insert_emails(emails: dict[str, str | None]) -> int:
+    """
+    Inserts the `{email: name}` addresses with multi-row INSERTs and returns how many rows were inserted.
+
+    Addresses a concurrent import stored first are skipped by ON CONFLICT DO NOTHING, RETURNING tells
+    the rows inserted here from those (bulk_create does not return them when ignoring conflicts).
+    """
+    qn = connection.ops.quote_name
+    fields = [Email._meta.get_field(name) for name in ('email', 'name', 'active', 'bounce_count',
+                                                       'created_at', 'updated_at')]
+    moment = fields[-1].get_db_prep_value(now(), connection)
+    head = (f"INSERT INTO {qn(Email._meta.db_table)} ({', '.join(qn(field.column) for field in fields)}) VALUES ")
+    inserted = 0
+    with connection.cursor() as cursor:
+        for chunk in iter_chunks(emails.items(), 1000):
+            values = ", ".join([f"({', '.join(['%s'] * len(fields))})"] * len(chunk))
+            cursor.execute(f"{head}{values} ON CONFLICT ({qn(fields[0].column)}) DO NOTHING RETURNING 1",
+                           [value for email, name in chunk for value in (email, name, True, 0, moment, moment)])
+            inserted += len(cursor.fetchall())
+    return inserted
+
+
+def _import_batch(rows: list[tuple[str, str]], send_list: SendList | None, report: ImportReport) -> None:
+    batch = {}
+    for address, name in rows:
+        email = normalize_email(address)
+        if email is None:
+            report.invalid += 1
+        elif email in batch:
+            report.duplicates += 1
+        else:
+            batch[email] = name or None
+
+    with transaction.atomic():
+        # Addresses stored before imports were normalized may differ in case
+        stored = Email.objects.annotate(lower_email=Lower('email'))
+        existing = dict(stored.filter(lower_email__in=batch).values_list('lower_email', 'pk'))
+        missing = {email: name for email, name in batch.items() if email not in existing}
+        created = _insert_emails(missing) if missing else 0
+        report.created += created
+        report.existing += len(batch) - created
+        if send_list is None:
+            return
+        if missing:
+            existing.update(stored.filter(lower_email__in=missing).values_list('lower_email', 'pk'))
+
+        through = SendList.emails.through
+        ids = set(existing.values())
+        new_ids = ids - set(through.objects.filter(sendlist_id=send_list.pk, email_id__in=ids)
+                            .values_list('email_id', flat=True))
+        through.objects.bulk_create([through(sendlist_id=send_list.pk, email_id=pk) for pk in new_ids],
+                                    ignore_conflicts=True)
+        report.attached += len(new_ids)
+        # Bulk inserts bypass the m2m_changed hooks, keep the recipient counter in line by hand
+        SendList.objects.filter(pk=send_list.pk).update(
+            active_count=F('active_count') + Email.objects.filter(pk__in=new_ids, active=True).count())
+
+
+def import_emails(rows: Iterable[tuple[str, str]], send_list: SendList | None = None,
+                  batch_size: int | None = None) -> ImportReport:
+    """
+    Upserts `(email, name)` rows into Email and attaches them to `send_list`, `batch_size` rows at a time.
+
+    Addresses are normalized, deduplicated and matched to stored ones regardless of case. New addresses
+    are inserted with multi-row INSERTs, existing ones are kept as they are. Memberships go into the
+    through table with one `bulk_create` per batch.
+    Only one batch is held in memory, so `rows` can stream a file of any size.
+    """
+    batch_size = batch_size or settings.IMPORT_BATCH_SIZE
+    report = ImportReport()
+    started = time.perf_counter()
+
+    for rows_batch in iter_chunks(rows, batch_size):
+        report.rows += len(rows_batch)
+        _import_batch(rows_batch, send_list, report)
+
+    report.elapsed = time.perf_counter() - started
+    # ru_maxrss is in kilobytes on Linux
+    report.peak_memory_mib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    if send_list is not None:
+        send_list.refresh_from_db(fields=['active_count'])
+    return report
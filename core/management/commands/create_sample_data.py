@@ -1,26 +1,37 @@
-from django.core.management.base import BaseCommand
-from faker import Faker
+from django.core.management.base import BaseCommand, CommandError
 
-from core.models import Email
+from core.seeding import DISTRIBUTIONS, Seeder, parse_scheduler_mix
 
 
 class Command(BaseCommand):
-    help = 'Generate 50 fake emails'
+    help = 'Generate sample emails, send lists and dispatches with bulk inserts, e.g. for load testing'
 
-    def handle(self, *args, **kwargs):
-        faker = Faker()
+    def add_arguments(self, parser):
+        parser.add_argument('--emails', type=int, default=50, help='Number of email addresses')
+        parser.add_argument('--send-lists', type=int, default=0, help='Number of send lists')
+        parser.add_argument('--dispatches', type=int, default=0, help='Number of dispatches')
+        parser.add_argument('--lists-per-email', type=float, default=1.0,
+                            help='Average number of send lists each email joins')
+        parser.add_argument('--distribution', choices=DISTRIBUTIONS, default='uniform',
+                            help='How emails spread over send lists: evenly or a few huge lists and a long tail')
+        parser.add_argument('--inactive-ratio', type=float, default=0.0, help='Share of inactive addresses')
+        parser.add_argument('--schedulers', default='daily=4,weekly=3,monthly=2,none=1',
+                            help='Weights of dispatch scheduler frequencies, "none" leaves dispatches unscheduled')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed, the same seed gives the same data')
+        parser.add_argument('--batch-size', type=int, default=10_000, help='Rows per bulk insert')
 
-        emails_created = 0
-        while emails_created < 50:
-            email = faker.email()
-            name = faker.name()
-            # Check if the email already exists to avoid duplicates
-            if not Email.objects.filter(email=email).exists():
-                Email.objects.create(email=email, name=name)
-                emails_created += 1
-                self.stdout.write(self.style.SUCCESS(f'Created: {email} ({name})'))
-            else:
-                # If a duplicate email is generated, just continue to the next iteration
-                continue
+    def handle(self, *args, **options):
+        try:
+            scheduler_mix = parse_scheduler_mix(options['schedulers'])
+            seeder = Seeder(seed=options['seed'], batch_size=options['batch_size'],
+                            inactive_ratio=options['inactive_ratio'], lists_per_email=options['lists_per_email'],
+                            distribution=options['distribution'])
+        except ValueError as e:
+            raise CommandError(str(e))
 
-        self.stdout.write(self.style.SUCCESS(f'Successfully created {emails_created} emails.'))
+        report = seeder.seed(emails=options['emails'], send_lists=options['send_lists'],
+                             dispatches=options['dispatches'], scheduler_mix=scheduler_mix)
+
+        for step, seconds in report.timings.items():
+            self.stdout.write(f'{step}: {seconds:.1f}s')
+        self.stdout.write(self.style.SUCCESS(f'Successfully created {report}.'))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.importing import FORMATS, guess_format, import_emails, read_rows
+from core.models import SendList
+
+
+class Command(BaseCommand):
+    help = 'Import email addresses from a CSV or JSONL file, optionally attaching them to a send list'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV (email[,name] columns) or JSONL ({"email": ..., "name": ...}) file')
+        parser.add_argument('--send-list', help='Title of the send list to attach the addresses to')
+        parser.add_argument('--create-list', action='store_true', help='Create the send list if it does not exist')
+        parser.add_argument('--format', choices=FORMATS, help='File format, guessed from the extension by default')
+        parser.add_argument('--batch-size', type=int, help='Rows written per batch instead of IMPORT_BATCH_SIZE')
+        parser.add_argument('--encoding', default='utf-8')
+
+    def handle(self, *args, **options):
+        send_list = None
+        if title := options['send_list']:
+            if options['create_list']:
+                send_list, _ = SendList.objects.get_or_create(title=title)
+            else:
+                send_list = SendList.objects.filter(title=title).first()
+                if send_list is None:
+                    raise CommandError(f'Send list "{title}" does not exist, pass --create-list to create it')
+
+        fmt = options['format'] or guess_format(options['path'])
+        try:
+            with open(options['path'], encoding=options['encoding'], newline='') as stream:
+                report = import_emails(read_rows(stream, fmt), send_list=send_list, batch_size=options['batch_size'])
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Import failed: {e}')
+
+        self.stdout.write(self.style.SUCCESS(f'Imported {report}'))
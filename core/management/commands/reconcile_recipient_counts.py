@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from core.models import SendList
+
+
+class Command(BaseCommand):
+    help = 'Recount the active recipients of every send list and fix counters that drifted'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report the send lists that are off')
+
+    def handle(self, *args, **options):
+        drifted = (SendList.objects.with_actual_active_count()
+                   .exclude(active_count=F('actual_active_count'))
+                   .values_list('pk', 'title', 'active_count', 'actual_active_count'))
+
+        fixed = 0
+        for pk, title, counted, actual in drifted:
+            self.stdout.write(self.style.WARNING(f'{title}: counter {counted}, actual {actual}'))
+            if not options['dry_run']:
+                # Compare-and-set so a concurrent hook update is not overwritten with a stale recount
+                fixed += SendList.objects.filter(pk=pk, active_count=counted).update(active_count=actual)
+
+        self.stdout.write(self.style.SUCCESS(f'Reconciled send lists: {fixed}'))
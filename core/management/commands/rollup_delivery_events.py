@@ -0,0 +1,37 @@
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError
+from django.utils.timezone import now
+
+from core.events import drop_events, ensure_partitions, is_partitioned, rollup_events
+
+
+class Command(BaseCommand):
+    help = 'Aggregate delivery events into hourly rollups, prepare upcoming partitions and drop expired events'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', type=datetime.datetime.fromisoformat,
+                            help='Recompute the rollups from this moment (ISO format) '
+                                 'instead of the last rolled-up hour')
+        parser.add_argument('--retention-days', type=int, default=settings.DELIVERY_EVENT_RETENTION_DAYS,
+                            help='Age in days after which events are dropped, 0 keeps them forever')
+
+    def handle(self, *args, **options):
+        try:
+            for name in ensure_partitions():
+                self.stdout.write(self.style.SUCCESS(f'Created partition: {name}'))
+        except DatabaseError as e:
+            # Events still land in the default partition, the rollup does not depend on the partitions
+            self.stderr.write(self.style.ERROR(f'Could not create partitions: {e}'))
+
+        since = options['since']
+        if since is not None and since.tzinfo is None:
+            since = since.replace(tzinfo=datetime.timezone.utc)
+        self.stdout.write(self.style.SUCCESS(f'Rolled up hours: {rollup_events(since)}'))
+
+        if options['retention_days']:
+            dropped = drop_events(now() - datetime.timedelta(days=options['retention_days']))
+            unit = 'partitions' if is_partitioned() else 'events'
+            self.stdout.write(self.style.SUCCESS(f'Dropped expired {unit}: {dropped}'))
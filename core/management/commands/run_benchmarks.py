@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks import suite
+
+
+class Command(BaseCommand):
+    help = 'Run the benchmark suite of the sending and scheduling paths in a throwaway database'
+
+    def add_arguments(self, parser):
+        suite.add_arguments(parser)
+
+    def handle(self, *args, **options):
+        if regressions := suite.execute(options, self.stdout.write):
+            raise CommandError(f'Slower than allowed: {", ".join(regressions)}')
@@ -0,0 +1,132 @@
+import datetime
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils.timezone import now
+
+from core.cluster import ClusterNode
+from core.metrics import DISPATCHES_DUE, DISPATCHES_FAILED, DISPATCHES_SENT, SCHEDULER_QUEUE_SIZE, registry
+from core.models import Dispatch
+from core.outbox import next_retry_at
+from core.scheduling import (DueQueue, resume_dispatch, resume_stalled_jobs, retry_failed_deliveries,
+                             send_due_dispatches)
+
+
+class Command(BaseCommand):
+    help = 'Keep running and send dispatches as soon as they are due'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--engine', help='Delivery engine to use instead of the DISPATCH_ENGINE setting, '
+                                             'e.g. "batched", "parallel" or "async"')
+        parser.add_argument('--poll-interval', type=float, default=5.0,
+                            help='Seconds between checks for created or edited dispatches')
+        parser.add_argument('--retry-delay', type=float, default=60.0,
+                            help='Seconds to wait before resuming the send of a dispatch that failed')
+        parser.add_argument('--node-name', help='Name of this node among the running schedulers, '
+                                                'host name and process id by default')
+        parser.add_argument('--burst', action='store_true', help='Exit once nothing is due')
+
+    def handle(self, *args, **options):
+        self.engine = options['engine']
+        self.poll_interval = options['poll_interval']
+        self.retry_delay = datetime.timedelta(seconds=options['retry_delay'])
+        self.failed = {}
+        self.node = ClusterNode(options['node_name'])
+        self.node.refresh()
+        self.queue = DueQueue(owns=self.node.owns)
+        self.rebalanced = threading.Event()
+        self.stopped = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *_: self.stopped.set())
+        signal.signal(signal.SIGINT, lambda *_: self.stopped.set())
+
+        self.queue.refresh()
+        self.stdout.write(self.style.SUCCESS(f'Scheduler node {self.node.name} started with {len(self.queue)} '
+                                             f'of the active dispatches, {len(self.node.ring.nodes)} nodes running'))
+        heartbeat = threading.Thread(target=self.heartbeat, name='heartbeat', daemon=True)
+        heartbeat.start()
+        try:
+            while not self.stopped.is_set():
+                sleep = self.tick()
+                if options['burst'] and sleep > 0:
+                    break
+                self.stopped.wait(sleep)
+        finally:
+            self.stopped.set()
+            heartbeat.join()
+            self.node.leave()
+        self.stdout.write(self.style.SUCCESS('Scheduler stopped'))
+
+    def heartbeat(self) -> None:
+        """
+        Keeps the node alive while a long send blocks the ticks. When nodes join or leave the ring changes
+        at once, so dispatches handed to another node are skipped, and the next tick reloads the queue.
+        """
+        try:
+            while not self.stopped.wait(settings.CLUSTER_HEARTBEAT_INTERVAL):
+                if self.node.refresh():
+                    self.rebalanced.set()
+        finally:
+            connection.close()
+
+    def resume_failed(self) -> None:
+        """
+        Resumes the jobs of dispatches whose send failed at least `retry_delay` ago. Their `next_due_at`
+        was moved when they were claimed, so they are put back in the queue at whatever time it now says,
+        which sends a dispatch whose claim failed again right away.
+        """
+        moment = now()
+        for pk in [pk for pk, retry_at in self.failed.items() if retry_at <= moment]:
+            del self.failed[pk]
+            dispatch = Dispatch.objects.select_related('footer').filter(pk=pk).first()
+            if dispatch is None or (self.queue.owns is not None and not self.queue.owns(pk)):
+                continue
+            self.queue.schedule(pk, dispatch.next_due_at)
+            try:
+                if resume_dispatch(dispatch, engine=self.engine):
+                    self.stdout.write(self.style.SUCCESS(f'Resumed failed dispatch: {dispatch.title}'))
+            except Exception as e:
+                DISPATCHES_FAILED.inc()
+                self.failed[pk] = now() + self.retry_delay
+                self.stdout.write(self.style.ERROR(f'Failed to resume dispatch: {pk}. Error: {str(e)}'))
+
+    def tick(self) -> float:
+        """Sends everything that is due and returns how many seconds to sleep before the next tick."""
+        if self.rebalanced.is_set():
+            self.rebalanced.clear()
+            self.stdout.write(self.style.SUCCESS(f'Nodes changed, this node now has {self.queue.reload()} '
+                                                 f'of the active dispatches'))
+        else:
+            self.queue.refresh()
+        owns = self.queue.owns
+        try:
+            for dispatch in resume_stalled_jobs(engine=self.engine, owns=owns):
+                self.stdout.write(self.style.SUCCESS(f'Resumed interrupted dispatch: {dispatch.title}'))
+            if retried := retry_failed_deliveries(engine=self.engine, owns=owns):
+                self.stdout.write(self.style.SUCCESS(f'Delivered on retry: {retried}'))
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'Failed to resume interrupted deliveries. Error: {str(e)}'))
+        self.resume_failed()
+        due = self.queue.pop_due()
+        DISPATCHES_DUE.inc(len(due))
+        # Read lazily, dispatches handed to another node during the tick are left to it
+        mine = (pk for pk in due if owns is None or owns(pk))
+        for pk, dispatch, error in send_due_dispatches(mine, engine=self.engine):
+            if error is not None:
+                DISPATCHES_FAILED.inc()
+                self.failed[pk] = now() + self.retry_delay
+                self.stdout.write(self.style.ERROR(f'Failed to send dispatch: {pk}. Error: {str(error)}'))
+            elif dispatch is not None:
+                DISPATCHES_SENT.inc()
+                self.queue.schedule(pk, dispatch.next_due_at)
+                self.stdout.write(self.style.SUCCESS(f'Successfully sent dispatch: {dispatch.title}'))
+        SCHEDULER_QUEUE_SIZE.set(len(self.queue))
+        registry.flush_if_due()
+
+        wake_ups = [moment for moment in (self.queue.next_due_at(), next_retry_at(), *self.failed.values())
+                    if moment is not None]
+        if not wake_ups:
+            return self.poll_interval
+        return max(0.0, min(self.poll_interval, (min(wake_ups) - now()).total_seconds()))
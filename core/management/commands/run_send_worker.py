@@ -0,0 +1,66 @@
+import signal
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from core.tasks import claim_tasks, requeue_stalled_tasks, run_task, touch_tasks
+
+
+def _run_in_thread(task):
+    try:
+        return run_task(task)
+    finally:
+        # Every pool thread opens its own database connection
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = 'Keep running and execute queued "send now" tasks, several at once'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=settings.SEND_WORKER_CONCURRENCY,
+                            help='Sends run at once')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds between checks for queued tasks')
+        parser.add_argument('--burst', action='store_true', help='Exit once the queue is empty')
+
+    def handle(self, *args, **options):
+        concurrency = options['concurrency']
+        self.stopped = threading.Event()
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, lambda *_: self.stopped.set())
+            signal.signal(signal.SIGINT, lambda *_: self.stopped.set())
+
+        # Sends in progress when the worker is stopped are finished before it exits
+        running = {}
+        self.stdout.write(self.style.SUCCESS(f'Send worker started with {concurrency} slots'))
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='send-task') as pool:
+            while not self.stopped.is_set():
+                if requeued := requeue_stalled_tasks():
+                    self.stdout.write(self.style.WARNING(f'Queued abandoned tasks again: {requeued}'))
+                touch_tasks(list(running.values()))
+                if free := concurrency - len(running):
+                    for task in claim_tasks(free):
+                        running[pool.submit(_run_in_thread, task)] = task
+                if not running:
+                    if options['burst']:
+                        break
+                    self.stopped.wait(options['poll_interval'])
+                    continue
+
+                done, _ = wait(running, timeout=options['poll_interval'], return_when=FIRST_COMPLETED)
+                for future in done:
+                    task = future.result()
+                    del running[future]
+                    if task.status == task.DONE:
+                        self.stdout.write(self.style.SUCCESS(f'Sent dispatch: {task.dispatch.title}'))
+                    elif task.status == task.DEFERRED:
+                        self.stdout.write(self.style.WARNING(
+                            f'Deferred dispatch: {task.dispatch_id}. {task.error}'))
+                    else:
+                        self.stdout.write(self.style.ERROR(
+                            f'Failed to send dispatch: {task.dispatch_id}. Error: {task.error}'))
+        self.stdout.write(self.style.SUCCESS('Send worker stopped'))
@@ -1,21 +1,52 @@
 from django.core.management.base import BaseCommand
 
+from core.cluster import ClusterNode
+from core.metrics import DISPATCHES_DUE, DISPATCHES_FAILED, DISPATCHES_SENT, registry
 from core.models import Dispatch
+from core.scheduling import resume_stalled_jobs, retry_failed_deliveries, send_due_dispatches
 
 
 class Command(BaseCommand):
     help = 'Send scheduled dispatches that are due'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--engine', help='Delivery engine to use instead of the DISPATCH_ENGINE setting, '
+                                             'e.g. "batched", "parallel" or "async"')
+
     def handle(self, *args, **options):
-        dispatches_due = [dispatch for dispatch in Dispatch.objects.all() if dispatch.is_due()]
+        # Every container runs this entry, each run joins the scheduler nodes and only sends its share
+        node = ClusterNode()
+        node.refresh()
+        try:
+            self.send(node, options['engine'])
+        finally:
+            node.leave()
+
+    def send(self, node, engine):
+        for dispatch in resume_stalled_jobs(engine=engine, owns=node.owns):
+            self.stdout.write(self.style.SUCCESS(f'Resumed interrupted dispatch: {dispatch.title}'))
+        if retried := retry_failed_deliveries(engine=engine, owns=node.owns):
+            self.stdout.write(self.style.SUCCESS(f'Delivered on retry: {retried}'))
+
+        # Only ids are read by the scan, the rest of each row is loaded once it is claimed.
+        # Higher priorities go first, they are sent or booked into the paced slots before the others
+        dispatches_due = [pk for pk in Dispatch.objects.due().order_by('-priority', 'next_due_at')
+                          .values_list('pk', flat=True) if node.owns(pk)]
+        DISPATCHES_DUE.inc(len(dispatches_due))
         if not dispatches_due:
+            registry.flush()
             return
 
-        for dispatch in dispatches_due:
-            try:
-                dispatch.send()
+        dispatched = 0
+        for pk, dispatch, error in send_due_dispatches(dispatches_due, engine=engine):
+            if error is not None:
+                DISPATCHES_FAILED.inc()
+                self.stdout.write(self.style.ERROR(f'Failed to send dispatch: {pk}. Error: {str(error)}'))
+            elif dispatch is not None:
+                # None means claimed by another runner or no longer due
+                dispatched += 1
+                DISPATCHES_SENT.inc()
                 self.stdout.write(self.style.SUCCESS(f'Successfully sent dispatch: {dispatch.title}'))
-            except Exception as e:
-                self.stdout.write(self.style.ERROR(f'Failed to send dispatch: {dispatch.title}. Error: {str(e)}'))
 
-        self.stdout.write(self.style.SUCCESS(f'Total dispatched: {len(dispatches_due)}'))
+        registry.flush()
+        self.stdout.write(self.style.SUCCESS(f'Total dispatched: {dispatched}'))
@@ -0,0 +1,211 @@
+import bisect
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils.timezone import now
+
+# Latency buckets in seconds, from a pre-rendered message build to a slow relay
+LATENCY_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+
+def _format_labels(labels: dict[str, str]) -> str:
+    return ",".join(f'{name}="{value}"' for name, value in sorted(labels.items()))
+
+
+class Registry:
+    """
+    Metrics of this process, kept in memory and added to the shared MetricValue table by `flush`.
+
+    Sends run in the scheduler, cron jobs and web workers, and /metrics is served by whichever
+    web worker gets the request, so every process flushes its increments every METRICS_FLUSH_INTERVAL
+    seconds and the endpoint reads the totals from the database.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+        # Increments gathered by worker processes and handed over to this one, see `merge`
+        self.merged = []
+        self._enabled = None
+        self.last_flush = time.monotonic()
+
+    @property
+    def enabled(self) -> bool:
+        # Read on first use, so importing core.metrics (and core.models) does not need configured settings
+        if self._enabled is None:
+            self._enabled = settings.METRICS_ENABLED
+        return self._enabled
+
+    @enabled.setter
+    def enabled(self, value: bool) -> None:
+        self._enabled = value
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def collect(self) -> list[tuple[str, str, float, bool]]:
+        """Takes the increments gathered since the last call as `(series, labels, value, is_gauge)`."""
+        with self.lock:
+            rows = [row for metric in self.metrics.values() for row in metric.drain()]
+            rows += self.merged
+            self.merged = []
+        return rows
+
+    def merge(self, rows: list[tuple[str, str, float, bool]]) -> None:
+        """
+        Takes over the increments `collect`ed in another process, e.g. a worker of the process pool, so they are
+        flushed through this process's database connection rather than one the worker inherited by forking.
+        """
+        with self.lock:
+            self.merged += rows
+
+    def flush(self) -> int:
+        """Adds the increments of this process to MetricValue and returns how many series changed."""
+        from .models import MetricValue
+
+        self.last_flush = time.monotonic()
+        rows = self.collect()
+        if not rows:
+            return 0
+        moment = now()
+        with transaction.atomic():
+            MetricValue.objects.bulk_create(
+                [MetricValue(name=name, labels=labels, value=0) for name, labels, _, _ in rows], ignore_conflicts=True)
+            for name, labels, value, is_gauge in rows:
+                MetricValue.objects.filter(name=name, labels=labels).update(
+                    value=value if is_gauge else F('value') + value, updated_at=moment)
+        return len(rows)
+
+    def flush_if_due(self) -> None:
+        if time.monotonic() - self.last_flush >= settings.METRICS_FLUSH_INTERVAL:
+            self.flush()
+
+
+registry = Registry()
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self.values = defaultdict(float)
+        registry.register(self)
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        if registry.enabled and amount:
+            key = _format_labels(labels) if labels else ""
+            with registry.lock:
+                self.values[key] += amount
+
+    def drain(self):
+        rows = [(self.name, labels, value, False) for labels, value in self.values.items()]
+        self.values.clear()
+        return rows
+
+
+class Gauge:
+    """Value set by one process, e.g. the scheduler's queue size. Only the latest value is kept."""
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self.value = None
+        registry.register(self)
+
+    def set(self, value: float) -> None:
+        if registry.enabled:
+            with registry.lock:
+                self.value = value
+
+    def drain(self):
+        rows = [(self.name, "", self.value, True)] if self.value is not None else []
+        self.value = None
+        return rows
+
+
+class Histogram:
+    """Counts of observations per bucket, stored per bucket and made cumulative only when exposed."""
+
+    def __init__(self, name: str, documentation: str, buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = sorted(buckets)
+        self.labels = [f'le="{bucket}"' for bucket in self.buckets] + ['le="+Inf"']
+        self.counts = [0] * len(self.labels)
+        self.sum = 0.0
+        self.count = 0
+        registry.register(self)
+
+    def observe(self, value: float) -> None:
+        if registry.enabled:
+            index = bisect.bisect_left(self.buckets, value)
+            with registry.lock:
+                self.counts[index] += 1
+                self.sum += value
+                self.count += 1
+
+    def drain(self):
+        if not self.count:
+            return []
+        rows = [(f"{self.name}_bucket", label, count, False) for label, count in zip(self.labels, self.counts) if count]
+        rows += [(f"{self.name}_sum", "", self.sum, False), (f"{self.name}_count", "", self.count, False)]
+        self.counts = [0] * len(self.labels)
+        self.sum = 0.0
+        self.count = 0
+        return rows
+
+
+RECIPIENT_QUERY_SECONDS = Histogram(
+    "mailing_recipient_query_seconds", "Time to claim a batch of recipients from the outbox")
+MESSAGE_BUILD_SECONDS = Histogram("mailing_message_build_seconds", "Time to build and serialize one message")
+SMTP_SEND_SECONDS = Histogram("mailing_smtp_send_seconds", "SMTP latency of one message, retries included")
+MESSAGES = Counter("mailing_messages_total", "Messages handed to the relay by result")
+THROTTLED_SECONDS = Counter("mailing_throttled_seconds_total", "Time spent waiting for the rate limiter")
+DISPATCHES_DUE = Counter("mailing_dispatches_due_total", "Dispatches found due by the scheduler")
+DISPATCHES_SENT = Counter("mailing_dispatches_sent_total", "Due dispatches sent by the scheduler")
+DISPATCHES_FAILED = Counter("mailing_dispatches_failed_total", "Due dispatches whose send raised an error")
+SCHEDULER_QUEUE_SIZE = Gauge("mailing_scheduler_queue_size", "Active dispatches tracked by the scheduler")
+
+
+def _histogram_lines(metric: Histogram, values: dict[tuple[str, str], float]) -> list[str]:
+    lines = []
+    total = 0
+    for label in metric.labels:
+        total += values.get((f"{metric.name}_bucket", label), 0)
+        lines.append(f"{metric.name}_bucket{{{label}}} {total:g}")
+    lines.append(f"{metric.name}_sum {values.get((f'{metric.name}_sum', ''), 0):g}")
+    lines.append(f"{metric.name}_count {values.get((f'{metric.name}_count', ''), 0):g}")
+    return lines
+
+
+def render_metrics() -> str:
+    """All metrics in the Prometheus text format, with the outbox and due queue depths read right now."""
+    from .models import DeliveryJob, Dispatch, MetricValue
+
+    registry.flush()
+    values = {(name, labels): value
+              for name, labels, value in MetricValue.objects.values_list('name', 'labels', 'value')}
+    lines = []
+    for metric in registry.metrics.values():
+        kind = {Histogram: "histogram", Counter: "counter", Gauge: "gauge"}[type(metric)]
+        lines += [f"# HELP {metric.name} {metric.documentation}", f"# TYPE {metric.name} {kind}"]
+        if isinstance(metric, Histogram):
+            lines += _histogram_lines(metric, values)
+            continue
+        series = sorted(labels for name, labels in values if name == metric.name) or [""]
+        for labels in series:
+            name = f"{metric.name}{{{labels}}}" if labels else metric.name
+            lines.append(f"{name} {values.get((metric.name, labels), 0):g}")
+
+    backlog = (DeliveryJob.objects.exclude(status=DeliveryJob.DONE)
+               .aggregate(backlog=Sum(F('total') - F('sent') - F('failed')))['backlog']) or 0
+    lines += ["# HELP mailing_outbox_backlog Recipients of unfinished delivery jobs not delivered or failed yet",
+              "# TYPE mailing_outbox_backlog gauge", f"mailing_outbox_backlog {backlog}",
+              "# HELP mailing_dispatches_due Dispatches due right now",
+              "# TYPE mailing_dispatches_due gauge", f"mailing_dispatches_due {Dispatch.objects.due().count()}"]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-18 19:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_sent_times_field'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='dispatch',
+            name='next_due_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
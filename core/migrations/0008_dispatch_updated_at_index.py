@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-18 19:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_dispatch_next_due_at_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='dispatch',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
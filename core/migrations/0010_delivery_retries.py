@@ -0,0 +1,27 @@
+# Generated by Django 5.0.14 on 2026-10-18 19:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_delivery_outbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deliveryitem',
+            name='retry_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='email',
+            name='bounce_count',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='deliveryitem',
+            index=models.Index(condition=models.Q(('retry_at__isnull', False), ('status', 0)), fields=['retry_at'], name='delivery_item_retry_idx'),
+        ),
+    ]
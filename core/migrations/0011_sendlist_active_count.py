@@ -0,0 +1,33 @@
+# Generated by Django 5.0.14 on 2026-10-18 19:25
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_active_recipients(apps, schema_editor):
+    SendList = apps.get_model('core', 'SendList')
+    Membership = SendList.emails.through
+    active = (Membership.objects
+              .filter(sendlist_id=OuterRef('pk'), email__active=True)
+              .order_by()
+              .values('sendlist_id')
+              .annotate(count=Count('email_id'))
+              .values('count'))
+    SendList.objects.update(active_count=Coalesce(Subquery(active), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_delivery_retries'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sendlist',
+            name='active_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_active_recipients, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.0.14 on 2026-10-18 19:41
+
+import logging
+
+import core.templating
+from django.core.exceptions import ValidationError
+from django.db import migrations, models
+
+logger = logging.getLogger('core.migrations')
+
+
+def report_invalid_templates(apps, schema_editor):
+    """
+    Content written before it was rendered as a template may not compile now, such rows are listed
+    to be fixed, their sends fail with the template error until then.
+    """
+    for model_name, fields in (('Dispatch', ('subject', 'text')), ('Footer', ('text',))):
+        for row in apps.get_model('core', model_name).objects.order_by('pk').values('pk', *fields):
+            for field in fields:
+                try:
+                    core.templating.validate_template(row[field])
+                except ValidationError as e:
+                    logger.warning("%s %s: %s %s", model_name, row['pk'], field, e.messages[0])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_sendlist_active_count'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='dispatch',
+            name='subject',
+            field=models.CharField(help_text='Letter subject', max_length=255, validators=[core.templating.validate_template]),
+        ),
+        migrations.AlterField(
+            model_name='dispatch',
+            name='text',
+            field=models.TextField(validators=[core.templating.validate_template]),
+        ),
+        migrations.AlterField(
+            model_name='footer',
+            name='text',
+            field=models.CharField(blank=True, help_text='Email footer text, may use {{ name }} and {{ email }}.', max_length=255, null=True, validators=[core.templating.validate_template]),
+        ),
+        migrations.RunPython(report_invalid_templates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 5.0.14 on 2026-10-18 19:47
+
+import datetime
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+PARTITIONED_TABLE_SQL = """
+CREATE TABLE core_deliveryevent (
+    id bigserial NOT NULL,
+    created_at timestamp with time zone NOT NULL,
+    kind smallint NOT NULL CHECK (kind >= 0),
+    dispatch_id bigint NOT NULL,
+    email_id bigint NOT NULL,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+CREATE TABLE core_deliveryevent_default PARTITION OF core_deliveryevent DEFAULT;
+CREATE INDEX delivery_event_time_idx ON core_deliveryevent (created_at);
+CREATE INDEX core_deliveryevent_dispatch_id_idx ON core_deliveryevent (dispatch_id);
+CREATE INDEX core_deliveryevent_email_id_idx ON core_deliveryevent (email_id);
+"""
+
+
+def create_event_table(apps, schema_editor):
+    """
+    PostgreSQL gets a table partitioned by month on created_at, its primary key has to include
+    the partition key. The partitions of this month and the next one are created here, later ones
+    by `core.events.ensure_partitions`, rows outside of them land in the default partition.
+    Other databases get a plain table.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        schema_editor.create_model(apps.get_model('core', 'DeliveryEvent'))
+        return
+    schema_editor.execute(PARTITIONED_TABLE_SQL)
+    month = datetime.datetime.now(datetime.timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    for _ in range(2):
+        next_month = (month + datetime.timedelta(days=32)).replace(day=1)
+        schema_editor.execute(
+            f"CREATE TABLE core_deliveryevent_y{month.year}m{month.month:02d} PARTITION OF core_deliveryevent "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{next_month.isoformat()}')")
+        month = next_month
+
+
+def drop_event_table(apps, schema_editor):
+    schema_editor.delete_model(apps.get_model('core', 'DeliveryEvent'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_dispatch_templates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeliveryRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('sent', models.PositiveIntegerField(default=0)),
+                ('failed', models.PositiveIntegerField(default=0)),
+                ('bounced', models.PositiveIntegerField(default=0)),
+                ('dispatch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='delivery_rollups', to='core.dispatch')),
+            ],
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='DeliveryEvent',
+                    fields=[
+                        ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                        ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                        ('kind', models.PositiveSmallIntegerField(choices=[(0, 'Sent'), (1, 'Failed'), (2, 'Bounced')])),
+                        ('dispatch', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='core.dispatch')),
+                        ('email', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='core.email')),
+                    ],
+                    options={
+                        'indexes': [models.Index(fields=['created_at'], name='delivery_event_time_idx')],
+                    },
+                ),
+            ],
+        ),
+        migrations.RunPython(create_event_table, drop_event_table),
+        migrations.AddConstraint(
+            model_name='deliveryrollup',
+            constraint=models.UniqueConstraint(fields=('dispatch', 'hour'), name='unique_delivery_rollup'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.0.14 on 2026-10-18 20:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_send_tasks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deliveryjob',
+            name='expected_finish_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='dispatch',
+            name='priority',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'Low'), (1, 'Normal'), (2, 'High')], default=1),
+        ),
+        migrations.AddField(
+            model_name='scheduler',
+            name='rate',
+            field=models.PositiveIntegerField(blank=True, help_text='Messages per second at most for the sends of this schedule, the relay capacity when empty.', null=True),
+        ),
+        migrations.AddField(
+            model_name='scheduler',
+            name='send_window',
+            field=models.PositiveIntegerField(default=0, help_text='Minutes to spread the sends of this schedule over, 0 sends everything at once.'),
+        ),
+    ]
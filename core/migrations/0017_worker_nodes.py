@@ -0,0 +1,25 @@
+# Generated by Django 5.0.14 on 2026-10-18 20:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_load_smoothing'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkerNode',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('heartbeat_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.0.14 on 2026-10-18 20:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_worker_nodes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Suppression',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('address', models.CharField(max_length=254, unique=True)),
+                ('reason', models.CharField(choices=[('unsubscribe', 'Unsubscribed'), ('bounce', 'Hard bounce'), ('complaint', 'Complaint')], max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AlterField(
+            model_name='deliveryitem',
+            name='status',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'Pending'), (1, 'Claimed'), (2, 'Sent'), (3, 'Failed'), (4, 'Suppressed')], default=0),
+        ),
+    ]
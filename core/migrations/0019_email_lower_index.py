@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-18 20:28
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_suppressions'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='email',
+            index=models.Index(django.db.models.functions.text.Lower('email'), name='email_lower_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-18 20:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_email_lower_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='sendtask',
+            name='status',
+            field=models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed'), ('deferred', 'Deferred')], default='queued', max_length=10),
+        ),
+    ]
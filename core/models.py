@@ -1,26 +1,59 @@
+import calendar
 import datetime
 
 from django.conf import settings
 from django.core.mail import send_mail
-from django.db import models
+from django.db import models, transaction
+from django.db.models import DEFERRED, Case, Count, F, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce, Lower
 from django.urls import reverse
 from django.utils import timezone
-from django.utils.timezone import now, make_aware
+from django.utils.timezone import now
+
+from .delivery import compose_message
+from .templating import validate_template
+
+
+class EmailQuerySet(models.QuerySet):
+    def set_active(self, active: bool) -> int:
+        """
+        Activates or deactivates the selected addresses and adjusts the counters of their send lists.
+
+        Use it instead of `update(active=...)`, which bypasses the hooks that keep
+        `SendList.active_count` correct. Returns the number of addresses changed.
+        """
+        with transaction.atomic():
+            changed = list(self.exclude(active=active).values_list('pk', flat=True))
+            if changed:
+                Email.objects.filter(pk__in=changed).update(active=active, updated_at=now())
+                SendList.adjust_active_counts(changed, 1 if active else -1)
+        return len(changed)
 
 
 class Email(models.Model):
     email = models.EmailField(unique=True)
     name = models.CharField(max_length=255, blank=True, null=True)
     active = models.BooleanField(default=True)
+    # Hard bounces in a row, the address is deactivated once it reaches DISPATCH_HARD_BOUNCE_LIMIT
+    bounce_count = models.PositiveSmallIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = EmailQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.email} ({self.name})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remembered so that saving a changed `active` can adjust the send list counters, see core.signals
+        instance._active_in_db = instance.__dict__.get('active')
+        return instance
+
     def send_email(self, subject: str, message: str, footer_text: str = "") -> None:
         """Sends an email to this Email address instance."""
-        full_message = f"{message}\n\n{footer_text}" if footer_text else message
+        full_message = compose_message(message, footer_text)
         send_mail(
             subject=subject,
             message=full_message,
@@ -34,15 +67,74 @@ class Email(models.Model):
         get_latest_by = "created_at"
         verbose_name = "Email address"
         verbose_name_plural = "Email addresses"
+        indexes = [
+            # Imports match lowercased addresses against rows stored in any case
+            models.Index(Lower('email'), name='email_lower_idx'),
+        ]
+
+
+class Suppression(models.Model):
+    """
+    Address that is never mailed again, whatever send list it is on: unsubscribes, hard bounces and complaints.
+
+    Addresses are stored normalized (see `core.suppression.normalize_address`), the unique index on them
+    is the exact lookup behind the Bloom filter every worker keeps in memory.
+    """
+    UNSUBSCRIBE = 'unsubscribe'
+    BOUNCE = 'bounce'
+    COMPLAINT = 'complaint'
+    REASON_CHOICES = (
+        (UNSUBSCRIBE, 'Unsubscribed'),
+        (BOUNCE, 'Hard bounce'),
+        (COMPLAINT, 'Complaint'),
+    )
+    address = models.CharField(max_length=254, unique=True)
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES)
+    # Workers load the rows added since their last refresh
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.address} ({self.get_reason_display()})"
+
+    class Meta:
+        ordering = ["-created_at"]
+
+
+class SendListQuerySet(models.QuerySet):
+    def with_actual_active_count(self):
+        """Annotates `actual_active_count`, the active recipients counted from the rows, to verify the counter."""
+        active = (SendList.emails.through.objects
+                  .filter(sendlist_id=OuterRef('pk'), email__active=True)
+                  .order_by()
+                  .values('sendlist_id')
+                  .annotate(count=Count('email_id'))
+                  .values('count'))
+        return self.annotate(actual_active_count=Coalesce(Subquery(active), 0))
 
 
 class SendList(models.Model):
     title = models.CharField(max_length=255, unique=True)
     emails = models.ManyToManyField(Email, related_name="send_list")
+    # Active recipients, maintained by the hooks in core.signals and fixed by `reconcile_recipient_counts`
+    active_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = SendListQuerySet.as_manager()
 
     def __str__(self):
         return self.title
 
+    @staticmethod
+    def adjust_active_counts(email_ids, step: int) -> None:
+        """Adds `step` to the counter of every send list once for each of `email_ids` it contains."""
+        per_list = (SendList.emails.through.objects
+                    .filter(email_id__in=email_ids)
+                    .order_by()
+                    .values('sendlist_id')
+                    .annotate(count=Count('email_id'))
+                    .values_list('sendlist_id', 'count'))
+        for pk, count in per_list:
+            SendList.objects.filter(pk=pk).update(active_count=F('active_count') + step * count)
+
     class Meta:
         verbose_name = "Emails send list"
         verbose_name_plural = "Emails send lists"
@@ -50,12 +142,41 @@ class SendList(models.Model):
 
 class Footer(models.Model):
     title = models.CharField(max_length=255, unique=True, help_text="Identifier, is not included into email.")
-    text = models.CharField(max_length=255, blank=True, null=True, help_text="Email footer text.")
+    text = models.CharField(max_length=255, blank=True, null=True, validators=[validate_template],
+                            help_text="Email footer text, may use {{ name }} and {{ email }}.")
 
     def __str__(self):
         return self.title
 
 
+def scheduled_after(frequency: str, time_of_day: datetime.time, moment: datetime.datetime) -> datetime.datetime:
+    """
+    First run of a schedule strictly after `moment`, on the wall clock of the current time zone.
+
+    Daily schedules run at `time_of_day` every day and weekly ones every Monday. Monthly ones run next month
+    on the day of the month of `moment`, or on the last day of a shorter month.
+    """
+    local = timezone.localtime(moment)
+    zone = local.tzinfo
+    match frequency:
+        case 'daily':
+            run = datetime.datetime.combine(local.date(), time_of_day, tzinfo=zone)
+            if run <= moment:
+                run = datetime.datetime.combine(local.date() + datetime.timedelta(days=1), time_of_day, tzinfo=zone)
+        case 'weekly':
+            monday = local.date() - datetime.timedelta(days=local.weekday())
+            run = datetime.datetime.combine(monday, time_of_day, tzinfo=zone)
+            if run <= moment:
+                run = datetime.datetime.combine(monday + datetime.timedelta(weeks=1), time_of_day, tzinfo=zone)
+        case 'monthly':
+            year, month = (local.year + 1, 1) if local.month == 12 else (local.year, local.month + 1)
+            day = min(local.day, calendar.monthrange(year, month)[1])
+            run = datetime.datetime.combine(datetime.date(year, month, day), time_of_day, tzinfo=zone)
+        case _:
+            raise ValueError(f"Unknown frequency: {frequency}")
+    return run
+
+
 class Scheduler(models.Model):
     FREQUENCY_CHOICES = (
         ('daily', 'Daily'),
@@ -64,24 +185,80 @@ class Scheduler(models.Model):
     )
     frequency = models.CharField(max_length=10, choices=FREQUENCY_CHOICES, default='daily')
     time_of_day = models.TimeField(help_text="Time of day to send the emails (HH:MM:SS format).")
+    # Load smoothing, see core.pacing
+    send_window = models.PositiveIntegerField(
+        default=0, help_text="Minutes to spread the sends of this schedule over, 0 sends everything at once.")
+    rate = models.PositiveIntegerField(
+        null=True, blank=True,
+        help_text="Messages per second at most for the sends of this schedule, the relay capacity when empty.")
 
     def __str__(self):
         return f"{self.frequency} at {self.time_of_day}"
 
+    def next_run(self, moment: datetime.datetime | None = None) -> datetime.datetime:
+        return scheduled_after(self.frequency, self.time_of_day, moment or now())
+
+    def reschedule(self, moment: datetime.datetime | None = None) -> int:
+        """Moves `next_due_at` of the active dispatches on this schedule to its next run."""
+        return self.dispatches.all().recompute_next_due_at(moment)
+
+
+class DispatchQuerySet(models.QuerySet):
+    def due(self, moment: datetime.datetime | None = None):
+        """Dispatches whose `next_due_at` has passed, resolved by the `next_due_at` index."""
+        return self.filter(next_due_at__lte=moment or now())
+
+    def recompute_next_due_at(self, moment: datetime.datetime | None = None) -> int:
+        """
+        Moves `next_due_at` of the selected active dispatches to the next run of their scheduler with one UPDATE.
+
+        The next run only depends on the frequency and time of day, so it is computed once per distinct
+        schedule and every row picks its own from a CASE over the columns of its scheduler,
+        e.g. after a catch-up or a time zone change.
+        Deactivated dispatches (without `next_due_at`) stay deactivated. Returns the number of dispatches moved.
+        """
+        moment = moment or now()
+        dispatches = self.filter(scheduler__isnull=False, next_due_at__isnull=False)
+        schedules = (Scheduler.objects.filter(pk__in=dispatches.values('scheduler_id'))
+                     .order_by().values_list('frequency', 'time_of_day').distinct())
+        whens = [When(frequency=frequency, time_of_day=time_of_day,
+                      then=Value(scheduled_after(frequency, time_of_day, moment)))
+                 for frequency, time_of_day in schedules]
+        if not whens:
+            return 0
+        next_run = (Scheduler.objects.filter(pk=OuterRef('scheduler_id'))
+                    .annotate(next_run=Case(*whens, output_field=models.DateTimeField())).values('next_run'))
+        return dispatches.update(next_due_at=Subquery(next_run), updated_at=moment)
+
 
 class Dispatch(models.Model):
+    LOW = 0
+    NORMAL = 1
+    HIGH = 2
+    PRIORITY_CHOICES = (
+        (LOW, 'Low'),
+        (NORMAL, 'Normal'),
+        (HIGH, 'High'),
+    )
     title = models.CharField(max_length=255, unique=True)
     send_list = models.ForeignKey(SendList, related_name="dispatch", on_delete=models.PROTECT, blank=True, null=True)
-    subject = models.CharField(max_length=255, help_text="Letter subject")
-    text = models.TextField()
+    subject = models.CharField(max_length=255, validators=[validate_template], help_text="Letter subject")
+    # Subject, text and footer are Django templates rendered per recipient when they use {{ name }} or {{ email }}
+    text = models.TextField(validators=[validate_template])
     footer = models.ForeignKey(Footer, related_name="dispatch", on_delete=models.PROTECT, blank=True, null=True)
     scheduler = models.ForeignKey(Scheduler, related_name="dispatches", on_delete=models.PROTECT, null=True,
                                   blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    # Indexed for the scheduler daemon, which polls for rows changed since its last look
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     last_sent_at = models.DateTimeField(null=True, blank=True, editable=False)
-    next_due_at = models.DateTimeField(null=True, blank=True)
+    next_due_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    # Messages delivered over all sends, counted by the outbox as they go out
     sent_times = models.PositiveIntegerField(default=0)
+    # Dispatches due at the same time are sent, or paced, in order of priority
+    priority = models.PositiveSmallIntegerField(choices=PRIORITY_CHOICES, default=NORMAL)
+
+    objects = DispatchQuerySet.as_manager()
 
     def __str__(self):
         return self.title
@@ -97,73 +274,78 @@ class Dispatch(models.Model):
             self.update_next_due_at(save=True)
         else:
             self.next_due_at = None
-            self.save(update_fields=['next_due_at'])
+            self.save(update_fields=['next_due_at', 'updated_at'])
+
+    def send(self, engine: str | None = None, job=None) -> bool:
+        """
+        Composes and sends dispatch to each user in the send list.
+
+        Recipients go through a persistent DeliveryJob, an unfinished job of this dispatch is resumed
+        instead of starting over. `engine` selects the delivery engine (see `core.delivery.DELIVERY_ENGINES`),
+        DISPATCH_ENGINE by default.
+        Returns False when the resumed job had nothing to send yet, its remaining deliveries wait for retries
+        (or are being sent by another worker), the dispatch is then not marked as sent.
+        """
+        from .outbox import run_job, start_job
 
-    def send(self) -> None:
-        """Composes and sends dispatch to each user in the send list."""
         if not self.send_list:
-            return
+            return True
+
+        job = job or start_job(self)
+        report = run_job(job, engine=engine)
+        if not report.sent and not report.failures and (
+                DeliveryJob.objects.filter(pk=job.pk).exclude(status=DeliveryJob.DONE).exists()):
+            return False
+        self.mark_sent()
+        return True
 
-        footer_text = self.footer.text if self.footer else ""
-        for email in self.send_list.emails.filter(active=True):
-            email.send_email(subject=self.subject, message=self.text, footer_text=footer_text)
+    def mark_sent(self) -> None:
+        """
+        Records a finished send and moves `next_due_at` forward.
+
+        `sent_times` is not touched here, the outbox adds every message it actually delivers.
+        """
+        from .stats import publish_stats
 
         self.last_sent_at = timezone.now()
-        self.sent_times += self.get_recipient_count()
-        self.update_next_due_at()
-        self.save()
+        # A dispatch deactivated before or during the send has no `next_due_at` and stays deactivated
+        self.refresh_from_db(fields=['next_due_at', 'sent_times'])
+        if self.next_due_at is not None:
+            self.update_next_due_at()
+        self.save(update_fields=['last_sent_at', 'next_due_at', 'updated_at'])
+        publish_stats(self.pk)
 
     def update_next_due_at(self, save: bool = False) -> None:
-        if not self.scheduler:
-            self.next_due_at = None
-            return
-
-        n = now()
-        scheduled_time_today = make_aware(datetime.datetime.combine(n.date(), self.scheduler.time_of_day))
-        next_due = scheduled_time_today  # Default to today for daily
-
-        match self.scheduler.frequency:
-            case 'daily':
-                next_due = scheduled_time_today
-            case 'weekly':
-                next_due += datetime.timedelta(days=(7 - scheduled_time_today.weekday()))
-            case 'monthly':
-                month = (scheduled_time_today.month % 12) + 1
-                year = scheduled_time_today.year + (scheduled_time_today.month + 1 > 12)
-                day = min(scheduled_time_today.day, [31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31][month - 1])
-                next_due = make_aware(
-                    datetime.datetime(year, month, day, scheduled_time_today.hour, scheduled_time_today.minute))
-
-        # Adjust for dispatches that should have already been sent
-        if next_due <= n:
-            match self.scheduler.frequency:
-                case 'daily':
-                    next_due += datetime.timedelta(days=1)
-                case 'weekly':
-                    next_due += datetime.timedelta(weeks=1)
-                case 'monthly':
-                    next_due = next_due.replace(month=(next_due.month % 12) + 1)
-                    if next_due.month == 1:
-                        next_due = next_due.replace(year=next_due.year + 1)
-
-        self.next_due_at = next_due
+        self.next_due_at = self.scheduler.next_run() if self.scheduler else None
         if save:
-            self.save(update_fields=['next_due_at'])
+            self.save(update_fields=['next_due_at', 'updated_at'])
 
-    def save(self, *args, **kwargs):
-        is_new = self.pk is None  # Check if this is a new instance
-        scheduler_changed = False
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remembered so that save() can tell whether the scheduler changed without reading the row again
+        instance._scheduler_id_in_db = instance.__dict__.get('scheduler_id', DEFERRED)
+        return instance
 
-        if not is_new:
-            # Fetch the current Dispatch from the database to check if the Scheduler has changed
-            current_dispatch = Dispatch.objects.get(pk=self.pk)
-            scheduler_changed = self.scheduler_id != current_dispatch.scheduler_id
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using, fields, **kwargs)
+        if fields is None or {'scheduler', 'scheduler_id'} & set(fields):
+            self._scheduler_id_in_db = self.scheduler_id
 
-        if is_new or scheduler_changed:
-            # Recalculate next_due_at for new instances or if the scheduler has changed
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if self._state.adding:
             self.update_next_due_at()
+        elif update_fields is None or {'scheduler', 'scheduler_id'} & set(update_fields):
+            in_db = getattr(self, '_scheduler_id_in_db', DEFERRED)
+            if in_db is DEFERRED:
+                # Built in memory or loaded without the scheduler, only then the stored value has to be read
+                in_db = Dispatch.objects.filter(pk=self.pk).values_list('scheduler_id', flat=True).first()
+            if self.scheduler_id != in_db:
+                self.update_next_due_at()
 
         super().save(*args, **kwargs)
+        self._scheduler_id_in_db = self.scheduler_id
 
     def is_due(self) -> bool:
         if not self.next_due_at:
@@ -171,9 +353,10 @@ class Dispatch(models.Model):
         return now() >= self.next_due_at
 
     def get_recipient_count(self) -> int | None:
+        """Active recipients of the send list, read from its maintained counter."""
         if not self.send_list:
             return None
-        return len(self.send_list.emails.all()) if self.send_list else None
+        return self.send_list.active_count
 
     def get_last_sent(self) -> str:
         if self.last_sent_at is not None:
@@ -184,3 +367,194 @@ class Dispatch(models.Model):
         ordering = ["-created_at"]
         get_latest_by = "created_at"
         verbose_name_plural = "Dispatches"
+
+
+class DeliveryJob(models.Model):
+    """One run of a dispatch, its recipients are persisted as DeliveryItem rows so a crashed send can resume."""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    STATUS_CHOICES = (
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+    )
+    dispatch = models.ForeignKey(Dispatch, related_name="delivery_jobs", on_delete=models.CASCADE)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    total = models.PositiveIntegerField(default=0)
+    sent = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Bumped by every claimed batch, a running job that stops moving is considered stalled
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # When the last paced slot of the job is sent, see core.pacing
+    expected_finish_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.dispatch_id} job {self.pk} ({self.status})"
+
+    class Meta:
+        ordering = ["-created_at"]
+        get_latest_by = "created_at"
+
+
+class SendTask(models.Model):
+    """
+    "Send now" request of a dispatch, queued by the web process and executed by `run_send_worker`.
+
+    The worker bumps `updated_at` of the tasks it runs, a running task that stops moving is queued again
+    and its send resumes the unfinished DeliveryJob.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    # Nothing could be sent yet, the deliveries left wait for the retries of their job
+    DEFERRED = 'deferred'
+    STATUS_CHOICES = (
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+        (DEFERRED, 'Deferred'),
+    )
+    dispatch = models.ForeignKey(Dispatch, related_name="send_tasks", on_delete=models.CASCADE)
+    # Delivery engine to send with, DISPATCH_ENGINE when empty
+    engine = models.CharField(max_length=20, blank=True, default="")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.dispatch_id} task {self.pk} ({self.status})"
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [
+            # Workers claim the oldest queued tasks
+            models.Index(fields=["status", "id"], name="send_task_claim_idx"),
+        ]
+
+
+class WorkerNode(models.Model):
+    """
+    A running scheduler process. The live ones, with a heartbeat within CLUSTER_NODE_TIMEOUT,
+    split the dispatches between them on a hash ring, see `core.cluster`.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    started_at = models.DateTimeField(auto_now_add=True)
+    heartbeat_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        ordering = ["name"]
+
+
+class DeliveryItem(models.Model):
+    """A single recipient of a DeliveryJob. Statuses are small integers since there is a row per recipient."""
+    PENDING = 0
+    CLAIMED = 1
+    SENT = 2
+    FAILED = 3
+    # On the suppression list when its turn came, not sent and not counted in the job's total
+    SUPPRESSED = 4
+    STATUS_CHOICES = (
+        (PENDING, 'Pending'),
+        (CLAIMED, 'Claimed'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+        (SUPPRESSED, 'Suppressed'),
+    )
+    job = models.ForeignKey(DeliveryJob, related_name="items", on_delete=models.CASCADE)
+    email = models.ForeignKey(Email, related_name="+", on_delete=models.CASCADE)
+    status = models.PositiveSmallIntegerField(choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True, default="")
+    updated_at = models.DateTimeField(null=True, blank=True)
+    # Pending items are not claimed before this moment: retries of transient failures and paced sends
+    retry_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.job_id}: {self.email_id} ({self.get_status_display()})"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["job", "email"], name="unique_delivery_item"),
+        ]
+        indexes = [
+            # Workers claim the lowest pending ids of a job
+            models.Index(fields=["job", "status", "id"], name="delivery_item_claim_idx"),
+            models.Index(fields=["retry_at"], condition=models.Q(status=0, retry_at__isnull=False),
+                         name="delivery_item_retry_idx"),
+        ]
+
+
+class DeliveryEvent(models.Model):
+    """
+    Append-only log of delivery attempts, written in bulk by `core.events.EventWriter`.
+
+    On PostgreSQL the table is partitioned by month on `created_at` so old months are dropped
+    as whole partitions (see `core.events.drop_events`). Foreign keys are not enforced,
+    the history outlives the dispatches and addresses it mentions.
+    """
+    SENT = 0
+    FAILED = 1
+    BOUNCED = 2
+    KIND_CHOICES = (
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+        (BOUNCED, 'Bounced'),
+    )
+    id = models.BigAutoField(primary_key=True)
+    # Set by the writer when the event happens rather than when its buffer is flushed
+    created_at = models.DateTimeField(default=now)
+    dispatch = models.ForeignKey(Dispatch, related_name="+", on_delete=models.DO_NOTHING, db_constraint=False)
+    email = models.ForeignKey(Email, related_name="+", on_delete=models.DO_NOTHING, db_constraint=False)
+    kind = models.PositiveSmallIntegerField(choices=KIND_CHOICES)
+
+    def __str__(self):
+        return f"{self.dispatch_id}: {self.email_id} {self.get_kind_display()} at {self.created_at}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at"], name="delivery_event_time_idx"),
+        ]
+
+
+class DeliveryRollup(models.Model):
+    """Delivery counts of a dispatch per hour, aggregated from DeliveryEvent by `core.events.rollup_events`."""
+    dispatch = models.ForeignKey(Dispatch, related_name="delivery_rollups", on_delete=models.CASCADE)
+    hour = models.DateTimeField()
+    sent = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    bounced = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.dispatch_id} at {self.hour}: {self.sent} sent, {self.failed} failed, {self.bounced} bounced"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["dispatch", "hour"], name="unique_delivery_rollup"),
+        ]
+
+
+class MetricValue(models.Model):
+    """Total of one metric series, the in-process registries of `core.metrics` add their increments here."""
+    name = models.CharField(max_length=100)
+    labels = models.CharField(max_length=255, blank=True, default="")
+    value = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}{{{self.labels}}} {self.value}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["name", "labels"], name="unique_metric_series"),
+        ]
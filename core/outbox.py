@@ -0,0 +1,323 @@
+import datetime
+import json
+import logging
+import random
+import time
+from collections import Counter
+from typing import NamedTuple
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Exists, F, Min, OuterRef, Q
+from django.template import TemplateSyntaxError
+from django.utils.timezone import now
+
+from .delivery import BOUNCE, TRANSIENT, SendReport, compose_message, get_engine
+from .events import EventWriter
+from .metrics import RECIPIENT_QUERY_SECONDS, registry
+from .models import DeliveryEvent, DeliveryItem, DeliveryJob, Dispatch, Email, SendList, Suppression
+from .rendering import prepare_message
+from .stats import publish_stats
+from .suppression import suppress, suppression_list
+from .templating import Recipient
+
+logger = logging.getLogger(__name__)
+
+
+def create_job(dispatch, exclude_jobs: list[DeliveryJob] = ()) -> DeliveryJob:
+    """
+    Creates a job with one pending item per active recipient, copied by a single INSERT ... SELECT.
+
+    Recipients that already have an item in one of `exclude_jobs` are left out, this is how dispatches
+    with the same content coalesced in one scheduler tick mail a shared subscriber only once.
+    """
+    through = SendList.emails.through._meta
+    qn = connection.ops.quote_name
+    sql = (
+        f"INSERT INTO {qn(DeliveryItem._meta.db_table)} (job_id, email_id, status, attempts, last_error) "
+        f"SELECT %s, t.{qn(through.get_field('email').column)}, %s, 0, '' "
+        f"FROM {qn(through.db_table)} t "
+        f"INNER JOIN {qn(Email._meta.db_table)} e ON e.id = t.{qn(through.get_field('email').column)} "
+        f"WHERE t.{qn(through.get_field('sendlist').column)} = %s AND e.active = %s"
+    )
+    params = [DeliveryItem.PENDING, dispatch.send_list_id, True]
+    if exclude_jobs:
+        sql += (f" AND NOT EXISTS (SELECT 1 FROM {qn(DeliveryItem._meta.db_table)} d "
+                f"WHERE d.email_id = t.{qn(through.get_field('email').column)} "
+                f"AND d.job_id IN ({', '.join(['%s'] * len(exclude_jobs))}))")
+        params += [job.pk for job in exclude_jobs]
+    with transaction.atomic():
+        job = DeliveryJob.objects.create(dispatch=dispatch)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [job.pk, *params])
+            job.total = cursor.rowcount
+        job.save(update_fields=['total'])
+    return job
+
+
+def _claim_cutoff() -> datetime.datetime:
+    return now() - datetime.timedelta(seconds=settings.DISPATCH_OUTBOX_CLAIM_TIMEOUT)
+
+
+def start_job(dispatch, exclude_jobs: list[DeliveryJob] = ()) -> DeliveryJob:
+    """
+    Returns the unfinished job of `dispatch` so it resumes where it stopped, or a new job.
+
+    Items claimed by a worker that stopped reporting are handed out again, so at most one batch
+    per crashed worker is sent twice. Items of a job that is still running elsewhere are left alone,
+    the caller simply becomes one more worker of that job. `exclude_jobs` only applies to a new job.
+
+    The dispatch row is locked while the job is looked up or created, so a scheduler claim and a "send now"
+    task starting at the same time end up with the same job instead of mailing every recipient twice.
+    """
+    with transaction.atomic():
+        Dispatch.objects.select_for_update().filter(pk=dispatch.pk).first()
+        job = dispatch.delivery_jobs.exclude(status=DeliveryJob.DONE).order_by('created_at').first()
+        if job is None:
+            return create_job(dispatch, exclude_jobs)
+        job.items.filter(status=DeliveryItem.CLAIMED, updated_at__lt=_claim_cutoff()).update(
+            status=DeliveryItem.PENDING)
+    return job
+
+
+def stalled_jobs():
+    """
+    Running jobs whose workers have not claimed anything within DISPATCH_OUTBOX_CLAIM_TIMEOUT.
+
+    Jobs that only wait for retries of transiently failed items are not stalled, see `jobs_with_due_retries`.
+    """
+    unfinished = DeliveryItem.objects.filter(
+        Q(status=DeliveryItem.CLAIMED) | Q(status=DeliveryItem.PENDING, retry_at__isnull=True), job=OuterRef('pk'))
+    return DeliveryJob.objects.filter(Exists(unfinished), status=DeliveryJob.RUNNING, updated_at__lt=_claim_cutoff())
+
+
+def _due_retries():
+    return DeliveryItem.objects.filter(status=DeliveryItem.PENDING, retry_at__lte=now())
+
+
+def jobs_with_due_retries():
+    """Jobs with transiently failed items whose retry time has come."""
+    return DeliveryJob.objects.filter(Exists(_due_retries().filter(job=OuterRef('pk'))))
+
+
+def next_retry_at() -> datetime.datetime | None:
+    """Earliest pending retry of any job, read from the partial retry index."""
+    return DeliveryItem.objects.filter(status=DeliveryItem.PENDING, retry_at__isnull=False).aggregate(
+        next_retry_at=Min('retry_at'))['next_retry_at']
+
+
+def retry_delay(attempts: int) -> datetime.timedelta:
+    """Exponential backoff from DISPATCH_RETRY_BASE_DELAY, capped and with half of it randomized (jitter)."""
+    delay = min(settings.DISPATCH_RETRY_MAX_DELAY, settings.DISPATCH_RETRY_BASE_DELAY * 2 ** (attempts - 1))
+    return datetime.timedelta(seconds=delay / 2 + random.uniform(0, delay / 2))
+
+
+class ClaimedItem(NamedTuple):
+    pk: int
+    job_id: int
+    email_id: int
+    address: str
+    name: str | None
+    attempts: int
+
+
+def claim_batch(jobs: list[DeliveryJob], size: int) -> list[ClaimedItem]:
+    """
+    Marks up to `size` pending items of `jobs`, skipping those waiting for a retry, as claimed and returns them.
+
+    Only the columns needed for sending are read, as tuples, so a batch costs the same memory
+    however many recipients the jobs have.
+    """
+    moment = now()
+    with transaction.atomic():
+        rows = list(DeliveryItem.objects
+                    .filter(Q(retry_at__isnull=True) | Q(retry_at__lte=moment), status=DeliveryItem.PENDING,
+                            job__in=[job.pk for job in jobs])
+                    .order_by('pk')
+                    .select_for_update(skip_locked=True)
+                    .values_list('pk', 'job_id')[:size])
+        if not rows:
+            return []
+        ids = [pk for pk, _ in rows]
+        DeliveryItem.objects.filter(pk__in=ids).update(
+            status=DeliveryItem.CLAIMED, attempts=F('attempts') + 1, updated_at=moment)
+        DeliveryJob.objects.filter(pk__in={job_id for _, job_id in rows}).update(
+            status=DeliveryJob.RUNNING, updated_at=moment)
+    return [
+        ClaimedItem(*row) for row in
+        DeliveryItem.objects.filter(pk__in=ids).order_by('pk')
+        .values_list('pk', 'job_id', 'email_id', 'email__email', 'email__name', 'attempts')
+    ]
+
+
+def record_results(job: DeliveryJob, batch: list[ClaimedItem], report: SendReport, events=None) -> None:
+    """
+    Stores the outcome of a claimed batch with one UPDATE for the sent items and one bulk update for failures.
+
+    Transient failures go back to pending with a backoff until DISPATCH_RETRY_ATTEMPTS is reached,
+    the others fail for good. Addresses that bounced DISPATCH_HARD_BOUNCE_LIMIT times in a row are deactivated
+    and suppressed.
+    The dispatch's `sent_times` grows by the messages actually sent, and every attempt is logged
+    to `events` (a `core.events.EventWriter`) when given.
+    """
+    moment = now()
+    errors = {recipient: (error, kind) for recipient, error, kind in report.failures}
+    sent = [item for item in batch if item.address not in errors]
+    updates = []
+    bounced = []
+    failed_ids = []
+    for item in batch:
+        if item.address not in errors:
+            continue
+        error, kind = errors[item.address]
+        update = DeliveryItem(pk=item.pk, status=DeliveryItem.FAILED, last_error=error, updated_at=moment)
+        if kind == TRANSIENT and item.attempts < settings.DISPATCH_RETRY_ATTEMPTS:
+            update.status = DeliveryItem.PENDING
+            update.retry_at = moment + retry_delay(item.attempts)
+        if kind == BOUNCE:
+            bounced.append(item.email_id)
+        else:
+            failed_ids.append(item.email_id)
+        updates.append(update)
+    failed = sum(update.status == DeliveryItem.FAILED for update in updates)
+
+    with transaction.atomic():
+        DeliveryItem.objects.filter(pk__in=[item.pk for item in sent]).update(
+            status=DeliveryItem.SENT, last_error="", retry_at=None, updated_at=moment)
+        DeliveryItem.objects.bulk_update(updates, ['status', 'last_error', 'retry_at', 'updated_at'])
+        DeliveryJob.objects.filter(pk=job.pk).update(
+            sent=F('sent') + len(sent), failed=F('failed') + failed, updated_at=moment)
+        if sent:
+            Dispatch.objects.filter(pk=job.dispatch_id).update(sent_times=F('sent_times') + len(sent))
+        Email.objects.filter(pk__in=[item.email_id for item in sent], bounce_count__gt=0).update(bounce_count=0)
+        if bounced:
+            Email.objects.filter(pk__in=bounced).update(bounce_count=F('bounce_count') + 1)
+            hard_bounced = Email.objects.filter(pk__in=bounced, bounce_count__gte=settings.DISPATCH_HARD_BOUNCE_LIMIT)
+            suppress(hard_bounced.values_list('email', flat=True), Suppression.BOUNCE)
+            hard_bounced.set_active(False)
+
+    if events is not None:
+        events.add(job.dispatch_id, DeliveryEvent.SENT, [item.email_id for item in sent])
+        events.add(job.dispatch_id, DeliveryEvent.FAILED, failed_ids)
+        events.add(job.dispatch_id, DeliveryEvent.BOUNCED, bounced)
+
+
+def skip_suppressed(batch: list[ClaimedItem]) -> list[ClaimedItem]:
+    """
+    Marks the items of `batch` whose address is on the suppression list as suppressed, takes them out of
+    their jobs' totals and returns the others. Checked when an item's turn comes rather than when the job
+    is created, so suppressions added during a long send still apply.
+    """
+    suppressed = suppression_list.suppressed({item.address for item in batch})
+    if not suppressed:
+        return batch
+    skipped = [item for item in batch if item.address in suppressed]
+    with transaction.atomic():
+        DeliveryItem.objects.filter(pk__in=[item.pk for item in skipped]).update(
+            status=DeliveryItem.SUPPRESSED, retry_at=None, updated_at=now())
+        for job_id, count in Counter(item.job_id for item in skipped).items():
+            DeliveryJob.objects.filter(pk=job_id).update(total=F('total') - count)
+    return [item for item in batch if item.address not in suppressed]
+
+
+def fail_jobs(jobs: list[DeliveryJob], error: str) -> None:
+    """
+    Fails the undelivered items of `jobs` with `error` and finishes the jobs, for content that cannot be sent
+    to anyone. Nothing is left claimed or pending for a later run to fail on again.
+    """
+    moment = now()
+    with transaction.atomic():
+        for job in jobs:
+            failed = job.items.filter(status__in=[DeliveryItem.PENDING, DeliveryItem.CLAIMED]).update(
+                status=DeliveryItem.FAILED, last_error=error, retry_at=None, updated_at=moment)
+            DeliveryJob.objects.filter(pk=job.pk).update(
+                status=DeliveryJob.DONE, failed=F('failed') + failed, finished_at=moment, updated_at=moment)
+    for job in jobs:
+        publish_stats(job.dispatch_id)
+
+
+def _recipient_domain(address: str) -> str:
+    return address.rpartition("@")[2].lower()
+
+
+def run_jobs(jobs: list[DeliveryJob], engine: str | None = None, batch_size: int | None = None) -> SendReport:
+    """
+    Works through the pending items of `jobs`, which must all have the same subject and body, as one stream.
+
+    Every claimed batch goes to the engine in a single call, so over one connection, with the addresses
+    grouped by domain and each address listed once even if several of the jobs hold an item for it.
+    All items of an address get the outcome of its one message, and the attempts are logged as
+    DeliveryEvents through one buffered writer. Addresses are passed as `Recipient`s
+    so templated content can be personalized with the recipient's name, suppressed ones are left out.
+
+    The content is compiled before anything is claimed, jobs whose templates do not compile fail right away.
+    """
+    dispatch = jobs[0].dispatch
+    subject = dispatch.subject
+    body = compose_message(dispatch.text, dispatch.footer.text if dispatch.footer else "")
+    try:
+        # Cached, the engines reuse the compiled templates
+        prepare_message(subject, body)
+    except TemplateSyntaxError as e:
+        logger.error("Dispatch %s has an invalid template: %s", dispatch.pk, e)
+        fail_jobs(jobs, f"Invalid template: {e}")
+        return SendReport()
+    send = get_engine(engine)
+    batch_size = batch_size or settings.DISPATCH_OUTBOX_BATCH_SIZE
+    report = SendReport()
+    started = time.perf_counter()
+
+    query_seconds = 0.0
+
+    with EventWriter() as events:
+        while True:
+            claim_started = time.perf_counter()
+            batch = claim_batch(jobs, batch_size)
+            claim_seconds = time.perf_counter() - claim_started
+            query_seconds += claim_seconds
+            RECIPIENT_QUERY_SECONDS.observe(claim_seconds)
+            if not batch:
+                break
+            if not (batch := skip_suppressed(batch)):
+                continue
+            recipients = {item.address: Recipient(item.address, item.name) for item in batch}
+            batch_report = send(subject, body, sorted(recipients.values(), key=_recipient_domain))
+            for job in jobs:
+                if items := [item for item in batch if item.job_id == job.pk]:
+                    record_results(job, items, batch_report, events)
+                    publish_stats(job.dispatch_id)
+            report.add(batch_report)
+            registry.flush_if_due()
+
+    for job in jobs:
+        if not job.items.filter(status__in=[DeliveryItem.PENDING, DeliveryItem.CLAIMED]).exists():
+            DeliveryJob.objects.filter(pk=job.pk).exclude(status=DeliveryJob.DONE).update(
+                status=DeliveryJob.DONE, finished_at=now(), updated_at=now())
+            publish_stats(job.dispatch_id)
+
+    report.elapsed = time.perf_counter() - started
+    logger.info(json.dumps({
+        "event": "send_summary",
+        "dispatches": sorted({job.dispatch_id for job in jobs}),
+        "jobs": [job.pk for job in jobs],
+        "sent": report.sent,
+        "failed": len(report.failures),
+        "elapsed": round(report.elapsed, 3),
+        "rate": round(report.rate, 1),
+        "recipient_query_seconds": round(query_seconds, 3),
+        "message_build_seconds": round(report.build_seconds, 3),
+        "smtp_seconds": round(report.smtp_seconds, 3),
+        "throttled_seconds": round(report.throttled, 3),
+    }))
+    return report
+
+
+def run_job(job: DeliveryJob, engine: str | None = None, batch_size: int | None = None) -> SendReport:
+    """
+    Works through the pending items of `job` in claimed batches until none are left.
+
+    Several processes can run the same job at once, each claims its own batches.
+    The job is marked done by whichever worker finds no pending or claimed items left,
+    items waiting for a retry keep it running until `jobs_with_due_retries` picks it up again.
+    """
+    return run_jobs([job], engine=engine, batch_size=batch_size)
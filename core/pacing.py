@@ -0,0 +1,106 @@
+import datetime
+import math
+from collections import defaultdict
+from itertools import accumulate
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.utils.timezone import now
+
+from .models import DeliveryEvent, DeliveryItem, DeliveryJob
+
+_EPOCH = datetime.datetime(2000, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def slot_start(moment: datetime.datetime) -> datetime.datetime:
+    """Start of the DISPATCH_PACING_SLOT seconds long slot holding `moment`."""
+    slot = settings.DISPATCH_PACING_SLOT
+    return _EPOCH + datetime.timedelta(seconds=(moment - _EPOCH).total_seconds() // slot * slot)
+
+
+def booked_slots(since: datetime.datetime) -> dict[datetime.datetime, int]:
+    """
+    Messages per slot from the slot of `since` on: the pending ones, paced sends and retries alike,
+    and in the current slot also those already sent, read from the delivery event log.
+    """
+    start = slot_start(since)
+    items = DeliveryItem.objects.filter(status=DeliveryItem.PENDING, retry_at__gte=start)
+    booked = defaultdict(int)
+    for retry_at, count in items.values('retry_at').annotate(count=Count('pk')).values_list('retry_at', 'count'):
+        booked[slot_start(retry_at)] += count
+    booked[start] += DeliveryEvent.objects.filter(created_at__gte=start).count()
+    return booked
+
+
+def plan_slots(count: int, rate: float, booked: dict[datetime.datetime, int],
+               moment: datetime.datetime) -> list[tuple[datetime.datetime, int]]:
+    """
+    Books `count` messages at `rate` per second from the current slot on, in the room the relay
+    (DISPATCH_RELAY_CAPACITY per second) has left next to `booked`, which is updated in place.
+    Returns `(slot start, messages)` for every slot used.
+    """
+    slot = settings.DISPATCH_PACING_SLOT
+    capacity = max(1, int(settings.DISPATCH_RELAY_CAPACITY * slot))
+    quota = max(1, min(capacity, math.ceil(rate * slot)))
+    plan = []
+    start = slot_start(moment)
+    while count > 0:
+        take = min(count, quota, capacity - booked[start])
+        if take > 0:
+            plan.append((start, take))
+            booked[start] += take
+            count -= take
+        start += datetime.timedelta(seconds=slot)
+    return plan
+
+
+def job_rate(job: DeliveryJob, pending: int) -> float:
+    """
+    Messages per second of a paced job: its share of the send window, but never more than the schedule's
+    `rate` or the relay capacity. A send too large for its window runs at the highest rate allowed and ends later.
+    """
+    scheduler = job.dispatch.scheduler
+    limit = min(scheduler.rate or settings.DISPATCH_RELAY_CAPACITY, settings.DISPATCH_RELAY_CAPACITY)
+    return min(limit, pending / (scheduler.send_window * 60))
+
+
+def pace_job(job: DeliveryJob, moment: datetime.datetime | None = None) -> datetime.datetime | None:
+    """
+    Spreads the pending items of `job` that are not paced or waiting for a retry yet across the send window
+    of its dispatch's scheduler, so pacing a resumed job again changes nothing.
+
+    Every item gets the start of its slot as `retry_at`, so the outbox only claims the items whose slot
+    has begun and the scheduler wakes up for each slot (see `next_retry_at`). The first slot is the current one
+    and goes out right away. Items are assigned to slots in id order with one UPDATE per slot.
+    Returns the expected finish time, also stored on the job, or None when the schedule is not paced.
+    """
+    scheduler = job.dispatch.scheduler
+    if scheduler is None or not scheduler.send_window:
+        return None
+    moment = moment or now()
+    pending = job.items.filter(status=DeliveryItem.PENDING, retry_at__isnull=True)
+    count = pending.count()
+    if not count:
+        return None
+
+    plan = plan_slots(count, job_rate(job, count), booked_slots(moment), moment)
+    # First item id of every slot, read as a stream of ids so memory only grows with the number of slots
+    offsets = list(accumulate((taken for _, taken in plan[:-1]), initial=0))
+    boundaries = []
+    for position, pk in enumerate(pending.order_by('pk').values_list('pk', flat=True).iterator(chunk_size=10_000)):
+        if position == offsets[len(boundaries)]:
+            boundaries.append(pk)
+            if len(boundaries) == len(offsets):
+                break
+
+    finish = plan[-1][0] + datetime.timedelta(seconds=settings.DISPATCH_PACING_SLOT)
+    with transaction.atomic():
+        for n, (start, _) in enumerate(plan):
+            items = pending.filter(pk__gte=boundaries[n])
+            if n + 1 < len(boundaries):
+                items = items.filter(pk__lt=boundaries[n + 1])
+            items.update(retry_at=start)
+        DeliveryJob.objects.filter(pk=job.pk).update(expected_finish_at=finish)
+    job.expected_finish_at = finish
+    return finish
@@ -0,0 +1,102 @@
+import multiprocessing
+import queue
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import Manager
+from typing import Iterable
+
+from django.conf import settings
+from django.core.mail import get_connection
+
+from .delivery import SendReport, iter_chunks, send_batched
+from .metrics import registry
+
+
+def _init_process() -> None:
+    """Makes spawned (non-forked) worker processes usable with the project settings."""
+    import django
+    from django.apps import apps
+
+    if not apps.ready:
+        django.setup()
+
+
+def _run_shard(shards, subject: str, body: str, chunk_size: int, recipients_per_message: int | None
+               ) -> tuple[SendReport, list]:
+    """
+    Drains recipient chunks from the shared queue through this worker's own persistent connection.
+
+    A worker process returns its metric increments with its report instead of flushing them itself,
+    a forked worker would write them through the database connection of its parent.
+    """
+    recipients = (recipient for chunk in iter(shards.get, None) for recipient in chunk)
+    report = send_batched(subject, body, recipients, chunk_size=chunk_size,
+                          connection=get_connection(fail_silently=False),
+                          recipients_per_message=recipients_per_message)
+    # Metrics of a worker process would die with it, threads share the registry of the process
+    return report, registry.collect() if multiprocessing.parent_process() is not None else []
+
+
+def _put(shards, item, futures, timeout: float = 0.1) -> None:
+    """Blocks until the queue accepts `item`, giving up once no worker is left to consume it."""
+    while not all(future.done() for future in futures):
+        try:
+            shards.put(item, timeout=timeout)
+            return
+        except queue.Full:
+            continue
+
+
+def send_parallel(subject: str, body: str, recipients: Iterable[str], workers: int | None = None,
+                  pool: str | None = None, max_in_flight: int | None = None,
+                  chunk_size: int | None = None, recipients_per_message: int | None = None) -> SendReport:
+    """
+    Sends messages from a pool of workers, each holding its own persistent backend connection.
+
+    Recipients are streamed into a bounded queue of chunks (shards) that the workers drain,
+    so at most `max_in_flight` messages are waiting for a worker at any time.
+    `pool` is either "thread" or "process".
+    """
+    workers = workers or settings.DISPATCH_WORKERS
+    pool = pool or settings.DISPATCH_POOL
+    chunk_size = chunk_size or settings.DISPATCH_CHUNK_SIZE
+    max_in_flight = max_in_flight or settings.DISPATCH_MAX_IN_FLIGHT
+    backlog = max(1, max_in_flight // chunk_size)
+    started = time.perf_counter()
+
+    if pool == "process":
+        manager = Manager()
+        shards = manager.Queue(backlog)
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_process)
+    elif pool == "thread":
+        manager = None
+        shards = queue.Queue(backlog)
+        executor = ThreadPoolExecutor(max_workers=workers)
+    else:
+        raise ValueError(f"Unknown dispatch pool: {pool!r}")
+
+    try:
+        with executor:
+            futures = [executor.submit(_run_shard, shards, subject, body, chunk_size, recipients_per_message)
+                       for _ in range(workers)]
+            try:
+                for chunk in iter_chunks(recipients, chunk_size):
+                    _put(shards, chunk, futures)
+                    if any(future.done() for future in futures):
+                        # A shard only finishes early when it failed, stop feeding and report its error
+                        break
+            finally:
+                # One sentinel per worker so every shard finishes its last chunk and closes its connection
+                for _ in futures:
+                    _put(shards, None, futures)
+            reports = [future.result() for future in futures]
+    finally:
+        if manager is not None:
+            manager.shutdown()
+
+    report = SendReport()
+    for shard, metrics in reports:
+        report.add(shard)
+        registry.merge(metrics)
+    report.elapsed = time.perf_counter() - started
+    return report
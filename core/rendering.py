@@ -0,0 +1,185 @@
+from email.utils import formatdate, make_msgid
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.mail import EmailMessage
+from django.core.mail.message import RFC5322_EMAIL_LINE_LENGTH_LIMIT, forbid_multi_line_headers
+from django.core.mail.utils import DNS_NAME
+
+from .templating import CompiledTemplate, is_template, recipient_context
+
+# To header of messages delivered to several envelope (Bcc) recipients at once
+UNDISCLOSED_RECIPIENTS = "undisclosed-recipients:;"
+
+
+def _with_linesep(text: str, linesep: str) -> str:
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text if linesep == "\n" else text.replace("\n", linesep)
+
+
+def _message_headers(to: str, encoding: str, linesep: str) -> str:
+    return (
+        f"To: {forbid_multi_line_headers('To', to, encoding)[1]}{linesep}"
+        f"Date: {formatdate(localtime=settings.EMAIL_USE_LOCALTIME)}{linesep}"
+        f"Message-ID: {make_msgid(domain=DNS_NAME)}{linesep}"
+    )
+
+
+class PreparedMessage:
+    """
+    MIME message of a dispatch built and encoded once and shared by every recipient.
+
+    Only the To, Date and Message-ID headers are rendered per message, everything else
+    (subject, from, body and its transfer encoding) is serialized on first use and reused.
+    """
+    per_message_headers = ("To", "Date", "Message-ID")
+    personalized = False
+
+    def __init__(self, subject: str, body: str, from_email: str):
+        self.subject = subject
+        self.body = body
+        self.from_email = from_email
+        self.encoding = settings.DEFAULT_CHARSET
+        self.mime = EmailMessage(subject=subject, body=body, from_email=from_email).message()
+        for header in self.per_message_headers:
+            del self.mime[header]
+        self._payloads = {}
+
+    def payload(self, linesep: str = "\n") -> bytes:
+        """Shared headers and body, serialized once per line separator."""
+        if linesep not in self._payloads:
+            self._payloads[linesep] = self.mime.as_bytes(linesep=linesep)
+        return self._payloads[linesep]
+
+    def render(self, recipients: list[str], linesep: str = "\n") -> bytes:
+        """Complete message for `recipients`, a single one is named in To, several are undisclosed."""
+        to = recipients[0] if len(recipients) == 1 else UNDISCLOSED_RECIPIENTS
+        return _message_headers(to, self.encoding, linesep).encode() + self.payload(linesep)
+
+    def message_for(self, recipients: list[str]) -> "PreparedEmailMessage":
+        """EmailMessage for any Django backend, several recipients go into Bcc of one message."""
+        return PreparedEmailMessage(self, recipients)
+
+
+class _RenderedMIME:
+    """The part of the MIME message interface Django's mail backends use."""
+
+    def __init__(self, render, charset, encoding: str):
+        self.render = render
+        self.charset = charset
+        self.encoding = encoding
+        self.serialized = {}
+
+    def get_charset(self):
+        return self.charset
+
+    def as_bytes(self, unixfrom: bool = False, linesep: str = "\n") -> bytes:
+        # Kept so a message built ahead of sending (and every retry of it) is serialized once
+        if linesep not in self.serialized:
+            self.serialized[linesep] = self.render(linesep)
+        return self.serialized[linesep]
+
+    def as_string(self, unixfrom: bool = False, linesep: str = "\n") -> str:
+        return self.as_bytes(unixfrom, linesep).decode(self.encoding)
+
+
+class PreparedEmailMessage(EmailMessage):
+    """EmailMessage whose `message()` reuses the pre-rendered payload instead of building a new MIME tree."""
+
+    def __init__(self, prepared: PreparedMessage, recipients: list[str]):
+        single = len(recipients) == 1
+        super().__init__(subject=prepared.subject, body=prepared.body, from_email=prepared.from_email,
+                         to=recipients if single else None, bcc=None if single else recipients)
+        self.prepared = prepared
+        self.rendered = None
+
+    def message(self):
+        if self.rendered is None:
+            self.rendered = _RenderedMIME(lambda linesep: self.prepared.render(self.recipients(), linesep),
+                                          self.prepared.mime.get_charset(), self.prepared.encoding)
+        return self.rendered
+
+
+class PersonalizedMessage:
+    """
+    Dispatch whose subject or body is a template, rendered for one recipient per message.
+
+    The templates are compiled once, every message only substitutes the recipient's variables
+    (see `core.templating.Recipient`). UTF-8 text without overlong lines, which Django would send
+    as 7bit or 8bit, is serialized directly with the same headers, anything else goes through
+    the `email` package like a regular EmailMessage.
+    """
+    personalized = True
+
+    def __init__(self, subject: str, body: str, from_email: str):
+        self.subject = CompiledTemplate(subject)
+        self.body = CompiledTemplate(body)
+        self.from_email = from_email
+        self.encoding = settings.DEFAULT_CHARSET
+        mime = EmailMessage(from_email=from_email).message()
+        self.charset = mime.get_charset()
+        self.from_header = mime["From"]
+
+    def render_content(self, recipient: str) -> tuple[str, str]:
+        context = recipient_context(recipient)
+        return self.subject.render(context), self.body.render(context)
+
+    def encode(self, subject: str, body: str, recipient: str, linesep: str = "\n") -> bytes:
+        long_lines = max(map(len, body.splitlines()), default=0) > RFC5322_EMAIL_LINE_LENGTH_LIMIT
+        if self.encoding.lower() != "utf-8" or long_lines:
+            message = EmailMessage(subject=subject, body=body, from_email=self.from_email, to=[str(recipient)])
+            return message.message().as_bytes(linesep=linesep)
+        if not (subject.isascii() and len(subject) <= 76 and "\n" not in subject and "\r" not in subject):
+            # Encoded and folded the way Django does it, short ASCII subjects come out unchanged
+            subject = _with_linesep(str(forbid_multi_line_headers("Subject", subject, self.encoding)[1]), linesep)
+        headers = (
+            f'Content-Type: text/plain; charset="{self.encoding}"{linesep}'
+            f"MIME-Version: 1.0{linesep}"
+            f"Content-Transfer-Encoding: {'7bit' if body.isascii() else '8bit'}{linesep}"
+            f"Subject: {subject}{linesep}"
+            f"From: {self.from_header}{linesep}"
+        )
+        return (headers + _message_headers(recipient, self.encoding, linesep) + linesep
+                + _with_linesep(body, linesep)).encode(self.encoding)
+
+    def render(self, recipients: list[str], linesep: str = "\n") -> bytes:
+        recipient, = recipients
+        return self.encode(*self.render_content(recipient), recipient, linesep)
+
+    def message_for(self, recipients: list[str]) -> "PersonalizedEmailMessage":
+        recipient, = recipients
+        return PersonalizedEmailMessage(self, recipient)
+
+
+class PersonalizedEmailMessage(EmailMessage):
+    """EmailMessage with the subject and body rendered for its one recipient."""
+
+    def __init__(self, personalized: PersonalizedMessage, recipient: str):
+        subject, body = personalized.render_content(recipient)
+        super().__init__(subject=subject, body=body, from_email=personalized.from_email, to=[str(recipient)])
+        self.personalized = personalized
+        self.rendered = None
+
+    def message(self):
+        if self.rendered is None:
+            self.rendered = _RenderedMIME(
+                lambda linesep: self.personalized.encode(self.subject, self.body, self.to[0], linesep),
+                self.personalized.charset, self.personalized.encoding)
+        return self.rendered
+
+
+@lru_cache(maxsize=32)
+def _prepare_message(subject: str, body: str, from_email: str) -> PreparedMessage | PersonalizedMessage:
+    if is_template(subject) or is_template(body):
+        return PersonalizedMessage(subject, body, from_email)
+    return PreparedMessage(subject, body, from_email)
+
+
+def prepare_message(subject: str, body: str) -> PreparedMessage | PersonalizedMessage:
+    """
+    Shared rendering of a dispatch, reused by every batch and worker of the process sending it.
+
+    Keyed by the content itself, so an edited dispatch or footer gets a fresh entry and dispatches
+    with the same content share one. Templated content gives a `PersonalizedMessage`.
+    """
+    return _prepare_message(subject, body, settings.DEFAULT_FROM_EMAIL)
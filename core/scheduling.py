@@ -0,0 +1,221 @@
+import datetime
+import heapq
+from typing import Callable, Iterable, Iterator
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.timezone import now
+
+from .delivery import compose_message
+from .models import DeliveryJob, Dispatch
+from .outbox import jobs_with_due_retries, run_job, run_jobs, stalled_jobs, start_job
+from .pacing import pace_job
+
+
+def _content_key(dispatch: Dispatch) -> tuple[str, str]:
+    return dispatch.subject, compose_message(dispatch.text, dispatch.footer.text if dispatch.footer else "")
+
+
+def _claim_due(pk: int, groups: dict | None = None) -> tuple[Dispatch | None, DeliveryJob | None]:
+    """
+    Locks dispatch `pk` if it is still due, moves next_due_at forward and starts its delivery job,
+    paced across the send window of its scheduler if it has one (see `core.pacing`).
+
+    Concurrent runners skip the locked row and then no longer see it as due.
+    With `groups` the claimed dispatch is added to the list of dispatches with the same content,
+    and its new job leaves out the recipients of the jobs already there.
+    Returns `(None, None)` when the dispatch was claimed by another runner or is no longer due.
+    """
+    with transaction.atomic():
+        dispatch = (Dispatch.objects.due()
+                    .select_for_update(skip_locked=True, of=('self',))
+                    .select_related('send_list', 'footer', 'scheduler')
+                    .filter(pk=pk)
+                    .first())
+        if dispatch is None:
+            return None, None
+        dispatch.update_next_due_at()
+        dispatch.save(update_fields=['next_due_at', 'updated_at'])
+        group = groups.setdefault(_content_key(dispatch), []) if groups is not None else []
+        job = start_job(dispatch, [job for _, job in group if job is not None]) if dispatch.send_list else None
+        if job is not None:
+            pace_job(job)
+        group.append((dispatch, job))
+    return dispatch, job
+
+
+def send_due_dispatch(pk: int, engine: str | None = None) -> Dispatch | None:
+    """
+    Claims dispatch `pk` and sends it if it is still due.
+
+    The claim is a short transaction, the job itself runs outside of it so its progress survives a crash.
+    Returns None when the dispatch was claimed by another runner or is no longer due.
+    """
+    dispatch, job = _claim_due(pk)
+    if dispatch is not None:
+        dispatch.send(engine=engine, job=job)
+    return dispatch
+
+
+def send_due_dispatches(pks: Iterable[int], engine: str | None = None
+                        ) -> Iterator[tuple[int, Dispatch | None, Exception | None]]:
+    """
+    Sends the due dispatches `pks` and yields `(pk, dispatch, error)` for each of them,
+    `dispatch` is None when it failed or was claimed elsewhere.
+
+    With DISPATCH_COALESCE all of them are claimed first. Dispatches with the same subject and text
+    then share one set of recipients: the job of each leaves out addresses already in the jobs of the
+    others, and the jobs are sent together in batches that mail every address once.
+    Otherwise every dispatch is sent on its own, one after another.
+    """
+    if not settings.DISPATCH_COALESCE:
+        for pk in pks:
+            try:
+                yield pk, send_due_dispatch(pk, engine=engine), None
+            except Exception as e:
+                yield pk, None, e
+        return
+
+    groups = {}
+    for pk in pks:
+        try:
+            dispatch, _ = _claim_due(pk, groups)
+        except Exception as e:
+            yield pk, None, e
+            continue
+        if dispatch is None:
+            yield pk, None, None
+
+    for group in groups.values():
+        jobs = [job for _, job in group if job is not None]
+        try:
+            if jobs:
+                run_jobs(jobs, engine=engine)
+        except Exception as e:
+            for dispatch, _ in group:
+                yield dispatch.pk, None, e
+            continue
+        for dispatch, job in group:
+            try:
+                if job is not None:
+                    dispatch.mark_sent()
+            except Exception as e:
+                yield dispatch.pk, None, e
+            else:
+                yield dispatch.pk, dispatch, None
+
+
+def resume_stalled_jobs(engine: str | None = None, owns: Callable[[int], bool] | None = None) -> list[Dispatch]:
+    """
+    Finishes jobs left behind by workers that died, returns their dispatches.
+    With `owns` only the jobs of the dispatches it accepts by id are resumed.
+
+    Only the rest of the job is sent, `next_due_at` was already moved when the job was claimed.
+    """
+    resumed = []
+    for job in stalled_jobs().select_related('dispatch', 'dispatch__footer'):
+        if owns is not None and not owns(job.dispatch_id):
+            continue
+        run_job(start_job(job.dispatch), engine=engine)
+        resumed.append(job.dispatch)
+    return resumed
+
+
+def resume_dispatch(dispatch: Dispatch, engine: str | None = None) -> bool:
+    """
+    Sends the rest of the unfinished job of `dispatch`, e.g. after its send raised, returns False when it has none.
+
+    Items the failed send had claimed are handed out again once DISPATCH_OUTBOX_CLAIM_TIMEOUT has passed.
+    """
+    if not dispatch.delivery_jobs.exclude(status=DeliveryJob.DONE).exists():
+        return False
+    run_job(start_job(dispatch), engine=engine)
+    return True
+
+
+def retry_failed_deliveries(engine: str | None = None, owns: Callable[[int], bool] | None = None) -> int:
+    """
+    Runs jobs whose transiently failed or paced deliveries are due, returns how many were sent.
+    With `owns` only the jobs of the dispatches it accepts by id are run.
+    """
+    sent = 0
+    for job in jobs_with_due_retries().select_related('dispatch', 'dispatch__footer'):
+        if owns is not None and not owns(job.dispatch_id):
+            continue
+        sent += run_job(job, engine=engine).sent
+    return sent
+
+
+class DueQueue:
+    """
+    Min-heap of (next_due_at, dispatch id) kept in sync with the Dispatch table.
+
+    `refresh` only reads rows whose `updated_at` moved past the last seen watermark, and superseded
+    heap entries are skipped lazily when they reach the top instead of being removed in place.
+    With `owns` only the dispatches it accepts by id are queued, see `core.cluster`.
+    """
+    # Rows committed late can carry an `updated_at` slightly older than the watermark, re-read that window
+    overlap = datetime.timedelta(minutes=1)
+
+    def __init__(self, owns: Callable[[int], bool] | None = None):
+        self.owns = owns
+        self.heap = []
+        self.scheduled = {}
+        self.priorities = {}
+        self.watermark = None
+
+    def __len__(self):
+        return len(self.scheduled)
+
+    def schedule(self, pk: int, next_due_at: datetime.datetime | None, priority: int | None = None) -> None:
+        if priority is not None:
+            self.priorities[pk] = priority
+        if next_due_at is None:
+            self.scheduled.pop(pk, None)
+            return
+        self.scheduled[pk] = next_due_at
+        heapq.heappush(self.heap, (next_due_at, pk))
+
+    def refresh(self) -> int:
+        """Loads changed dispatches and returns how many of them were (re)scheduled."""
+        rows = Dispatch.objects.order_by()
+        if self.watermark is not None:
+            rows = rows.filter(updated_at__gte=self.watermark - self.overlap)
+
+        changed = 0
+        for pk, next_due_at, updated_at, priority in (
+                rows.values_list('pk', 'next_due_at', 'updated_at', 'priority').iterator()):
+            if self.watermark is None or updated_at > self.watermark:
+                self.watermark = updated_at
+            self.priorities[pk] = priority
+            if self.owns is not None and not self.owns(pk):
+                next_due_at = None
+            if self.scheduled.get(pk) != next_due_at:
+                self.schedule(pk, next_due_at)
+                changed += 1
+        return changed
+
+    def reload(self) -> int:
+        """Reads all dispatches again, e.g. after `owns` changed its mind, and returns how many are scheduled."""
+        self.heap, self.scheduled, self.watermark = [], {}, None
+        self.refresh()
+        return len(self)
+
+    def _discard_stale(self) -> None:
+        while self.heap and self.scheduled.get(self.heap[0][1]) != self.heap[0][0]:
+            heapq.heappop(self.heap)
+
+    def next_due_at(self) -> datetime.datetime | None:
+        self._discard_stale()
+        return self.heap[0][0] if self.heap else None
+
+    def pop_due(self, moment: datetime.datetime | None = None) -> list[int]:
+        """Removes and returns ids of dispatches due at `moment`, highest priority first and then earliest first."""
+        moment = moment or now()
+        due = []
+        while (next_due_at := self.next_due_at()) is not None and next_due_at <= moment:
+            _, pk = heapq.heappop(self.heap)
+            del self.scheduled[pk]
+            due.append(pk)
+        due.sort(key=lambda pk: -self.priorities.get(pk, Dispatch.NORMAL))
+        return due
@@ -0,0 +1,173 @@
+import datetime
+import random
+import time
+from dataclasses import dataclass, field
+from itertools import accumulate
+
+from django.db import transaction
+from django.db.models import Max
+
+from .models import Dispatch, Email, Footer, Scheduler, SendList
+
+DISTRIBUTIONS = ("uniform", "zipf")
+DEFAULT_SCHEDULER_MIX = {"daily": 4, "weekly": 3, "monthly": 2, "none": 1}
+DOMAINS = (("gmail.com", 40), ("yahoo.com", 15), ("outlook.com", 15), ("mail.ru", 10), ("yandex.ru", 10),
+           ("example.com", 10))
+
+
+@dataclass
+class SeedReport:
+    emails: int = 0
+    send_lists: int = 0
+    memberships: int = 0
+    dispatches: int = 0
+    elapsed: float = 0.0
+    timings: dict[str, float] = field(default_factory=dict)
+
+    def __str__(self):
+        return (f"{self.emails} emails, {self.send_lists} send lists, {self.memberships} memberships "
+                f"and {self.dispatches} dispatches in {self.elapsed:.1f}s")
+
+
+def parse_scheduler_mix(value: str) -> dict[str, int]:
+    """Parses weights like "daily=4,weekly=3,monthly=2,none=1"."""
+    mix = {}
+    for part in value.split(","):
+        frequency, _, weight = part.partition("=")
+        frequency = frequency.strip()
+        if frequency not in dict(Scheduler.FREQUENCY_CHOICES) and frequency != "none":
+            raise ValueError(f"Unknown scheduler frequency: {frequency!r}")
+        mix[frequency] = int(weight or 1)
+    return mix
+
+
+class Seeder:
+    """
+    Creates load-testing data with bulk inserts, deterministic for a given `seed` on an empty database.
+
+    Every email joins `lists_per_email` send lists on average, chosen uniformly or following a Zipf law
+    (a few huge lists and a long tail of small ones). Numbering continues after the highest existing ids,
+    so seeding twice adds more rows instead of failing on unique titles and addresses.
+    """
+
+    def __init__(self, seed: int = 0, batch_size: int = 10_000, inactive_ratio: float = 0.0,
+                 lists_per_email: float = 1.0, distribution: str = "uniform", zipf_exponent: float = 1.1):
+        if distribution not in DISTRIBUTIONS:
+            raise ValueError(f"Unknown membership distribution: {distribution!r}")
+        self.random = random.Random(seed)
+        self.batch_size = batch_size
+        self.inactive_ratio = inactive_ratio
+        self.lists_per_email = lists_per_email
+        self.distribution = distribution
+        self.zipf_exponent = zipf_exponent
+        # Small pools of names combined at random are much faster than a Faker call per row
+        self.first_names = [f"Name{n}" for n in range(200)]
+        self.last_names = [f"Surname{n}" for n in range(500)]
+        self.domains, self.domain_weights = zip(*DOMAINS)
+        self.domain_weights = list(accumulate(self.domain_weights))
+
+    def _pick_lists(self, list_ids: list[int], cum_weights: list[float] | None) -> set[int]:
+        count = int(self.lists_per_email)
+        if self.random.random() < self.lists_per_email - count:
+            count += 1
+        count = min(count, len(list_ids))
+        picked = set()
+        while len(picked) < count:
+            if cum_weights is None:
+                picked.add(self.random.choice(list_ids))
+            else:
+                picked.add(self.random.choices(list_ids, cum_weights=cum_weights)[0])
+        return picked
+
+    def create_send_lists(self, count: int) -> list[int]:
+        start = (SendList.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+        send_lists = SendList.objects.bulk_create(
+            (SendList(title=f"Seed list {n}") for n in range(start, start + count)), batch_size=self.batch_size)
+        return [send_list.pk for send_list in send_lists]
+
+    def create_emails(self, count: int, list_ids: list[int]) -> int:
+        """Creates `count` emails and their memberships batch by batch, returns the number of memberships."""
+        cum_weights = None
+        if self.distribution == "zipf" and list_ids:
+            cum_weights = list(accumulate(1 / (rank + 1) ** self.zipf_exponent for rank in range(len(list_ids))))
+        through = SendList.emails.through
+        active_counts = dict.fromkeys(list_ids, 0)
+        memberships = 0
+        start = (Email.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+        for offset in range(start, start + count, self.batch_size):
+            numbers = range(offset, min(start + count, offset + self.batch_size))
+            emails = []
+            for n in numbers:
+                first, last = self.random.choice(self.first_names), self.random.choice(self.last_names)
+                domain = self.random.choices(self.domains, cum_weights=self.domain_weights)[0]
+                emails.append(Email(email=f"{first}.{last}.{n}@{domain}".lower(), name=f"{first} {last}",
+                                    active=self.random.random() >= self.inactive_ratio))
+            with transaction.atomic():
+                emails = Email.objects.bulk_create(emails)
+                rows = []
+                if list_ids and self.lists_per_email:
+                    for email in emails:
+                        for list_id in self._pick_lists(list_ids, cum_weights):
+                            rows.append(through(sendlist_id=list_id, email_id=email.pk))
+                            active_counts[list_id] += email.active
+                # Multi-row INSERTs, one round trip per `batch_size` memberships on every backend
+                through.objects.bulk_create(rows, batch_size=self.batch_size)
+            memberships += len(rows)
+
+        # Bulk inserts bypass the m2m hooks, set the recipient counters directly
+        SendList.objects.bulk_update(
+            [SendList(pk=pk, active_count=count) for pk, count in active_counts.items()],
+            ['active_count'], batch_size=self.batch_size)
+        return memberships
+
+    def create_dispatches(self, count: int, list_ids: list[int], scheduler_mix: dict[str, int]) -> int:
+        frequencies, weights = zip(*scheduler_mix.items())
+        start = (Dispatch.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+        footers = Footer.objects.bulk_create(
+            Footer(title=f"Seed footer {start}-{n}", text=f"Footer {n}") for n in range(5))
+
+        for offset in range(start, start + count, self.batch_size):
+            numbers = range(offset, min(start + count, offset + self.batch_size))
+            picked = self.random.choices(frequencies, weights=weights, k=len(numbers))
+            schedulers = Scheduler.objects.bulk_create(
+                Scheduler(frequency=frequency,
+                          time_of_day=datetime.time(self.random.randrange(24), self.random.choice((0, 15, 30, 45))))
+                for frequency in picked if frequency != "none")
+            schedulers = iter(schedulers)
+            dispatches = []
+            for n, frequency in zip(numbers, picked):
+                dispatch = Dispatch(
+                    title=f"Seed dispatch {n}", subject=f"Seed subject {n}",
+                    text=" ".join(self.random.choices(self.last_names, k=self.random.randrange(20, 200))),
+                    send_list_id=self.random.choice(list_ids) if list_ids else None,
+                    footer=self.random.choice(footers),
+                    scheduler=next(schedulers) if frequency != "none" else None,
+                )
+                # bulk_create skips Dispatch.save, which would compute the due date
+                dispatch.update_next_due_at()
+                dispatches.append(dispatch)
+            Dispatch.objects.bulk_create(dispatches)
+        return count
+
+    def seed(self, emails: int = 0, send_lists: int = 0, dispatches: int = 0,
+             scheduler_mix: dict[str, int] | None = None) -> SeedReport:
+        report = SeedReport()
+        started = time.perf_counter()
+
+        def timed(name, create, *args):
+            step_started = time.perf_counter()
+            result = create(*args)
+            report.timings[name] = time.perf_counter() - step_started
+            return result
+
+        list_ids = timed("send_lists", self.create_send_lists, send_lists) if send_lists else []
+        report.send_lists = len(list_ids)
+        if emails:
+            report.memberships = timed("emails", self.create_emails, emails, list_ids)
+            report.emails = emails
+        if dispatches:
+            report.dispatches = timed("dispatches", self.create_dispatches, dispatches, list_ids,
+                                      scheduler_mix or DEFAULT_SCHEDULER_MIX)
+        report.elapsed = time.perf_counter() - started
+        return report
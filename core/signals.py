@@ -0,0 +1,73 @@
+"""
+Hooks keeping `SendList.active_count` in line with the send list memberships and `Email.active`.
+
+Bulk operations that bypass signals (`bulk_create` of memberships, `QuerySet.update(active=...)`)
+have to adjust the counters themselves, see `EmailQuerySet.set_active`, or be followed by the
+`reconcile_recipient_counts` command.
+"""
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_save, pre_delete
+from django.dispatch import receiver
+
+from .models import Email, SendList
+
+Membership = SendList.emails.through
+
+
+def _add_to_lists(list_ids, step: int) -> None:
+    if list_ids:
+        SendList.objects.filter(pk__in=list_ids).update(active_count=F('active_count') + step)
+
+
+def _add_to_list(send_list: SendList, step: int) -> None:
+    if step:
+        SendList.objects.filter(pk=send_list.pk).update(active_count=F('active_count') + step)
+    send_list.refresh_from_db(fields=['active_count'])
+
+
+@receiver(m2m_changed, sender=Membership)
+def update_active_count_on_membership(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    `instance` is the send list for `send_list.emails.add()` and friends, and the email when
+    the relation is changed from its side (`reverse`). Removals only count the memberships
+    that actually existed, so they are looked up before the rows are deleted.
+    """
+    if not reverse:
+        if action == 'post_add':
+            _add_to_list(instance, Email.objects.filter(pk__in=pk_set, active=True).count())
+        elif action == 'pre_remove':
+            instance._removed_active = Membership.objects.filter(
+                sendlist_id=instance.pk, email_id__in=pk_set, email__active=True).count()
+        elif action == 'post_remove':
+            _add_to_list(instance, -instance.__dict__.pop('_removed_active', 0))
+        elif action == 'post_clear':
+            SendList.objects.filter(pk=instance.pk).update(active_count=0)
+            instance.active_count = 0
+        return
+
+    if not instance.active:
+        return
+    if action == 'post_add':
+        _add_to_lists(pk_set, 1)
+    elif action in ('pre_remove', 'pre_clear'):
+        memberships = Membership.objects.filter(email_id=instance.pk)
+        if action == 'pre_remove':
+            memberships = memberships.filter(sendlist_id__in=pk_set)
+        instance._removed_from = list(memberships.values_list('sendlist_id', flat=True))
+    elif action in ('post_remove', 'post_clear'):
+        _add_to_lists(instance.__dict__.pop('_removed_from', []), -1)
+
+
+@receiver(post_save, sender=Email)
+def update_active_count_on_activation(sender, instance, created, update_fields, **kwargs):
+    previous = getattr(instance, '_active_in_db', None)
+    if (not created and previous is not None and previous != instance.active
+            and (update_fields is None or 'active' in update_fields)):
+        SendList.adjust_active_counts([instance.pk], 1 if instance.active else -1)
+    instance._active_in_db = instance.active
+
+
+@receiver(pre_delete, sender=Email)
+def update_active_count_on_delete(sender, instance, **kwargs):
+    if instance.active:
+        SendList.adjust_active_counts([instance.pk], -1)
@@ -0,0 +1,120 @@
+import asyncio
+import threading
+from collections import defaultdict
+from typing import AsyncIterator
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .models import DeliveryJob, Dispatch, SendTask
+
+
+def dispatch_stats(dispatch_id: int) -> dict | None:
+    """Counters shown on the dispatch page, including the progress of its latest delivery job."""
+    dispatch = Dispatch.objects.filter(pk=dispatch_id).values('sent_times', 'send_list__active_count').first()
+    if dispatch is None:
+        return None
+    job = (DeliveryJob.objects.filter(dispatch_id=dispatch_id).order_by('-created_at')
+           .values('status', 'total', 'sent', 'failed').first()) or {'status': None, 'total': 0, 'sent': 0, 'failed': 0}
+    # A "send now" waiting for a worker has no job yet
+    queued = SendTask.objects.filter(dispatch_id=dispatch_id, status=SendTask.QUEUED).exists()
+    return {
+        'recipients_count': dispatch['send_list__active_count'],
+        'sent_times': dispatch['sent_times'],
+        'status': SendTask.QUEUED if queued else job['status'],
+        'sent': job['sent'],
+        'failed': job['failed'],
+        'in_progress': job['total'] - job['sent'] - job['failed'],
+    }
+
+
+class _Subscription:
+    """Mailbox of one viewer holding only the latest stats, a slow viewer skips updates instead of queueing them."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=1)
+
+    def offer(self, stats: dict) -> None:
+        try:
+            self.loop.call_soon_threadsafe(self._replace, stats)
+        except RuntimeError:
+            # The viewer's event loop is already closed
+            pass
+
+    def _replace(self, stats: dict) -> None:
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(stats)
+
+
+class StatsBroadcaster:
+    """
+    Fans the stats of a dispatch out to every viewer subscribed in this process.
+
+    Sends running in this process publish after every batch. Sends running elsewhere (the scheduler)
+    are picked up by a single poller per watched dispatch that reads the stats every DISPATCH_STATS_INTERVAL
+    seconds, so the database cost does not grow with the number of viewers.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = defaultdict(set)
+        self.latest = {}
+        self.pollers = {}
+
+    def has_subscribers(self, dispatch_id: int) -> bool:
+        return bool(self.subscribers.get(dispatch_id))
+
+    def publish(self, dispatch_id: int, stats: dict | None) -> None:
+        with self.lock:
+            if stats is None or stats == self.latest.get(dispatch_id):
+                return
+            self.latest[dispatch_id] = stats
+            subscriptions = list(self.subscribers.get(dispatch_id, ()))
+        for subscription in subscriptions:
+            subscription.offer(stats)
+
+    async def _poll(self, dispatch_id: int) -> None:
+        while True:
+            with self.lock:
+                if not self.subscribers.get(dispatch_id):
+                    if self.pollers.get(dispatch_id) is asyncio.current_task():
+                        del self.pollers[dispatch_id]
+                        self.latest.pop(dispatch_id, None)
+                    return
+            self.publish(dispatch_id, await sync_to_async(dispatch_stats)(dispatch_id))
+            await asyncio.sleep(settings.DISPATCH_STATS_INTERVAL)
+
+    async def subscribe(self, dispatch_id: int, keepalive: float | None = None) -> AsyncIterator[dict | None]:
+        """Yields the stats of `dispatch_id` whenever they change, and None after `keepalive` quiet seconds."""
+        loop = asyncio.get_running_loop()
+        subscription = _Subscription(loop)
+        with self.lock:
+            self.subscribers[dispatch_id].add(subscription)
+            latest = self.latest.get(dispatch_id)
+            poller = self.pollers.get(dispatch_id)
+            if poller is None or poller.done() or poller.get_loop() is not loop:
+                self.pollers[dispatch_id] = loop.create_task(self._poll(dispatch_id))
+        try:
+            if latest is not None:
+                yield latest
+            while True:
+                try:
+                    yield await asyncio.wait_for(subscription.queue.get(), keepalive)
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            with self.lock:
+                self.subscribers[dispatch_id].discard(subscription)
+                if not self.subscribers[dispatch_id]:
+                    del self.subscribers[dispatch_id]
+
+
+broadcaster = StatsBroadcaster()
+
+
+def publish_stats(dispatch_id: int) -> None:
+    """Pushes fresh stats to the viewers of `dispatch_id` in this process, free when nobody is watching."""
+    if broadcaster.has_subscribers(dispatch_id):
+        broadcaster.publish(dispatch_id, dispatch_stats(dispatch_id))
@@ -0,0 +1,80 @@
+import datetime
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Min
+from django.utils.timezone import now
+
+from .models import DeliveryItem, Dispatch, SendTask
+from .stats import publish_stats
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_send(dispatch: Dispatch, engine: str | None = None) -> SendTask:
+    """
+    Queues a send of `dispatch` for `run_send_worker` and returns at once, whatever the size of its send list.
+
+    A dispatch with a send already queued or running gets that task back instead of a second one.
+    """
+    with transaction.atomic():
+        Dispatch.objects.select_for_update().filter(pk=dispatch.pk).first()
+        task = dispatch.send_tasks.filter(status__in=[SendTask.QUEUED, SendTask.RUNNING]).order_by('pk').first()
+        if task is None:
+            task = SendTask.objects.create(dispatch=dispatch, engine=engine or "")
+    publish_stats(dispatch.pk)
+    return task
+
+
+def claim_tasks(limit: int) -> list[SendTask]:
+    """Marks up to `limit` of the oldest queued tasks as running and returns them, concurrent workers skip them."""
+    moment = now()
+    with transaction.atomic():
+        ids = list(SendTask.objects.filter(status=SendTask.QUEUED).order_by('pk')
+                   .select_for_update(skip_locked=True).values_list('pk', flat=True)[:limit])
+        SendTask.objects.filter(pk__in=ids).update(status=SendTask.RUNNING, started_at=moment, updated_at=moment)
+    return list(SendTask.objects.filter(pk__in=ids).select_related('dispatch').order_by('pk'))
+
+
+def touch_tasks(tasks: list[SendTask]) -> None:
+    """Heartbeat of the tasks a worker is running, see `requeue_stalled_tasks`."""
+    if tasks:
+        SendTask.objects.filter(pk__in=[task.pk for task in tasks], status=SendTask.RUNNING).update(updated_at=now())
+
+
+def requeue_stalled_tasks() -> int:
+    """Queues again the running tasks without a heartbeat for SEND_TASK_TIMEOUT seconds, their worker is gone."""
+    cutoff = now() - datetime.timedelta(seconds=settings.SEND_TASK_TIMEOUT)
+    return SendTask.objects.filter(status=SendTask.RUNNING, updated_at__lt=cutoff).update(
+        status=SendTask.QUEUED, updated_at=now())
+
+
+def _deferred_reason(dispatch_id: int) -> str:
+    retry_at = DeliveryItem.objects.filter(
+        job__dispatch_id=dispatch_id, status=DeliveryItem.PENDING, retry_at__isnull=False).aggregate(
+        retry_at=Min('retry_at'))['retry_at']
+    if retry_at is None:
+        return "Nothing to send yet, the unfinished delivery job is being sent by another worker"
+    return f"Nothing to send yet, the deliveries left are retried from {retry_at.isoformat(timespec='seconds')} on"
+
+
+def run_task(task: SendTask) -> SendTask:
+    """
+    Sends the dispatch of a claimed task and records how it ended. A send that resumed a job whose deliveries
+    all wait for retries is recorded as deferred, the scheduler sends them once they are due.
+    """
+    try:
+        sent = task.dispatch.send(engine=task.engine or None)
+    except Exception as e:
+        logger.exception("Send task %s of dispatch %s failed", task.pk, task.dispatch_id)
+        task.status, task.error = SendTask.FAILED, str(e)
+    else:
+        if sent:
+            task.status, task.error = SendTask.DONE, ""
+        else:
+            task.status, task.error = SendTask.DEFERRED, _deferred_reason(task.dispatch_id)
+    task.finished_at = now()
+    task.save(update_fields=['status', 'error', 'finished_at', 'updated_at'])
+    publish_stats(task.dispatch_id)
+    return task
@@ -0,0 +1,69 @@
+from django.core.exceptions import ValidationError
+from django.template import Context, Engine, TemplateSyntaxError
+from django.template.base import TextNode, Variable, VariableNode
+
+# Mail is plain text, variables are inserted as they are instead of HTML-escaped
+engine = Engine(autoescape=False)
+
+# Variables available to dispatch templates, e.g. "Hello {{ name }}"
+VARIABLES = ("email", "name")
+
+
+def is_template(text: str) -> bool:
+    """Whether `text` uses template syntax and has to be rendered for every recipient."""
+    return "{{" in text or "{%" in text
+
+
+def validate_template(text: str) -> None:
+    if text and is_template(text):
+        try:
+            engine.from_string(text)
+        except TemplateSyntaxError as e:
+            raise ValidationError(f"Invalid template: {e}")
+
+
+class Recipient(str):
+    """Address carrying the template context of its owner, it compares and hashes as the plain address."""
+
+    def __new__(cls, address: str, name: str | None = None):
+        recipient = super().__new__(cls, address)
+        recipient.name = name
+        return recipient
+
+
+def recipient_context(recipient: str) -> dict[str, str]:
+    return {"email": str(recipient), "name": getattr(recipient, "name", None) or ""}
+
+
+class CompiledTemplate:
+    """
+    Django template parsed once, rendering only substitutes the variables.
+
+    Templates made of text and plain variables, the usual case, are flattened into a list of parts
+    that is joined per recipient. Templates using tags or filters are rendered by the template engine.
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        self.template = engine.from_string(source)
+        self.parts = self._flatten(self.template.nodelist)
+
+    @staticmethod
+    def _flatten(nodelist) -> list[tuple[bool, str]] | None:
+        """`(is_variable, text or variable name)` for every node, None when anything else is used."""
+        parts = []
+        for node in nodelist:
+            if isinstance(node, TextNode):
+                parts.append((False, node.s))
+            elif (isinstance(node, VariableNode) and not node.filter_expression.filters
+                  and isinstance(node.filter_expression.var, Variable)
+                  and node.filter_expression.var.lookups and len(node.filter_expression.var.lookups) == 1):
+                parts.append((True, node.filter_expression.var.lookups[0]))
+            else:
+                return None
+        return parts
+
+    def render(self, context: dict[str, str]) -> str:
+        if self.parts is None:
+            return self.template.render(Context(context))
+        return "".join([context.get(text, "") if variable else text for variable, text in self.parts])
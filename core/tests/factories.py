@@ -34,6 +34,7 @@ class FooterFactory(DjangoModelFactory):
     class Meta:
         model = Footer
 
+    title = factory.Sequence(lambda n: f"Footer {n}")
     text = factory.Faker('sentence')
 
 
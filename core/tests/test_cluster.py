@@ -0,0 +1,101 @@
+import datetime
+from collections import Counter
+from io import StringIO
+
+from django.core import mail
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from core.cluster import ClusterNode, HashRing
+from core.scheduling import DueQueue
+from .factories import *
+
+
+@override_settings(CLUSTER_RING_REPLICAS=64)
+class HashRingTests(SimpleTestCase):
+
+    def test_keys_are_spread_over_the_nodes(self):
+        ring = HashRing(['a', 'b', 'c', 'd'])
+
+        shares = Counter(ring.owner(key) for key in range(10_000))
+
+        self.assertEqual(set(shares), {'a', 'b', 'c', 'd'})
+        for share in shares.values():
+            self.assertGreater(share, 1500)
+
+    def test_a_leaving_node_only_moves_its_own_keys(self):
+        before = HashRing(['a', 'b', 'c'])
+        after = HashRing(['a', 'b'])
+
+        for key in range(5000):
+            if before.owner(key) != 'c':
+                self.assertEqual(after.owner(key), before.owner(key))
+            else:
+                self.assertIn(after.owner(key), ('a', 'b'))
+
+    def test_empty_ring(self):
+        self.assertIsNone(HashRing([]).owner(1))
+
+
+class ClusterNodeTests(TestCase):
+
+    def test_nodes_see_each_other_and_drop_dead_ones(self):
+        first, second = ClusterNode('first'), ClusterNode('second')
+        self.assertTrue(first.owns(1))
+
+        self.assertTrue(first.refresh())
+        self.assertTrue(second.refresh())
+        self.assertTrue(first.refresh())
+        self.assertFalse(first.refresh())
+        self.assertEqual(first.ring.nodes, {'first', 'second'})
+
+        WorkerNode.objects.filter(name='second').update(heartbeat_at=timezone.now() - datetime.timedelta(minutes=5))
+        self.assertTrue(first.refresh())
+        self.assertEqual(first.ring.nodes, {'first'})
+        self.assertFalse(WorkerNode.objects.filter(name='second').exists())
+
+        first.leave()
+        self.assertFalse(WorkerNode.objects.exists())
+
+    def test_nodes_split_the_due_queue_and_take_over_a_dead_share(self):
+        dispatches = DispatchFactory.create_batch(20)
+        Dispatch.objects.update(next_due_at=timezone.now() - datetime.timedelta(minutes=1))
+        first, second = ClusterNode('first'), ClusterNode('second')
+        second.refresh()
+        first.refresh()
+        # Before it sees the newcomer the second node still owns everything
+        self.assertTrue(all(second.owns(dispatch.pk) for dispatch in dispatches))
+        second.refresh()
+        first_queue, second_queue = DueQueue(owns=first.owns), DueQueue(owns=second.owns)
+        first_queue.refresh()
+        second_queue.refresh()
+
+        first_due, second_due = set(first_queue.pop_due()), set(second_queue.pop_due())
+        self.assertTrue(first_due)
+        self.assertTrue(second_due)
+        self.assertFalse(first_due & second_due)
+        self.assertEqual(first_due | second_due, {dispatch.pk for dispatch in dispatches})
+
+        WorkerNode.objects.filter(name='second').update(heartbeat_at=timezone.now() - datetime.timedelta(minutes=5))
+        self.assertTrue(first.refresh())
+        self.assertEqual(first_queue.reload(), 20)
+
+
+class SendDispatchesClusterTests(TestCase):
+
+    def test_cron_run_only_sends_its_share(self):
+        other = ClusterNode('other')
+        other.refresh()
+        dispatches = [DispatchFactory(send_list=SendListFactory(emails=[EmailFactory()])) for _ in range(10)]
+        Dispatch.objects.update(next_due_at=timezone.now() - datetime.timedelta(minutes=1))
+
+        call_command('send_dispatches', stdout=StringIO())
+
+        # The command ran as this process's default node
+        ring = HashRing(['other', ClusterNode().name])
+        left = set(Dispatch.objects.due().values_list('pk', flat=True))
+        self.assertTrue(left)
+        self.assertEqual(left, {dispatch.pk for dispatch in dispatches if ring.owner(dispatch.pk) == 'other'})
+        self.assertEqual(len(mail.outbox), 10 - len(left))
+        # The cron run left the ring again
+        self.assertEqual(list(WorkerNode.objects.values_list('name', flat=True)), ['other'])
@@ -0,0 +1,75 @@
+import datetime
+from io import StringIO
+from unittest.mock import patch
+
+from django.core import mail
+from django.core.management import call_command
+from django.test import TestCase
+
+from core.outbox import start_job
+from .factories import *
+
+
+class SendDispatchesCommandTests(TestCase):
+
+    def create_due_dispatch(self, **kwargs):
+        dispatch = DispatchFactory(scheduler=SchedulerFactory(frequency='daily'), **kwargs)
+        Dispatch.objects.filter(pk=dispatch.pk).update(next_due_at=timezone.now() - datetime.timedelta(minutes=1))
+        return dispatch
+
+    def test_due_queryset(self):
+        due = self.create_due_dispatch()
+        DispatchFactory(scheduler=SchedulerFactory(frequency='daily'))
+        DispatchFactory()
+
+        self.assertQuerySetEqual(Dispatch.objects.due(), [due])
+
+    def test_sends_due_dispatches_and_moves_next_due_at(self):
+        dispatch = self.create_due_dispatch(send_list=SendListFactory(emails=EmailFactory.create_batch(2)))
+        not_due = DispatchFactory(scheduler=SchedulerFactory(frequency='daily'),
+                                  send_list=SendListFactory(emails=EmailFactory.create_batch(3)))
+
+        call_command('send_dispatches', stdout=StringIO())
+
+        dispatch.refresh_from_db()
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertGreater(dispatch.next_due_at, timezone.now())
+        self.assertIsNotNone(dispatch.last_sent_at)
+        self.assertFalse(Dispatch.objects.due().filter(pk=not_due.pk).exists())
+
+    def test_failing_dispatch_does_not_block_others(self):
+        self.create_due_dispatch(send_list=SendListFactory(emails=EmailFactory.create_batch(1)))
+        self.create_due_dispatch(send_list=SendListFactory(emails=EmailFactory.create_batch(1)))
+        failures = [RuntimeError("broken")]
+        out = StringIO()
+
+        def flaky_start_job(dispatch, *args):
+            if failures:
+                raise failures.pop()
+            return start_job(dispatch, *args)
+
+        with patch('core.scheduling.start_job', side_effect=flaky_start_job):
+            call_command('send_dispatches', stdout=out)
+
+        self.assertIn('Failed to send dispatch', out.getvalue())
+        self.assertIn('Total dispatched: 1', out.getvalue())
+        self.assertEqual(len(mail.outbox), 1)
+        # The failed claim was rolled back, so that dispatch is still due for the next run
+        self.assertEqual(Dispatch.objects.due().count(), 1)
+
+
+class ReconcileRecipientCountsCommandTests(TestCase):
+
+    def test_fixes_drifted_counters(self):
+        send_list = SendListFactory(emails=EmailFactory.create_batch(3))
+        untouched = SendListFactory(emails=EmailFactory.create_batch(2))
+        # Bypasses the hooks, like a raw bulk import would
+        Email.objects.filter(send_list=send_list).update(active=False)
+
+        out = StringIO()
+        call_command('reconcile_recipient_counts', stdout=out)
+
+        send_list.refresh_from_db()
+        untouched.refresh_from_db()
+        self.assertEqual((send_list.active_count, untouched.active_count), (0, 2))
+        self.assertIn('Reconciled send lists: 1', out.getvalue())
@@ -0,0 +1,158 @@
+import smtplib
+import socket
+from email import message_from_bytes
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.core import mail
+from django.test import TestCase, override_settings
+
+from core.async_delivery import send_async
+from core.delivery import send_batched, iter_chunks, get_engine
+from core.parallel import send_parallel
+from core.rendering import UNDISCLOSED_RECIPIENTS, PreparedMessage
+from .factories import *
+
+try:
+    import aiosmtplib
+    from aiosmtpd.controller import Controller
+except ImportError:
+    aiosmtplib = Controller = None
+
+
+class SendBatchedTests(TestCase):
+
+    def test_iter_chunks(self):
+        self.assertEqual(list(iter_chunks(range(5), 2)), [[0, 1], [2, 3], [4]])
+
+    def test_send_batched_reports_chunks(self):
+        recipients = [f"user{n}@example.com" for n in range(5)]
+        report = send_batched("Subject", "Body", recipients, chunk_size=2)
+
+        self.assertEqual(report.sent, 5)
+        self.assertEqual(len(report.chunk_timings), 3)
+        self.assertEqual([message.to for message in mail.outbox], [[recipient] for recipient in recipients])
+
+    def test_send_batched_records_failures_and_continues(self):
+        with patch('django.core.mail.backends.locmem.EmailBackend.send_messages',
+                   side_effect=[1, smtplib.SMTPRecipientsRefused({}), 1]):
+            report = send_batched("Subject", "Body", ["a@example.com", "b@example.com", "c@example.com"])
+
+        self.assertEqual(report.sent, 2)
+        self.assertEqual([failure[0] for failure in report.failures], ["b@example.com"])
+
+    def test_dispatch_send_opens_single_connection(self):
+        emails = EmailFactory.create_batch(3) + [EmailFactory(active=False)]
+        dispatch = DispatchFactory(send_list=SendListFactory(emails=emails))
+
+        with patch('django.core.mail.backends.locmem.EmailBackend.open') as mock_open:
+            dispatch.send()
+
+        mock_open.assert_called_once()
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(mail.outbox[0].body, f"{dispatch.text}\n\n{dispatch.footer.text}")
+
+
+    def test_prepared_message_only_changes_per_message_headers(self):
+        prepared = PreparedMessage("Subject", "Body with ünïcode", "from@example.com")
+        first = message_from_bytes(prepared.render(["a@example.com"]))
+        second = message_from_bytes(prepared.render(["b@example.com"]))
+
+        self.assertEqual((first["To"], second["To"]), ("a@example.com", "b@example.com"))
+        self.assertNotEqual(first["Message-ID"], second["Message-ID"])
+        self.assertEqual(first.get_payload(decode=True).decode(), "Body with ünïcode")
+        self.assertEqual(first["From"], "from@example.com")
+        self.assertEqual(prepared.render(["a@example.com", "b@example.com"]).count(UNDISCLOSED_RECIPIENTS.encode()), 1)
+
+    def test_send_batched_with_many_envelope_recipients(self):
+        recipients = [f"user{n}@example.com" for n in range(5)]
+        report = send_batched("Subject", "Body", recipients, recipients_per_message=2)
+
+        self.assertEqual(report.sent, 5)
+        self.assertEqual([message.bcc for message in mail.outbox], [recipients[:2], recipients[2:4], []])
+        self.assertEqual([message.to for message in mail.outbox], [[], [], ["user4@example.com"]])
+
+    def test_envelope_failure_is_recorded_for_every_recipient(self):
+        with patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError("down")):
+            report = send_batched("Subject", "Body", ["a@example.com", "b@example.com"], recipients_per_message=2)
+
+        self.assertEqual([failure[0] for failure in report.failures], ["a@example.com", "b@example.com"])
+
+
+class SendParallelTests(TestCase):
+
+    def test_get_engine(self):
+        self.assertIs(get_engine('parallel'), send_parallel)
+        self.assertIs(get_engine('core.delivery.send_batched'), send_batched)
+
+    def test_send_parallel_delivers_every_recipient(self):
+        recipients = [f"user{n}@example.com" for n in range(25)]
+        report = send_parallel("Subject", "Body", recipients, workers=3, pool="thread", chunk_size=4,
+                               max_in_flight=8)
+
+        self.assertEqual(report.sent, 25)
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), sorted(recipients))
+
+    def test_send_parallel_collects_failures(self):
+        with patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError("down")):
+            report = send_parallel("Subject", "Body", [f"user{n}@example.com" for n in range(50)], workers=2,
+                                   pool="thread", chunk_size=5, max_in_flight=5)
+
+        self.assertEqual(report.sent, 0)
+        self.assertEqual(len(report.failures), 50)
+
+    def test_dispatch_send_with_parallel_engine(self):
+        dispatch = DispatchFactory(send_list=SendListFactory(emails=EmailFactory.create_batch(6)))
+        dispatch.send(engine='parallel')
+
+        self.assertEqual(len(mail.outbox), 6)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class _SinkHandler:
+    def __init__(self):
+        self.recipients = []
+
+    async def handle_DATA(self, server, session, envelope):
+        self.recipients.extend(envelope.rcpt_tos)
+        return "250 OK"
+
+
+@skipUnless(aiosmtplib and Controller, "aiosmtplib and aiosmtpd are required for the async engine")
+class SendAsyncTests(TestCase):
+
+    def setUp(self):
+        self.handler = _SinkHandler()
+        self.controller = Controller(self.handler, hostname="127.0.0.1", port=_free_port())
+        self.controller.start()
+        self.addCleanup(self.controller.stop)
+        smtp_settings = override_settings(EMAIL_HOST="127.0.0.1", EMAIL_PORT=self.controller.port,
+                                          EMAIL_USE_TLS=False, EMAIL_USE_SSL=False)
+        smtp_settings.enable()
+        self.addCleanup(smtp_settings.disable)
+
+    def test_send_async_delivers_every_recipient(self):
+        recipients = [f"user{n}@example{n % 3}.com" for n in range(30)]
+        report = send_async("Subject", "Body", recipients, connections=4, per_host=2, max_in_flight=5,
+                            chunk_size=7)
+
+        self.assertEqual(report.sent, 30)
+        self.assertEqual(sorted(self.handler.recipients), sorted(recipients))
+
+    def test_send_async_with_many_envelope_recipients(self):
+        recipients = [f"user{n}@example.com" for n in range(10)]
+        report = send_async("Subject", "Body", recipients, connections=2, recipients_per_message=4)
+
+        self.assertEqual(report.sent, 10)
+        self.assertEqual(sorted(self.handler.recipients), sorted(recipients))
+
+    def test_dispatch_send_with_async_engine(self):
+        dispatch = DispatchFactory(send_list=SendListFactory(emails=EmailFactory.create_batch(4)))
+        dispatch.send(engine='async')
+
+        self.assertEqual(len(self.handler.recipients), 4)
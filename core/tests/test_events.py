@@ -0,0 +1,110 @@
+import datetime
+import smtplib
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.test import TestCase
+
+from core.events import EventWriter, delivery_history, drop_events, rollup_events
+from core.outbox import create_job, run_job
+from .factories import *
+
+
+class DeliveryEventTests(TestCase):
+
+    def setUp(self):
+        self.emails = EmailFactory.create_batch(3)
+        self.inactive = EmailFactory(active=False)
+        self.dispatch = DispatchFactory(send_list=SendListFactory(emails=self.emails + [self.inactive]))
+
+    def test_run_job_logs_events_and_counts_sent_messages(self):
+        with patch('django.core.mail.backends.locmem.EmailBackend.send_messages',
+                   side_effect=[1, smtplib.SMTPRecipientsRefused({'x': (550, b'unknown')}), 1]):
+            run_job(create_job(self.dispatch))
+
+        kinds = sorted(DeliveryEvent.objects.filter(dispatch=self.dispatch).values_list('kind', flat=True))
+        self.assertEqual(kinds, [DeliveryEvent.SENT, DeliveryEvent.SENT, DeliveryEvent.BOUNCED])
+        self.dispatch.refresh_from_db()
+        # Neither the inactive address nor the bounced one counts
+        self.assertEqual(self.dispatch.sent_times, 2)
+
+    def test_send_counts_what_was_sent(self):
+        self.dispatch.send()
+        self.dispatch.send()
+
+        self.assertEqual(self.dispatch.sent_times, 6)
+        self.assertIsNotNone(self.dispatch.last_sent_at)
+
+    def test_writer_flushes_full_buffers(self):
+        writer = EventWriter(buffer_size=3, flush_interval=60)
+        writer.add(self.dispatch.pk, DeliveryEvent.SENT, [email.pk for email in self.emails[:2]])
+        self.assertEqual(DeliveryEvent.objects.count(), 0)
+
+        writer.add(self.dispatch.pk, DeliveryEvent.FAILED, [self.emails[2].pk])
+        self.assertEqual(DeliveryEvent.objects.count(), 3)
+        with writer:
+            writer.add(self.dispatch.pk, DeliveryEvent.SENT, [self.emails[0].pk])
+        self.assertEqual(DeliveryEvent.objects.count(), 4)
+
+
+class DeliveryRollupTests(TestCase):
+
+    def setUp(self):
+        self.dispatch = DispatchFactory()
+        self.email = EmailFactory()
+        self.hour = timezone.now().replace(minute=0, second=0, microsecond=0) - datetime.timedelta(hours=2)
+
+    def log(self, kind, minutes, count=1):
+        DeliveryEvent.objects.bulk_create(
+            DeliveryEvent(dispatch=self.dispatch, email=self.email, kind=kind,
+                          created_at=self.hour + datetime.timedelta(minutes=minutes))
+            for _ in range(count))
+
+    def test_rollup_counts_per_hour_and_can_be_rerun(self):
+        self.log(DeliveryEvent.SENT, 5, count=3)
+        self.log(DeliveryEvent.FAILED, 10)
+        self.log(DeliveryEvent.SENT, 65)
+
+        self.assertEqual(rollup_events(), 2)
+        self.log(DeliveryEvent.BOUNCED, 70)
+        rollup_events()
+
+        rows = list(DeliveryRollup.objects.order_by('hour').values_list('hour', 'sent', 'failed', 'bounced'))
+        self.assertEqual(rows, [(self.hour, 3, 1, 0), (self.hour + datetime.timedelta(hours=1), 1, 0, 1)])
+        history = delivery_history(self.dispatch.pk)
+        self.assertEqual(history['totals'], {'sent': 4, 'failed': 1, 'bounced': 1, 'error_rate': 2 / 6})
+
+    def test_rollup_skips_deleted_dispatches(self):
+        self.log(DeliveryEvent.SENT, 5)
+        DeliveryEvent.objects.update(dispatch_id=0)
+
+        self.assertEqual(rollup_events(), 0)
+
+    def test_drop_events_removes_expired_events(self):
+        self.log(DeliveryEvent.SENT, 5)
+        self.log(DeliveryEvent.SENT, 65)
+
+        self.assertEqual(drop_events(self.hour + datetime.timedelta(hours=1)), 1)
+        self.assertEqual(DeliveryEvent.objects.count(), 1)
+
+    def test_command_and_detail_page(self):
+        self.log(DeliveryEvent.SENT, 5, count=2)
+        out = StringIO()
+        call_command('rollup_delivery_events', stdout=out)
+
+        self.assertIn('Rolled up hours: 1', out.getvalue())
+        response = self.client.get(reverse('dispatch-detail', args=[self.dispatch.pk]))
+        self.assertContains(response, 'Last 24 hours')
+        self.assertEqual(response.context['history']['totals']['sent'], 2)
+
+    def test_command_rolls_up_when_partitions_cannot_be_created(self):
+        self.log(DeliveryEvent.SENT, 5)
+        out, err = StringIO(), StringIO()
+        with patch('core.management.commands.rollup_delivery_events.ensure_partitions',
+                   side_effect=DatabaseError('updated partition constraint for default partition would be violated')):
+            call_command('rollup_delivery_events', stdout=out, stderr=err)
+
+        self.assertIn('Could not create partitions', err.getvalue())
+        self.assertIn('Rolled up hours: 1', out.getvalue())
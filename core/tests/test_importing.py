@@ -0,0 +1,96 @@
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase
+
+from core import importing
+from core.importing import import_emails, normalize_email, read_rows
+from .factories import *
+
+CSV = """Name,Email
+Ann, Ann@Example.com
+Bob,bob@example.com
+Ann again,ann@example.com
+Broken,not-an-address
+Known,known@example.com
+"""
+
+
+class ImportEmailsTests(TestCase):
+
+    def setUp(self):
+        self.known = EmailFactory(email="known@example.com", name="Kept")
+        self.send_list = SendListFactory(emails=[self.known])
+
+    def test_normalize_email(self):
+        self.assertEqual(normalize_email("  Ann@Example.COM "), "ann@example.com")
+        self.assertIsNone(normalize_email("ann@"))
+
+    def test_read_rows_without_header_and_jsonl(self):
+        self.assertEqual(list(read_rows(StringIO("a@example.com,A\nb@example.com\n"))),
+                         [("a@example.com", "A"), ("b@example.com", "")])
+        self.assertEqual(list(read_rows(StringIO('{"email": "a@example.com", "name": "A"}\n\n'), "jsonl")),
+                         [("a@example.com", "A")])
+
+    def test_import_normalizes_deduplicates_and_attaches(self):
+        report = import_emails(read_rows(StringIO(CSV)), send_list=self.send_list, batch_size=2)
+
+        self.assertEqual((report.rows, report.created, report.invalid, report.attached), (5, 2, 1, 2))
+        self.assertEqual(set(self.send_list.emails.values_list('email', flat=True)),
+                         {"ann@example.com", "bob@example.com", "known@example.com"})
+        self.assertEqual(Email.objects.get(email="ann@example.com").name, "Ann")
+        self.assertEqual(Email.objects.get(email="known@example.com").name, "Kept")
+        self.assertEqual(self.send_list.active_count, 3)
+
+        # Importing the same file again changes nothing
+        again = import_emails(read_rows(StringIO(CSV)), send_list=self.send_list)
+        self.assertEqual((again.created, again.attached, again.duplicates), (0, 0, 1))
+        self.assertEqual(SendList.objects.get(pk=self.send_list.pk).active_count, 3)
+
+    def test_mixed_case_addresses_stored_earlier_are_matched(self):
+        stored = EmailFactory(email="John@Example.com")
+
+        report = import_emails([("john@example.com", "John")], send_list=self.send_list)
+
+        self.assertEqual((report.created, report.existing, report.attached), (0, 1, 1))
+        self.assertFalse(Email.objects.filter(email="john@example.com").exists())
+        self.assertIn(stored, self.send_list.emails.all())
+
+    def test_addresses_inserted_concurrently_are_counted_as_existing_and_attached(self):
+        original = importing._insert_emails
+
+        def concurrent_insert(emails):
+            # Another import commits one of the addresses between the lookup and the insert
+            EmailFactory(email="bob@example.com")
+            return original(emails)
+
+        with patch('core.importing._insert_emails', concurrent_insert):
+            report = import_emails([("ann@example.com", ""), ("bob@example.com", "")], send_list=self.send_list)
+
+        self.assertEqual((report.created, report.existing, report.attached), (1, 1, 2))
+        self.assertEqual(Email.objects.filter(email="bob@example.com").count(), 1)
+        self.assertIn(Email.objects.get(email="bob@example.com"), self.send_list.emails.all())
+
+    def test_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv') as file:
+            file.write(CSV)
+            file.flush()
+            out = StringIO()
+            call_command('import_emails', file.name, '--send-list', 'Imported', '--create-list', stdout=out)
+
+        self.assertEqual(SendList.objects.get(title='Imported').active_count, 3)
+        self.assertIn('rows/sec', out.getvalue())
+
+    def test_admin_upload(self):
+        self.client.force_login(get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password'))
+        upload = SimpleUploadedFile('list.jsonl', b'{"email": "new@example.com", "name": "New"}\n')
+
+        response = self.client.post(reverse('admin:core_sendlist_import'),
+                                    {'send_list': self.send_list.pk, 'file': upload}, follow=True)
+
+        self.assertContains(response, '1 new addresses')
+        self.assertTrue(self.send_list.emails.filter(email='new@example.com').exists())
@@ -0,0 +1,85 @@
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core.metrics import MESSAGES, Histogram, registry, render_metrics
+from core.models import MetricValue
+from core.outbox import create_job, run_job
+from .factories import *
+
+
+class MetricsTests(TestCase):
+
+    def setUp(self):
+        # Drop whatever other tests left in the process-wide registry
+        registry.collect()
+
+    def test_flush_adds_increments_to_the_stored_totals(self):
+        MESSAGES.inc(2, result="sent")
+        registry.flush()
+        MESSAGES.inc(3, result="sent")
+        MESSAGES.inc(result="failed")
+        registry.flush()
+
+        values = dict(MetricValue.objects.filter(name="mailing_messages_total").values_list('labels', 'value'))
+        self.assertEqual(values, {'result="sent"': 5, 'result="failed"': 1})
+        self.assertEqual(registry.flush(), 0)
+
+    def test_merged_increments_of_another_process_are_flushed(self):
+        MESSAGES.inc(result="sent")
+        registry.merge([('mailing_messages_total', 'result="sent"', 4, False)])
+        registry.flush()
+
+        self.assertEqual(MetricValue.objects.get(name="mailing_messages_total", labels='result="sent"').value, 5)
+        self.assertEqual(registry.collect(), [])
+
+    def test_histogram_is_exposed_with_cumulative_buckets(self):
+        histogram = Histogram("test_latency_seconds", "Test latency", buckets=(0.1, 1.0))
+        try:
+            for value in (0.05, 0.5, 0.7, 3):
+                histogram.observe(value)
+            text = render_metrics()
+        finally:
+            del registry.metrics[histogram.name]
+
+        self.assertIn("# TYPE test_latency_seconds histogram", text)
+        self.assertIn('test_latency_seconds_bucket{le="0.1"} 1\n', text)
+        self.assertIn('test_latency_seconds_bucket{le="1.0"} 3\n', text)
+        self.assertIn('test_latency_seconds_bucket{le="+Inf"} 4\n', text)
+        self.assertIn("test_latency_seconds_count 4\n", text)
+        self.assertIn("test_latency_seconds_sum 4.25\n", text)
+
+    def test_disabled_registry_records_nothing(self):
+        registry.enabled = False
+        try:
+            MESSAGES.inc(result="sent")
+        finally:
+            registry.enabled = True
+
+        self.assertEqual(registry.collect(), [])
+
+    def test_run_job_records_the_hot_path(self):
+        dispatch = DispatchFactory(send_list=SendListFactory(emails=EmailFactory.create_batch(3)))
+
+        run_job(create_job(dispatch))
+        text = render_metrics()
+
+        self.assertIn('mailing_messages_total{result="sent"} 3\n', text)
+        self.assertIn("mailing_recipient_query_seconds_count 2\n", text)
+        self.assertIn("mailing_smtp_send_seconds_count 3\n", text)
+        self.assertIn("mailing_outbox_backlog 0\n", text)
+
+
+class MetricsViewTests(TestCase):
+
+    def test_exposition(self):
+        response = self.client.get(reverse('metrics'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        self.assertIn("# TYPE mailing_messages_total counter", response.content.decode())
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_token_is_required_when_set(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
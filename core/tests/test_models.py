@@ -1,3 +1,4 @@
+import datetime
 from unittest.mock import patch
 
 from django.test import TestCase
@@ -23,6 +24,37 @@ class DispatchModelTests(TestCase):
         scheduler = SchedulerFactory(frequency=frequency, time_of_day=time_of_day)
         return DispatchFactory(scheduler=scheduler)
 
+    def test_save_reads_nothing_back(self):
+        dispatch = Dispatch.objects.get(pk=self.create_dispatch_with_scheduler('daily', datetime.time(12)).pk)
+        next_due_at = dispatch.next_due_at
+        dispatch.title = "Renamed"
+
+        with self.assertNumQueries(1):
+            dispatch.save()
+        self.assertEqual(dispatch.next_due_at, next_due_at)
+
+    def test_changed_scheduler_moves_next_due_at(self):
+        dispatch = Dispatch.objects.get(pk=self.create_dispatch_with_scheduler('daily', datetime.time(12)).pk)
+        dispatch.scheduler = SchedulerFactory(frequency='weekly', time_of_day=datetime.time(12))
+
+        dispatch.save()
+
+        self.assertEqual(dispatch.next_due_at.weekday(), 0)
+        # Saved again unchanged, the recomputation is not repeated
+        Dispatch.objects.filter(pk=dispatch.pk).update(next_due_at=None)
+        dispatch.refresh_from_db()
+        dispatch.save()
+        self.assertIsNone(dispatch.next_due_at)
+
+    def test_instance_built_in_memory_checks_the_stored_scheduler(self):
+        stored = self.create_dispatch_with_scheduler('daily', datetime.time(12))
+        dispatch = Dispatch(pk=stored.pk, title=stored.title, subject="Subject", text="Text",
+                            scheduler=stored.scheduler, next_due_at=stored.next_due_at, created_at=stored.created_at)
+        dispatch._state.adding = False
+
+        with self.assertNumQueries(2):
+            dispatch.save()
+
 
 # Mock email sending method to avoid sending real emails during tests
 class EmailModelTests(TestCase):
@@ -41,3 +73,48 @@ class EmailModelTests(TestCase):
             recipient_list=[email.email],
             fail_silently=False,
         )
+
+
+class SendListModelTests(TestCase):
+
+    def test_active_count_follows_memberships(self):
+        emails = EmailFactory.create_batch(3)
+        inactive = EmailFactory(active=False)
+        send_list = SendListFactory(emails=emails + [inactive])
+        self.assertEqual(send_list.active_count, 3)
+
+        send_list.emails.remove(emails[0], inactive, EmailFactory())
+        self.assertEqual(send_list.active_count, 2)
+
+        other = SendListFactory()
+        emails[1].send_list.add(other)
+        emails[2].send_list.remove(send_list)
+        other.refresh_from_db()
+        send_list.refresh_from_db()
+        self.assertEqual((send_list.active_count, other.active_count), (1, 1))
+
+        send_list.emails.clear()
+        self.assertEqual(send_list.active_count, 0)
+
+    def test_active_count_follows_email_activation_and_deletion(self):
+        emails = EmailFactory.create_batch(3)
+        send_list = SendListFactory(emails=emails)
+
+        email = Email.objects.get(pk=emails[0].pk)
+        email.active = False
+        email.save()
+        Email.objects.filter(pk=emails[1].pk).set_active(False)
+        send_list.refresh_from_db()
+        self.assertEqual(send_list.active_count, 1)
+
+        Email.objects.filter(pk__in=[emails[0].pk, emails[1].pk]).set_active(True)
+        emails[2].delete()
+        send_list.refresh_from_db()
+        self.assertEqual(send_list.active_count, 2)
+
+    def test_recipient_count_does_not_query_emails(self):
+        dispatch = DispatchFactory(send_list=SendListFactory(emails=EmailFactory.create_batch(3)))
+        dispatch = Dispatch.objects.select_related('send_list').get(pk=dispatch.pk)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(dispatch.get_recipient_count(), 3)
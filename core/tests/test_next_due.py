@@ -0,0 +1,112 @@
+import calendar
+import datetime
+from zoneinfo import ZoneInfo
+
+from django.test import SimpleTestCase, override_settings
+from hypothesis import given, settings as hypothesis_settings, strategies as st
+from hypothesis.extra.django import TestCase as HypothesisTestCase
+
+from core.models import scheduled_after
+from .factories import *
+
+moments = st.datetimes(min_value=datetime.datetime(2000, 1, 1), max_value=datetime.datetime(2100, 1, 1),
+                       timezones=st.just(datetime.timezone.utc))
+times_of_day = st.times().map(lambda time: time.replace(microsecond=0))
+frequencies = st.sampled_from([frequency for frequency, _ in Scheduler.FREQUENCY_CHOICES])
+
+
+class ScheduledAfterTests(SimpleTestCase):
+
+    def assert_next_run(self, frequency, time_of_day, moment):
+        run = scheduled_after(frequency, time_of_day, moment)
+        local = timezone.localtime(moment)
+
+        self.assertGreater(run, moment)
+        # Wall clock fields, also inside a daylight saving gap
+        self.assertEqual(run.time(), time_of_day)
+        # A daylight saving shift can add an hour
+        slack = datetime.timedelta(hours=1)
+        match frequency:
+            case 'daily':
+                self.assertLessEqual(run - moment, datetime.timedelta(days=1) + slack)
+            case 'weekly':
+                self.assertEqual(run.weekday(), 0)
+                self.assertLessEqual(run - moment, datetime.timedelta(weeks=1) + slack)
+            case 'monthly':
+                year, month = (local.year + 1, 1) if local.month == 12 else (local.year, local.month + 1)
+                self.assertEqual((run.year, run.month), (year, month))
+                self.assertEqual(run.day, min(local.day, calendar.monthrange(year, month)[1]))
+
+    @given(frequencies, times_of_day, moments)
+    def test_next_run_in_utc(self, frequency, time_of_day, moment):
+        self.assert_next_run(frequency, time_of_day, moment)
+
+    @given(frequencies, times_of_day, moments)
+    @override_settings(TIME_ZONE='Europe/Berlin')
+    def test_next_run_in_a_zone_with_daylight_saving(self, frequency, time_of_day, moment):
+        self.assert_next_run(frequency, time_of_day, moment)
+
+    @given(frequencies, times_of_day, moments)
+    def test_next_run_is_stable_until_it_passes(self, frequency, time_of_day, moment):
+        run = scheduled_after(frequency, time_of_day, moment)
+        if frequency != 'monthly':
+            # Monthly runs follow the day of `moment`, the others are fixed points in time
+            self.assertEqual(scheduled_after(frequency, time_of_day, run - datetime.timedelta(seconds=1)), run)
+        self.assertGreater(scheduled_after(frequency, time_of_day, run), run)
+
+    def test_examples(self):
+        noon = datetime.time(12)
+        utc = datetime.timezone.utc
+        for frequency, moment, expected in (
+                ('daily', datetime.datetime(2024, 3, 5, 11, tzinfo=utc), datetime.datetime(2024, 3, 5, 12, tzinfo=utc)),
+                ('daily', datetime.datetime(2024, 3, 5, 12, tzinfo=utc), datetime.datetime(2024, 3, 6, 12, tzinfo=utc)),
+                # Monday morning runs the same day, Monday afternoon a week later
+                ('weekly', datetime.datetime(2024, 3, 4, 9, tzinfo=utc), datetime.datetime(2024, 3, 4, 12, tzinfo=utc)),
+                ('weekly', datetime.datetime(2024, 3, 4, 13, tzinfo=utc),
+                 datetime.datetime(2024, 3, 11, 12, tzinfo=utc)),
+                ('monthly', datetime.datetime(2024, 1, 31, 13, tzinfo=utc),
+                 datetime.datetime(2024, 2, 29, 12, tzinfo=utc)),
+                ('monthly', datetime.datetime(2024, 12, 15, tzinfo=utc),
+                 datetime.datetime(2025, 1, 15, 12, tzinfo=utc)),
+        ):
+            self.assertEqual(scheduled_after(frequency, noon, moment), expected)
+
+        with override_settings(TIME_ZONE='Europe/Berlin'):
+            run = scheduled_after('daily', noon, datetime.datetime(2024, 3, 30, 12, tzinfo=utc))
+            self.assertEqual(run, datetime.datetime(2024, 3, 31, 12, tzinfo=ZoneInfo('Europe/Berlin')))
+
+
+class RecomputeNextDueAtTests(HypothesisTestCase):
+
+    @hypothesis_settings(max_examples=25, deadline=None)
+    @given(st.lists(st.tuples(frequencies, st.sampled_from([datetime.time(0), datetime.time(9, 30),
+                                                            datetime.time(23, 59, 59)])), max_size=8),
+           moments)
+    def test_bulk_matches_per_instance(self, schedules, moment):
+        dispatches = [DispatchFactory(scheduler=SchedulerFactory(frequency=frequency, time_of_day=time_of_day))
+                      for frequency, time_of_day in schedules]
+        inactive = DispatchFactory(scheduler=SchedulerFactory(), next_due_at=None)
+        Dispatch.objects.filter(pk=inactive.pk).update(next_due_at=None)
+
+        # The distinct schedules, then the UPDATE if there are any
+        with self.assertNumQueries(2 if schedules else 1):
+            moved = Dispatch.objects.recompute_next_due_at(moment)
+
+        self.assertEqual(moved, len(dispatches))
+        for dispatch in dispatches:
+            dispatch.refresh_from_db()
+            self.assertEqual(dispatch.next_due_at, dispatch.scheduler.next_run(moment))
+        self.assertIsNone(Dispatch.objects.get(pk=inactive.pk).next_due_at)
+
+    def test_scheduler_reschedules_its_dispatches(self):
+        scheduler = SchedulerFactory(frequency='weekly')
+        dispatch = DispatchFactory(scheduler=scheduler)
+        other = DispatchFactory(scheduler=SchedulerFactory(frequency='weekly'))
+        moment = timezone.now() + datetime.timedelta(days=40)
+
+        self.assertEqual(scheduler.reschedule(moment), 1)
+
+        dispatch.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(dispatch.next_due_at, scheduler.next_run(moment))
+        self.assertLess(other.next_due_at, moment)
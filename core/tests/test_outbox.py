@@ -0,0 +1,142 @@
+import datetime
+import smtplib
+from unittest.mock import patch
+
+from django.core import mail
+from django.test import TestCase, override_settings
+
+from core.outbox import create_job, retry_delay, run_job, stalled_jobs, start_job
+from core.scheduling import resume_stalled_jobs, retry_failed_deliveries
+from .factories import *
+
+
+class OutboxTests(TestCase):
+
+    def setUp(self):
+        self.emails = EmailFactory.create_batch(5)
+        self.inactive = EmailFactory(active=False)
+        self.dispatch = DispatchFactory(send_list=SendListFactory(emails=self.emails + [self.inactive]))
+
+    def test_create_job_copies_active_recipients(self):
+        job = create_job(self.dispatch)
+
+        self.assertEqual(job.total, 5)
+        self.assertEqual(set(job.items.values_list('email_id', flat=True)), {email.pk for email in self.emails})
+        self.assertFalse(job.items.exclude(status=DeliveryItem.PENDING).exists())
+
+    def test_run_job_marks_items_and_finishes(self):
+        job = create_job(self.dispatch)
+        report = run_job(job, batch_size=2)
+
+        job.refresh_from_db()
+        self.assertEqual(report.sent, 5)
+        self.assertEqual((job.status, job.sent, job.failed), (DeliveryJob.DONE, 5, 0))
+        self.assertEqual(job.items.filter(status=DeliveryItem.SENT, attempts=1).count(), 5)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_run_job_records_failed_items(self):
+        job = create_job(self.dispatch)
+        with patch('django.core.mail.backends.locmem.EmailBackend.send_messages',
+                   side_effect=[1, smtplib.SMTPDataError(554, "rejected"), 1, 1, 1]):
+            run_job(job, batch_size=10)
+
+        job.refresh_from_db()
+        failed = job.items.get(status=DeliveryItem.FAILED)
+        self.assertEqual((job.sent, job.failed, job.status), (4, 1, DeliveryJob.DONE))
+        self.assertIn("rejected", failed.last_error)
+
+    @override_settings(DISPATCH_RETRY_ATTEMPTS=2)
+    def test_transient_failures_are_retried_with_backoff(self):
+        job = create_job(self.dispatch)
+        with patch('django.core.mail.backends.locmem.EmailBackend.send_messages',
+                   side_effect=[OSError("timed out"), 1, 1, 1, 1]):
+            run_job(job, batch_size=10)
+
+        item = job.items.get(status=DeliveryItem.PENDING)
+        job.refresh_from_db()
+        self.assertEqual(job.status, DeliveryJob.RUNNING)
+        self.assertGreater(item.retry_at, timezone.now())
+        self.assertEqual(retry_failed_deliveries(), 0)
+
+        DeliveryItem.objects.filter(pk=item.pk).update(retry_at=timezone.now())
+        self.assertEqual(retry_failed_deliveries(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.sent, job.status), (5, DeliveryJob.DONE))
+
+    def test_retry_delay_grows_exponentially_with_jitter(self):
+        with override_settings(DISPATCH_RETRY_BASE_DELAY=10, DISPATCH_RETRY_MAX_DELAY=60):
+            self.assertTrue(5 <= retry_delay(1).total_seconds() <= 10)
+            self.assertTrue(20 <= retry_delay(3).total_seconds() <= 40)
+            self.assertTrue(30 <= retry_delay(10).total_seconds() <= 60)
+
+    @override_settings(DISPATCH_HARD_BOUNCE_LIMIT=2)
+    def test_repeated_hard_bounces_deactivate_address(self):
+        bouncing = self.emails[0]
+        refused = smtplib.SMTPRecipientsRefused({bouncing.email: (550, b"no such user")})
+
+        def send_messages(messages):
+            if messages[0].to == [bouncing.email]:
+                raise refused
+            return 1
+
+        with patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=send_messages):
+            run_job(create_job(self.dispatch))
+            bouncing.refresh_from_db()
+            self.assertEqual((bouncing.bounce_count, bouncing.active), (1, True))
+            run_job(create_job(self.dispatch))
+
+        bouncing.refresh_from_db()
+        self.assertEqual((bouncing.bounce_count, bouncing.active), (2, False))
+        self.assertEqual(Suppression.objects.get().address, bouncing.email.lower())
+
+    def test_resumed_job_skips_delivered_items(self):
+        job = create_job(self.dispatch)
+        delivered = list(job.items.order_by('pk').values_list('pk', flat=True)[:3])
+        job.items.filter(pk__in=delivered).update(status=DeliveryItem.SENT)
+        job.status = DeliveryJob.RUNNING
+        job.save()
+
+        self.assertEqual(start_job(self.dispatch), job)
+        self.dispatch.send()
+
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(DeliveryJob.objects.count(), 1)
+
+    @override_settings(DISPATCH_OUTBOX_CLAIM_TIMEOUT=60)
+    def test_stale_claims_are_requeued(self):
+        job = create_job(self.dispatch)
+        stale = timezone.now() - datetime.timedelta(minutes=5)
+        job.items.update(status=DeliveryItem.CLAIMED, updated_at=stale)
+        DeliveryJob.objects.filter(pk=job.pk).update(status=DeliveryJob.RUNNING, updated_at=stale)
+
+        self.assertEqual(list(stalled_jobs()), [job])
+        start_job(self.dispatch)
+        self.assertEqual(job.items.filter(status=DeliveryItem.PENDING).count(), 5)
+
+    @override_settings(DISPATCH_OUTBOX_CLAIM_TIMEOUT=60)
+    def test_resuming_a_deactivated_dispatch_keeps_it_deactivated(self):
+        scheduled = DispatchFactory(scheduler=SchedulerFactory(frequency='daily'),
+                                    send_list=SendListFactory(emails=self.emails))
+        job = create_job(scheduled)
+        stale = timezone.now() - datetime.timedelta(minutes=5)
+        job.items.update(status=DeliveryItem.CLAIMED, updated_at=stale)
+        DeliveryJob.objects.filter(pk=job.pk).update(status=DeliveryJob.RUNNING, updated_at=stale)
+        Dispatch.objects.filter(pk=scheduled.pk).update(next_due_at=None)
+
+        self.assertEqual(resume_stalled_jobs(), [scheduled])
+
+        self.assertEqual(len(mail.outbox), 5)
+        scheduled.refresh_from_db()
+        self.assertIsNone(scheduled.next_due_at)
+
+    def test_send_of_a_deactivated_dispatch_does_not_activate_it(self):
+        scheduled = DispatchFactory(scheduler=SchedulerFactory(frequency='daily'),
+                                    send_list=SendListFactory(emails=self.emails))
+        # Switched off while the send was under way
+        Dispatch.objects.filter(pk=scheduled.pk).update(next_due_at=None)
+
+        scheduled.send()
+
+        scheduled.refresh_from_db()
+        self.assertIsNone(scheduled.next_due_at)
+        self.assertIsNotNone(scheduled.last_sent_at)
@@ -0,0 +1,103 @@
+import datetime
+from collections import Counter
+
+from django.core import mail
+from django.test import TestCase, override_settings
+from freezegun import freeze_time
+
+from core.pacing import pace_job, plan_slots, slot_start
+from core.scheduling import DueQueue, retry_failed_deliveries, send_due_dispatch
+from core.outbox import create_job
+from .factories import *
+
+MOMENT = datetime.datetime(2024, 3, 4, 9, 0, 10, tzinfo=datetime.timezone.utc)
+
+
+@override_settings(DISPATCH_RELAY_CAPACITY=1, DISPATCH_PACING_SLOT=60)
+class PacingTests(TestCase):
+
+    def create_paced_dispatch(self, recipients, send_window=10, rate=None, **kwargs):
+        scheduler = SchedulerFactory(frequency='daily', send_window=send_window, rate=rate)
+        send_list = SendListFactory(emails=EmailFactory.create_batch(recipients))
+        return DispatchFactory(scheduler=scheduler, send_list=send_list, **kwargs)
+
+    def slot_counts(self, job):
+        return sorted(Counter(job.items.values_list('retry_at', flat=True)).items())
+
+    def test_plan_fills_the_room_left_by_other_sends(self):
+        start = slot_start(MOMENT)
+        booked = Counter({start: 50})
+
+        plan = plan_slots(100, rate=0.5, booked=booked, moment=MOMENT)
+
+        # 30 per slot at 0.5/s, but only 10 fit next to the 50 already booked in the first slot of 60
+        self.assertEqual([taken for _, taken in plan], [10, 30, 30, 30])
+        self.assertEqual(plan[1][0] - plan[0][0], datetime.timedelta(minutes=1))
+        self.assertEqual(booked[start], 60)
+
+    def test_items_are_spread_over_the_window(self):
+        dispatch = self.create_paced_dispatch(30)
+        job = create_job(dispatch)
+
+        finish = pace_job(job, MOMENT)
+
+        # 30 messages over 10 minutes: 3 in each one minute slot
+        counts = self.slot_counts(job)
+        self.assertEqual([count for _, count in counts], [3] * 10)
+        self.assertEqual(counts[0][0], datetime.datetime(2024, 3, 4, 9, 0, tzinfo=datetime.timezone.utc))
+        self.assertEqual(finish, datetime.datetime(2024, 3, 4, 9, 10, tzinfo=datetime.timezone.utc))
+        job.refresh_from_db()
+        self.assertEqual(job.expected_finish_at, finish)
+        # Paced once, a second pacing of the resumed job changes nothing
+        self.assertIsNone(pace_job(job, MOMENT))
+
+    def test_rate_and_relay_capacity_cap_the_pace(self):
+        job = create_job(self.create_paced_dispatch(130, send_window=1, rate=2))
+
+        pace_job(job, MOMENT)
+
+        # 130 in one minute would be 2.2/s, the relay takes 1/s: 60 per slot and the send takes three minutes
+        self.assertEqual([count for _, count in self.slot_counts(job)], [60, 60, 10])
+
+    def test_higher_priority_books_first(self):
+        low = self.create_paced_dispatch(60, send_window=1, priority=Dispatch.LOW)
+        high = self.create_paced_dispatch(60, send_window=1, priority=Dispatch.HIGH)
+        Dispatch.objects.update(next_due_at=MOMENT - datetime.timedelta(seconds=1))
+        queue = DueQueue()
+        queue.refresh()
+
+        with freeze_time(MOMENT):
+            due = queue.pop_due()
+            self.assertEqual(due, [high.pk, low.pk])
+            for pk in due:
+                send_due_dispatch(pk)
+
+        high_job, low_job = high.delivery_jobs.get(), low.delivery_jobs.get()
+        self.assertEqual(high_job.sent, 60)
+        self.assertEqual(low_job.sent, 0)
+        self.assertEqual(low_job.expected_finish_at - high_job.expected_finish_at, datetime.timedelta(minutes=1))
+
+    def test_paced_send_goes_out_slot_by_slot(self):
+        dispatch = self.create_paced_dispatch(6, send_window=3)
+        Dispatch.objects.filter(pk=dispatch.pk).update(next_due_at=MOMENT - datetime.timedelta(seconds=1))
+
+        with freeze_time(MOMENT):
+            send_due_dispatch(dispatch.pk)
+        self.assertEqual(len(mail.outbox), 2)
+
+        with freeze_time(MOMENT + datetime.timedelta(minutes=1)):
+            self.assertEqual(retry_failed_deliveries(), 2)
+        with freeze_time(MOMENT + datetime.timedelta(minutes=2)):
+            self.assertEqual(retry_failed_deliveries(), 2)
+
+        job = dispatch.delivery_jobs.get()
+        self.assertEqual((job.status, job.sent), (DeliveryJob.DONE, 6))
+
+    def test_schedule_without_window_sends_at_once(self):
+        dispatch = self.create_paced_dispatch(5, send_window=0)
+        Dispatch.objects.filter(pk=dispatch.pk).update(next_due_at=timezone.now() - datetime.timedelta(seconds=1))
+
+        send_due_dispatch(dispatch.pk)
+
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertIsNone(dispatch.delivery_jobs.get().expected_finish_at)
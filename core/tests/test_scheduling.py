@@ -0,0 +1,134 @@
+import datetime
+import threading
+from io import StringIO
+
+from unittest import mock
+
+from django.core import mail
+from django.test import TestCase, override_settings
+
+from core.management.commands.run_scheduler import Command as RunSchedulerCommand
+from core.delivery import send_batched
+from core.scheduling import DueQueue, send_due_dispatches
+from .factories import *
+
+
+class DueQueueTests(TestCase):
+
+    def set_next_due_at(self, dispatch, next_due_at):
+        Dispatch.objects.filter(pk=dispatch.pk).update(next_due_at=next_due_at, updated_at=timezone.now())
+
+    def test_refresh_and_pop_due(self):
+        moment = timezone.now()
+        first = DispatchFactory()
+        second = DispatchFactory()
+        self.set_next_due_at(first, moment - datetime.timedelta(minutes=1))
+        self.set_next_due_at(second, moment + datetime.timedelta(hours=1))
+
+        queue = DueQueue()
+        queue.refresh()
+
+        self.assertEqual(len(queue), 2)
+        self.assertEqual(queue.pop_due(moment), [first.pk])
+        self.assertEqual(queue.next_due_at(), moment + datetime.timedelta(hours=1))
+
+    def test_refresh_picks_up_changes_since_watermark(self):
+        moment = timezone.now()
+        dispatch = DispatchFactory()
+        self.set_next_due_at(dispatch, moment + datetime.timedelta(hours=1))
+        queue = DueQueue()
+        queue.refresh()
+
+        self.set_next_due_at(dispatch, moment - datetime.timedelta(minutes=1))
+        self.assertEqual(queue.refresh(), 1)
+        self.assertEqual(queue.pop_due(moment), [dispatch.pk])
+
+        self.set_next_due_at(dispatch, None)
+        queue.refresh()
+        self.assertIsNone(queue.next_due_at())
+
+
+class RunSchedulerTickTests(TestCase):
+
+    def setUp(self):
+        self.dispatch = DispatchFactory(scheduler=SchedulerFactory(frequency='daily'),
+                                        send_list=SendListFactory(emails=EmailFactory.create_batch(2)))
+        Dispatch.objects.filter(pk=self.dispatch.pk).update(
+            next_due_at=timezone.now() - datetime.timedelta(minutes=1), updated_at=timezone.now())
+        self.command = RunSchedulerCommand(stdout=StringIO())
+        self.command.engine = None
+        self.command.poll_interval = 5.0
+        self.command.retry_delay = datetime.timedelta(minutes=1)
+        self.command.failed = {}
+        self.command.queue = DueQueue()
+        self.command.rebalanced = threading.Event()
+
+    def test_tick_sends_due_dispatch_and_reschedules(self):
+        command, dispatch = self.command, self.dispatch
+        sleep = command.tick()
+
+        dispatch.refresh_from_db()
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(command.queue.scheduled[dispatch.pk], dispatch.next_due_at)
+        self.assertGreater(sleep, 0)
+        self.assertLessEqual(sleep, 5.0)
+
+    @override_settings(DISPATCH_OUTBOX_BATCH_SIZE=1)
+    def test_failed_send_is_resumed_after_the_retry_delay(self):
+        self.command.retry_delay = datetime.timedelta(0)
+        calls = []
+
+        def fail_once(*args, **kwargs):
+            calls.append(args)
+            if len(calls) == 1:
+                raise RuntimeError("relay down")
+            return send_batched(*args, **kwargs)
+
+        with mock.patch('core.delivery.send_batched', side_effect=fail_once):
+            self.command.tick()
+            self.assertEqual(len(mail.outbox), 0)
+            self.assertIn(self.dispatch.pk, self.command.failed)
+
+            self.command.tick()
+
+        # The item claimed by the failed send waits for DISPATCH_OUTBOX_CLAIM_TIMEOUT, the rest is sent
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(self.command.failed, {})
+        self.assertIn("Resumed failed dispatch", self.command.stdout.getvalue())
+        self.assertEqual(DeliveryJob.objects.get(dispatch=self.dispatch).sent, 1)
+
+
+class CoalescingTests(TestCase):
+
+    def setUp(self):
+        self.shared = EmailFactory.create_batch(2)
+        footer = FooterFactory()
+        self.first = DispatchFactory(subject="News", text="Text", footer=footer,
+                                     send_list=SendListFactory(emails=[*self.shared, EmailFactory()]))
+        self.second = DispatchFactory(subject="News", text="Text", footer=footer,
+                                      send_list=SendListFactory(emails=[*self.shared, EmailFactory()]))
+        self.other = DispatchFactory(send_list=SendListFactory(emails=self.shared))
+        Dispatch.objects.update(next_due_at=timezone.now() - datetime.timedelta(minutes=1))
+        self.pks = [self.first.pk, self.second.pk, self.other.pk]
+
+    @override_settings(DISPATCH_COALESCE=True)
+    def test_same_content_is_sent_once_per_address(self):
+        with mock.patch('core.delivery.send_batched', side_effect=send_batched) as engine:
+            results = list(send_due_dispatches(self.pks))
+
+        self.assertEqual(sorted(pk for pk, dispatch, error in results if dispatch and not error), sorted(self.pks))
+        # One engine call for the coalesced pair and one for the dispatch with other content
+        self.assertEqual(engine.call_count, 2)
+        news = [message for message in mail.outbox if message.subject == "News"]
+        self.assertEqual(len(news), 4)
+        self.assertEqual(len({message.to[0] for message in news}), 4)
+        self.assertEqual(len(mail.outbox), 6)
+        self.assertEqual(DeliveryJob.objects.get(dispatch=self.second).total, 1)
+        self.assertFalse(DeliveryJob.objects.exclude(status=DeliveryJob.DONE).exists())
+        self.assertFalse(Dispatch.objects.due().exists())
+
+    def test_without_coalescing_shared_addresses_get_every_dispatch(self):
+        results = list(send_due_dispatches(self.pks))
+
+        self.assertEqual(len([dispatch for _, dispatch, _ in results if dispatch]), 3)
+        self.assertEqual(len([message for message in mail.outbox if message.subject == "News"]), 6)
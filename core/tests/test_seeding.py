@@ -0,0 +1,47 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from core.seeding import Seeder, parse_scheduler_mix
+from .factories import *
+
+
+def snapshot() -> tuple:
+    return (
+        list(Email.objects.order_by('email').values_list('email', 'name', 'active')),
+        sorted(SendList.emails.through.objects.values_list('sendlist__title', 'email__email')),
+        list(Dispatch.objects.order_by('title').values_list('title', 'send_list__title', 'scheduler__frequency')),
+    )
+
+
+class SeederTests(TestCase):
+
+    def seed(self, seed: int = 7) -> None:
+        Seeder(seed=seed, batch_size=40, inactive_ratio=0.2, lists_per_email=1.5, distribution='zipf').seed(
+            emails=100, send_lists=5, dispatches=30, scheduler_mix=parse_scheduler_mix('daily=1,none=1'))
+
+    def test_seed_creates_requested_rows_and_counters(self):
+        self.seed()
+
+        self.assertEqual((Email.objects.count(), SendList.objects.count(), Dispatch.objects.count()), (100, 5, 30))
+        self.assertFalse(SendList.objects.with_actual_active_count()
+                         .exclude(active_count=models.F('actual_active_count')).exists())
+        self.assertFalse(Dispatch.objects.filter(scheduler__isnull=False, next_due_at__isnull=True).exists())
+        self.assertEqual(Dispatch.objects.filter(scheduler__isnull=True).count(),
+                         Dispatch.objects.filter(next_due_at__isnull=True).count())
+
+    def test_same_seed_gives_same_data(self):
+        self.seed()
+        first = snapshot()
+        for model in (Dispatch, Scheduler, Footer, SendList, Email):
+            model.objects.all().delete()
+
+        self.seed()
+        self.assertEqual(snapshot(), first)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('create_sample_data', '--emails', '20', '--send-lists', '2', '--dispatches', '3', stdout=out)
+
+        self.assertIn('Successfully created 20 emails, 2 send lists, 20 memberships and 3 dispatches', out.getvalue())
@@ -0,0 +1,83 @@
+import asyncio
+import json
+import threading
+
+from django.test import TestCase, override_settings
+
+from core.outbox import create_job, run_job
+from core.stats import StatsBroadcaster, broadcaster, dispatch_stats, publish_stats
+from .factories import *
+
+
+class DispatchStatsTests(TestCase):
+
+    def setUp(self):
+        self.dispatch = DispatchFactory(send_list=SendListFactory(emails=EmailFactory.create_batch(3)))
+
+    def test_dispatch_stats_reports_latest_job(self):
+        run_job(create_job(self.dispatch))
+
+        self.assertEqual(dispatch_stats(self.dispatch.pk), {
+            'recipients_count': 3, 'sent_times': 3, 'status': DeliveryJob.DONE,
+            'sent': 3, 'failed': 0, 'in_progress': 0,
+        })
+        self.assertIsNone(dispatch_stats(0))
+
+    def test_real_time_stats_view(self):
+        response = self.client.get(reverse('real_time_stats', args=[self.dispatch.pk]))
+
+        self.assertEqual(response.json()['recipients_count'], 3)
+        self.assertEqual(self.client.get(reverse('real_time_stats', args=[0])).status_code, 404)
+
+    def test_stream_under_wsgi_sends_one_event(self):
+        response = self.client.get(reverse('real_time_stats_stream', args=[self.dispatch.pk]))
+
+        self.assertTrue(response.content.startswith(b'retry: '))
+        self.assertIn(b'"recipients_count": 3', response.content)
+
+    def test_publish_without_viewers_does_not_query(self):
+        with self.assertNumQueries(0):
+            publish_stats(self.dispatch.pk)
+
+    @override_settings(DISPATCH_STATS_INTERVAL=0.01)
+    async def test_stream_pushes_stats(self):
+        response = await self.async_client.get(reverse('real_time_stats_stream', args=[self.dispatch.pk]))
+        events = response.streaming_content
+
+        first = await anext(events)
+        # The ASGI handler cancels the response task when the browser disconnects
+        waiting = asyncio.ensure_future(anext(events))
+        await asyncio.sleep(0.01)
+        waiting.cancel()
+        # Let the poller notice that nobody is watching anymore
+        await asyncio.sleep(0.05)
+
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertTrue(first.startswith(b'data: '))
+        self.assertEqual(json.loads(first[len(b'data: '):])['recipients_count'], 3)
+        self.assertFalse(broadcaster.has_subscribers(self.dispatch.pk))
+        self.assertNotIn(self.dispatch.pk, broadcaster.pollers)
+
+
+class StatsBroadcasterTests(TestCase):
+
+    @override_settings(DISPATCH_STATS_INTERVAL=60)
+    async def test_fans_out_latest_stats_to_every_viewer(self):
+        stats = StatsBroadcaster()
+        viewers = [stats.subscribe(1, keepalive=0.5) for _ in range(3)]
+        # Subscribing starts a poller, keep it from touching the database
+        stats.latest[1] = {'sent': 0}
+        self.assertEqual([await anext(viewer) for viewer in viewers], [{'sent': 0}] * 3)
+        stats.pollers.pop(1).cancel()
+
+        publisher = threading.Thread(target=lambda: [stats.publish(1, {'sent': n}) for n in (1, 2)])
+        publisher.start()
+        publisher.join()
+
+        # Slow viewers skip straight to the latest value
+        self.assertEqual([await anext(viewer) for viewer in viewers], [{'sent': 2}] * 3)
+        self.assertIsNone(await anext(viewers[0]))
+
+        for viewer in viewers:
+            await viewer.aclose()
+        self.assertFalse(stats.has_subscribers(1))
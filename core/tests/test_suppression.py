@@ -0,0 +1,93 @@
+from django.core import mail
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from core.outbox import create_job, run_job
+from core.suppression import BloomFilter, SuppressionList, normalize_address, suppress
+from .factories import *
+
+
+class BloomFilterTests(SimpleTestCase):
+
+    def test_members_are_always_found_and_others_rarely(self):
+        bloom = BloomFilter(10_000, 0.01)
+        for n in range(10_000):
+            bloom.add(f"member{n}@example.com")
+
+        self.assertTrue(all(f"member{n}@example.com" in bloom for n in range(10_000)))
+        false_positives = sum(f"other{n}@example.com" in bloom for n in range(10_000))
+        self.assertLess(false_positives, 200)
+        # About 1.2 bytes per key at 1%
+        self.assertLess(len(bloom.bits), 13_000)
+
+    def test_normalize_address(self):
+        self.assertEqual(normalize_address("  John.Doe@Example.COM "), "john.doe@example.com")
+
+
+@override_settings(SUPPRESSION_REFRESH_INTERVAL=0)
+class SuppressionListTests(TestCase):
+
+    def test_new_rows_are_read_incrementally(self):
+        suppressions = SuppressionList()
+        Suppression.objects.create(address="first@example.com", reason=Suppression.UNSUBSCRIBE)
+        self.assertEqual(suppressions.suppressed(["First@Example.com", "other@example.com"]), {"First@Example.com"})
+
+        Suppression.objects.create(address="second@example.com", reason=Suppression.COMPLAINT)
+        self.assertEqual(suppressions.suppressed(["second@example.com"]), {"second@example.com"})
+        # The first row is read again with the last minute but not counted twice
+        self.assertEqual(suppressions.filter.count, 2)
+        self.assertEqual(suppressions.refresh(), 0)
+        self.assertEqual(suppressions.filter.count, 2)
+
+    def test_filter_rules_out_addresses_without_a_query(self):
+        suppressions = SuppressionList()
+        suppress(["blocked@example.com"], Suppression.UNSUBSCRIBE)
+        suppressions.refresh()
+
+        with self.settings(SUPPRESSION_REFRESH_INTERVAL=60), self.assertNumQueries(0):
+            self.assertEqual(suppressions.suppressed([f"user{n}@example.com" for n in range(100)]), set())
+        with self.settings(SUPPRESSION_REFRESH_INTERVAL=60), self.assertNumQueries(1):
+            self.assertEqual(suppressions.suppressed(["blocked@example.com", "user1@example.com"]),
+                             {"blocked@example.com"})
+
+    def test_removed_rows_are_cleared_by_the_exact_lookup(self):
+        suppressions = SuppressionList()
+        suppress(["again@example.com"], Suppression.UNSUBSCRIBE)
+        self.assertEqual(suppressions.suppressed(["again@example.com"]), {"again@example.com"})
+
+        Suppression.objects.all().delete()
+
+        self.assertIn("again@example.com", suppressions.filter)
+        self.assertEqual(suppressions.suppressed(["again@example.com"]), set())
+
+    def test_filter_is_rebuilt_larger_when_full(self):
+        suppressions = SuppressionList()
+        suppressions.min_capacity = 2
+        suppress([f"user{n}@example.com" for n in range(5)], Suppression.BOUNCE)
+        suppressions.refresh()
+        self.assertEqual(suppressions.filter.capacity, 10)
+
+        suppress([f"more{n}@example.com" for n in range(20)], Suppression.BOUNCE)
+        suppressions.refresh()
+        suppressions.refresh()
+
+        self.assertEqual(suppressions.filter.capacity, 50)
+        self.assertTrue(all(f"more{n}@example.com" in suppressions.filter for n in range(20)))
+
+
+@override_settings(SUPPRESSION_REFRESH_INTERVAL=0)
+class SuppressedSendTests(TestCase):
+
+    def test_suppressed_recipients_are_skipped(self):
+        emails = [EmailFactory(email=f"reader{n}@example.com") for n in range(3)]
+        dispatch = DispatchFactory(send_list=SendListFactory(emails=emails))
+        job = create_job(dispatch)
+        suppress(["  READER1@example.com"], Suppression.UNSUBSCRIBE)
+
+        report = run_job(job)
+
+        self.assertEqual(report.sent, 2)
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox),
+                         ["reader0@example.com", "reader2@example.com"])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.total, job.sent), (DeliveryJob.DONE, 2, 2))
+        self.assertEqual(job.items.get(email=emails[1]).status, DeliveryItem.SUPPRESSED)
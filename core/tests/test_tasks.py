@@ -0,0 +1,118 @@
+import datetime
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+
+from core.outbox import create_job
+from core.stats import dispatch_stats
+from core.tasks import claim_tasks, enqueue_send, requeue_stalled_tasks, run_task
+from .factories import *
+
+
+class SendTaskTests(TestCase):
+
+    def setUp(self):
+        self.dispatch = DispatchFactory(send_list=SendListFactory(emails=EmailFactory.create_batch(3)))
+
+    def test_send_now_only_queues(self):
+        self.client.force_login(get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password'))
+
+        response = self.client.post(reverse('dispatch_action', args=[self.dispatch.pk]), {'send_now': ''})
+
+        self.assertRedirects(response, reverse('dispatch-detail', args=[self.dispatch.pk]))
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(self.dispatch.send_tasks.get().status, SendTask.QUEUED)
+        self.assertEqual(dispatch_stats(self.dispatch.pk)['status'], SendTask.QUEUED)
+
+    def test_admin_action_queues_every_selected_dispatch(self):
+        other = DispatchFactory()
+        self.client.force_login(get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password'))
+
+        self.client.post(reverse('admin:core_dispatch_changelist'),
+                         {'action': 'send_now_parallel', '_selected_action': [self.dispatch.pk, other.pk]})
+
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(sorted(SendTask.objects.values_list('dispatch_id', 'engine')),
+                         [(self.dispatch.pk, 'parallel'), (other.pk, 'parallel')])
+
+    def test_pending_send_is_not_queued_twice(self):
+        task = enqueue_send(self.dispatch)
+
+        self.assertEqual(enqueue_send(self.dispatch), task)
+        claim_tasks(1)
+        self.assertEqual(enqueue_send(self.dispatch), task)
+
+    def test_claimed_task_is_sent(self):
+        enqueue_send(self.dispatch)
+
+        [task] = claim_tasks(5)
+        self.assertEqual(task.status, SendTask.RUNNING)
+        self.assertEqual(claim_tasks(5), [])
+        run_task(task)
+
+        task.refresh_from_db()
+        self.assertEqual(task.status, SendTask.DONE)
+        self.assertIsNotNone(task.finished_at)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(dispatch_stats(self.dispatch.pk)['status'], DeliveryJob.DONE)
+
+    def test_failed_send_is_recorded(self):
+        enqueue_send(self.dispatch)
+        [task] = claim_tasks(1)
+
+        with patch.object(Dispatch, 'send', side_effect=RuntimeError('relay is down')):
+            run_task(task)
+
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.error), (SendTask.FAILED, 'relay is down'))
+
+    def test_send_now_while_retries_are_pending_is_deferred(self):
+        job = create_job(self.dispatch)
+        retry_at = timezone.now() + datetime.timedelta(minutes=5)
+        job.items.update(status=DeliveryItem.PENDING, attempts=1, retry_at=retry_at)
+        DeliveryJob.objects.filter(pk=job.pk).update(status=DeliveryJob.RUNNING)
+        enqueue_send(self.dispatch)
+        [task] = claim_tasks(1)
+
+        run_task(task)
+
+        task.refresh_from_db()
+        self.dispatch.refresh_from_db()
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(task.status, SendTask.DEFERRED)
+        self.assertIn(retry_at.isoformat(timespec='seconds'), task.error)
+        self.assertIsNone(self.dispatch.last_sent_at)
+        self.assertEqual(self.dispatch.delivery_jobs.count(), 1)
+
+    @override_settings(SEND_TASK_TIMEOUT=60)
+    def test_abandoned_task_is_queued_again(self):
+        enqueue_send(self.dispatch)
+        [task] = claim_tasks(1)
+        self.assertEqual(requeue_stalled_tasks(), 0)
+
+        SendTask.objects.filter(pk=task.pk).update(updated_at=timezone.now() - datetime.timedelta(minutes=2))
+
+        self.assertEqual(requeue_stalled_tasks(), 1)
+        self.assertEqual(claim_tasks(1), [task])
+
+
+# SQLite locks the whole table for the writes of the worker threads
+@skipUnlessDBFeature('has_select_for_update_skip_locked')
+class SendWorkerCommandTests(TransactionTestCase):
+
+    def test_burst_sends_queued_tasks_concurrently(self):
+        dispatches = [DispatchFactory(send_list=SendListFactory(emails=EmailFactory.create_batch(2)))
+                      for _ in range(3)]
+        for dispatch in dispatches:
+            enqueue_send(dispatch)
+        out = StringIO()
+
+        call_command('run_send_worker', '--burst', '--concurrency', '2', '--poll-interval', '0.01', stdout=out)
+
+        self.assertEqual(list(SendTask.objects.values_list('status', flat=True).distinct()), [SendTask.DONE])
+        self.assertEqual(len(mail.outbox), 6)
+        self.assertEqual(out.getvalue().count('Sent dispatch'), 3)
@@ -0,0 +1,102 @@
+from email import message_from_bytes
+from email.header import decode_header, make_header
+
+from django.conf import settings
+from django.core import mail
+from django.core.exceptions import ValidationError
+from django.core.mail import EmailMessage
+from django.test import TestCase
+
+from core.delivery import send_batched
+from core.outbox import create_job, run_job
+from core.rendering import PersonalizedMessage, prepare_message
+from core.templating import CompiledTemplate, Recipient, validate_template
+from .factories import *
+
+
+class CompiledTemplateTests(TestCase):
+
+    def test_plain_variables_are_substituted_without_the_engine(self):
+        template = CompiledTemplate("Hello {{ name }} <{{ email }}>!")
+
+        self.assertIsNotNone(template.parts)
+        self.assertEqual(template.render({"name": "Ann", "email": "ann@example.com"}), "Hello Ann <ann@example.com>!")
+        self.assertEqual(template.render({}), "Hello  <>!")
+
+    def test_tags_and_filters_fall_back_to_the_engine(self):
+        template = CompiledTemplate("Hello {{ name|default:'subscriber' }}{% if email %}, {{ email }}{% endif %}")
+
+        self.assertIsNone(template.parts)
+        self.assertEqual(template.render({"name": "", "email": "a@example.com"}), "Hello subscriber, a@example.com")
+
+    def test_no_html_escaping(self):
+        self.assertEqual(CompiledTemplate("{{ name }}").render({"name": "Tom & <Jerry>"}), "Tom & <Jerry>")
+
+    def test_invalid_template_is_rejected(self):
+        with self.assertRaises(ValidationError):
+            validate_template("Hello {% if name %}")
+        validate_template("Plain text with } braces {")
+
+
+class PersonalizedSendTests(TestCase):
+
+    def test_plain_content_keeps_the_shared_payload(self):
+        self.assertFalse(prepare_message("Subject", "Body").personalized)
+        self.assertIsInstance(prepare_message("Hi {{ name }}", "Body"), PersonalizedMessage)
+
+    def test_direct_serialization_matches_email_message(self):
+        def parse(data):
+            message = message_from_bytes(data)
+            headers = {name: str(make_header(decode_header(value))) for name, value in message.items()
+                       if name not in ("Date", "Message-ID")}
+            return headers, message.get_payload(decode=True)
+
+        for subject, body in (("Hi {{ name }}", "Dear {{ name }},\nhello\n"),
+                              ("Привет, {{ name }}", "Дорогая {{ name }},\r\nпривет"),
+                              ("Long line", "x" * 1200 + "{{ name }}"),
+                              ("A subject long enough to be folded over several lines for {{ name }}", "Text")):
+            personalized = PersonalizedMessage(subject, body, settings.DEFAULT_FROM_EMAIL)
+            recipient = Recipient("ann@example.com", "Аня")
+            rendered_subject, rendered_body = personalized.render_content(recipient)
+            expected = EmailMessage(subject=rendered_subject, body=rendered_body,
+                                    from_email=settings.DEFAULT_FROM_EMAIL, to=[recipient]).message()
+
+            self.assertEqual(parse(personalized.render([recipient], "\r\n")),
+                             parse(expected.as_bytes(linesep="\r\n")))
+
+    def test_send_batched_renders_one_message_per_recipient(self):
+        recipients = [Recipient("ann@example.com", "Ann"), Recipient("bob@example.com", None)]
+        report = send_batched("Hi {{ name }}", "Dear {{ name }},\nnews for {{ email }}", recipients,
+                              recipients_per_message=10)
+
+        self.assertEqual(report.sent, 2)
+        self.assertEqual([(message.to, message.subject) for message in mail.outbox],
+                         [(["ann@example.com"], "Hi Ann"), (["bob@example.com"], "Hi ")])
+        self.assertEqual(mail.outbox[0].body, "Dear Ann,\nnews for ann@example.com")
+
+    def test_outbox_personalizes_with_email_name(self):
+        email = EmailFactory(name="Ann")
+        dispatch = DispatchFactory(subject="News for {{ name }}", text="Text",
+                                   footer=FooterFactory(text="Sent to {{ email }}"),
+                                   send_list=SendListFactory(emails=[email]))
+
+        run_job(create_job(dispatch))
+
+        self.assertEqual(mail.outbox[0].subject, "News for Ann")
+        self.assertEqual(mail.outbox[0].body, f"Text\n\nSent to {email.email}")
+
+    def test_job_with_an_invalid_template_fails_without_sending(self):
+        dispatch = DispatchFactory(send_list=SendListFactory(emails=EmailFactory.create_batch(2)))
+        # Written before templates were rendered, the validators never saw it
+        Footer.objects.filter(pk=dispatch.footer_id).update(text="Unsubscribe: {% url %}")
+        dispatch.refresh_from_db()
+        job = create_job(dispatch)
+
+        with self.assertLogs('core.outbox', 'ERROR'):
+            report = run_job(job)
+
+        job.refresh_from_db()
+        self.assertEqual((report.sent, len(mail.outbox)), (0, 0))
+        self.assertEqual((job.status, job.sent, job.failed), (DeliveryJob.DONE, 0, 2))
+        self.assertTrue(all(error.startswith("Invalid template:")
+                            for error in job.items.values_list('last_error', flat=True)))
@@ -0,0 +1,84 @@
+import smtplib
+from unittest.mock import patch
+
+from django.core import mail
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core.delivery import send_batched, smtp_code
+from core.metrics import registry
+from core.throttling import RateLimiter, TokenBucket, _rate_limiter, get_rate_limiter
+
+
+class TokenBucketTests(TestCase):
+
+    def test_reserve_waits_once_tokens_run_out(self):
+        bucket = TokenBucket(rate=2)
+        bucket.updated = 0.0
+
+        self.assertEqual([bucket.reserve(0.0) for _ in range(3)], [0.0, 0.0, 0.5])
+        # A second later two tokens were refilled, one of them pays back the borrowed token
+        self.assertEqual(bucket.reserve(1.0), 0.0)
+
+    def test_rate_backs_off_and_recovers(self):
+        bucket = TokenBucket(rate=100)
+        bucket.slow_down(bucket.updated, 0.5)
+        bucket.slow_down(bucket.updated, 0.01)
+        self.assertEqual(bucket.rate, 10)
+        bucket.speed_up(bucket.updated, 0.05)
+        self.assertEqual(bucket.rate, 15)
+
+
+class RateLimiterTests(TestCase):
+
+    def setUp(self):
+        _rate_limiter.cache_clear()
+        self.addCleanup(_rate_limiter.cache_clear)
+
+    def test_disabled_by_default(self):
+        self.assertIsNone(get_rate_limiter())
+
+    def test_domain_buckets_are_separate(self):
+        limiter = RateLimiter(domain_rate=1)
+
+        self.assertEqual(limiter.reserve("a@one.com"), 0.0)
+        self.assertEqual(limiter.reserve("b@two.com"), 0.0)
+        self.assertGreater(limiter.reserve("c@one.com"), 0.0)
+        self.assertGreater(limiter.throttled_seconds, 0.0)
+
+    def test_smtp_code(self):
+        self.assertEqual(smtp_code(smtplib.SMTPSenderRefused(421, b"busy", "a@example.com")), 421)
+        self.assertEqual(smtp_code(smtplib.SMTPRecipientsRefused({"a@example.com": (451, b"later")})), 451)
+        self.assertIsNone(smtp_code(OSError("down")))
+
+    @override_settings(DISPATCH_RATE_LIMIT=1000, DISPATCH_THROTTLE_RETRIES=2)
+    def test_throttled_message_is_retried_at_lower_rate(self):
+        throttled = smtplib.SMTPRecipientsRefused({"a@example.com": (451, b"slow down")})
+        with patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=[throttled, 1]):
+            report = send_batched("Subject", "Body", ["a@example.com"])
+
+        limiter = get_rate_limiter()
+        self.assertEqual(report.sent, 1)
+        self.assertEqual(report.failures, [])
+        self.assertEqual(limiter.throttle_events, 1)
+        self.assertEqual(limiter.rate, 500)
+
+    @override_settings(DISPATCH_MAX_MESSAGES_PER_CONNECTION=2)
+    def test_connection_is_renewed_after_max_messages(self):
+        with patch('django.core.mail.backends.locmem.EmailBackend.open') as mock_open:
+            send_batched("Subject", "Body", [f"user{n}@example.com" for n in range(5)])
+
+        self.assertEqual(mock_open.call_count, 3)
+        self.assertEqual(len(mail.outbox), 5)
+
+    @override_settings(DISPATCH_DOMAIN_RATE_LIMIT=20)
+    def test_time_throttled_is_exposed_as_metric(self):
+        registry.collect()
+        # A second worth of tokens goes out at once, the next message waits for a refill
+        send_batched("Subject", "Body", [f"user{n}@example.com" for n in range(21)])
+
+        registry.flush()
+        response = self.client.get(reverse('metrics'))
+        value = float(next(line.split()[1] for line in response.content.decode().splitlines()
+                           if line.startswith("mailing_throttled_seconds_total ")))
+        self.assertGreater(value, 0)
@@ -0,0 +1,60 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from .factories import *
+
+
+def create_dispatches(count: int) -> None:
+    send_list = SendListFactory(emails=EmailFactory.create_batch(2))
+    footer = FooterFactory()
+    scheduler = SchedulerFactory()
+    Dispatch.objects.bulk_create(
+        Dispatch(title=f"Dispatch {n}", subject="Subject", text="word " * 500, send_list=send_list, footer=footer,
+                 scheduler=scheduler)
+        for n in range(count)
+    )
+
+
+class DispatchListViewTests(TestCase):
+
+    def assert_list_queries(self, dispatches: int) -> None:
+        create_dispatches(dispatches)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('dispatch-list'))
+        self.assertContains(response, 'Recipients: 2')
+
+    def test_fixed_queries_with_10_dispatches(self):
+        self.assert_list_queries(10)
+
+    def test_fixed_queries_with_1000_dispatches(self):
+        self.assert_list_queries(1000)
+
+    def test_keyset_pagination(self):
+        create_dispatches(45)
+        newest = list(Dispatch.objects.order_by('-pk').values_list('pk', flat=True))
+
+        first = self.client.get(reverse('dispatch-list'))
+        second = self.client.get(reverse('dispatch-list'), {'before': first.context['next_before']})
+
+        self.assertEqual([d.pk for d in first.context['dispatches']], newest[:30])
+        self.assertEqual([d.pk for d in second.context['dispatches']], newest[30:])
+        self.assertIsNone(second.context['next_before'])
+
+
+class DispatchAdminTests(TestCase):
+
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password'))
+
+    def assert_changelist_queries(self, dispatches: int) -> None:
+        create_dispatches(dispatches)
+        # Session, user, the paginated count and the page itself
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('admin:core_dispatch_changelist'))
+        self.assertContains(response, 'Dispatch 9')
+
+    def test_fixed_queries_with_10_dispatches(self):
+        self.assert_changelist_queries(10)
+
+    def test_fixed_queries_with_1000_dispatches(self):
+        self.assert_changelist_queries(1000)
@@ -0,0 +1,121 @@
+import threading
+import time
+from functools import lru_cache
+
+from django.conf import settings
+
+
+class TokenBucket:
+    """
+    Token bucket refilled at `rate` tokens per second, holding at most one second worth of tokens.
+
+    `rate` adapts between `min_rate` and `max_rate`: it is cut on throttling responses and grows back
+    slowly on successes (additive increase, multiplicative decrease). Not thread-safe on its own.
+    """
+
+    def __init__(self, rate: float, min_ratio: float = 0.1):
+        self.max_rate = rate
+        self.min_rate = rate * min_ratio
+        self.rate = rate
+        self.capacity = max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, moment: float) -> None:
+        if moment > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (moment - self.updated) * self.rate)
+            self.updated = moment
+
+    def reserve(self, moment: float) -> float:
+        """Takes a token, possibly from the future, and returns the seconds to wait before using it."""
+        self._refill(moment)
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def slow_down(self, moment: float, factor: float) -> None:
+        self._refill(moment)
+        self.rate = max(self.min_rate, self.rate * factor)
+        # Drop the saved-up burst as well, otherwise the next messages would go out right away
+        self.tokens = min(self.tokens, 0.0)
+
+    def speed_up(self, moment: float, step: float) -> None:
+        self._refill(moment)
+        self.rate = min(self.max_rate, self.rate + self.max_rate * step)
+
+
+class RateLimiter:
+    """
+    Global and per-recipient-domain token buckets shared by every sender thread of the process.
+
+    Callers `reserve` a slot before each message, report the outcome with `success` or `throttled`,
+    and the time spent waiting for tokens is accumulated in `throttled_seconds`.
+    """
+    # Multiplicative decrease on a throttling response and additive increase after `recovery_after` successes
+    backoff = 0.5
+    recovery = 0.05
+    recovery_after = 50
+
+    def __init__(self, rate: float = 0, domain_rate: float = 0):
+        self.bucket = TokenBucket(rate) if rate else None
+        self.domain_rate = domain_rate
+        self.domain_buckets = {}
+        self.lock = threading.Lock()
+        self.successes = 0
+        self.throttled_seconds = 0.0
+        self.throttle_events = 0
+
+    def _buckets(self, recipient: str) -> list[TokenBucket]:
+        buckets = [self.bucket] if self.bucket else []
+        if self.domain_rate:
+            domain = recipient.rpartition("@")[2].lower()
+            if domain not in self.domain_buckets:
+                self.domain_buckets[domain] = TokenBucket(self.domain_rate)
+            buckets.append(self.domain_buckets[domain])
+        return buckets
+
+    @property
+    def rate(self) -> float | None:
+        """Current global rate in messages per second, None when only domains are limited."""
+        return self.bucket.rate if self.bucket else None
+
+    def reserve(self, recipient: str) -> float:
+        """Reserves a slot for a message to `recipient` and returns how many seconds to wait for it."""
+        with self.lock:
+            moment = time.monotonic()
+            delay = max((bucket.reserve(moment) for bucket in self._buckets(recipient)), default=0.0)
+            self.throttled_seconds += delay
+        return delay
+
+    def wait(self, recipient: str) -> float:
+        """Blocking version of `reserve`, returns the seconds slept."""
+        delay = self.reserve(recipient)
+        if delay:
+            time.sleep(delay)
+        return delay
+
+    def success(self, recipient: str) -> None:
+        with self.lock:
+            self.successes += 1
+            if self.successes >= self.recovery_after:
+                self.successes = 0
+                moment = time.monotonic()
+                for bucket in self._buckets(recipient):
+                    bucket.speed_up(moment, self.recovery)
+
+    def throttled(self, recipient: str) -> None:
+        with self.lock:
+            self.successes = 0
+            self.throttle_events += 1
+            moment = time.monotonic()
+            for bucket in self._buckets(recipient):
+                bucket.slow_down(moment, self.backoff)
+
+
+@lru_cache
+def _rate_limiter(rate: float, domain_rate: float) -> RateLimiter | None:
+    return RateLimiter(rate, domain_rate) if rate or domain_rate else None
+
+
+def get_rate_limiter() -> RateLimiter | None:
+    """Process-wide limiter for the current DISPATCH_RATE_LIMIT settings, None when sending is not limited."""
+    return _rate_limiter(settings.DISPATCH_RATE_LIMIT, settings.DISPATCH_DOMAIN_RATE_LIMIT)
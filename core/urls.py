@@ -7,4 +7,6 @@ urlpatterns = [
     path('<int:pk>/', DispatchDetailView.as_view(), name='dispatch-detail'),
     path('<int:pk>/action/', dispatch_action_view, name='dispatch_action'),
     path('<int:dispatch_id>/stats/', real_time_stats, name='real_time_stats'),
+    path('<int:dispatch_id>/stats/stream/', real_time_stats_stream, name='real_time_stats_stream'),
+    path('metrics', metrics_view, name='metrics'),
 ]
@@ -1,11 +1,21 @@
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.admin.views.decorators import staff_member_required
-from django.http import JsonResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models.functions import Left
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect
 from django.views.decorators.http import require_POST
 from django.views.generic import DetailView
 from django.views.generic import ListView
 
+from .events import delivery_history
+from .metrics import render_metrics
 from .models import Dispatch
+from .stats import broadcaster, dispatch_stats
+from .tasks import enqueue_send
 
 
 @require_POST
@@ -13,28 +23,94 @@ from .models import Dispatch
 def dispatch_action_view(request, pk):
     dispatch = get_object_or_404(Dispatch, pk=pk)
     if 'send_now' in request.POST:
-        dispatch.send()
+        # Sent by `run_send_worker`, the progress shows up in the real-time stats
+        enqueue_send(dispatch)
     elif 'toggle_activation' in request.POST:
         dispatch.toggle_activation()
     return redirect('dispatch-detail', pk=dispatch.pk)
 
 
 def real_time_stats(request, dispatch_id):
-    dispatch = Dispatch.objects.get(pk=dispatch_id)
-    data = {
-        'recipients_count': dispatch.get_recipient_count(),
-        'sent_times': dispatch.sent_times,
-    }
+    data = dispatch_stats(dispatch_id)
+    if data is None:
+        raise Http404("No dispatch found matching the query")
     return JsonResponse(data)
 
 
+def metrics_view(request):
+    """Prometheus scrape endpoint, guarded by a bearer token when METRICS_TOKEN is set."""
+    if settings.METRICS_TOKEN and request.headers.get('Authorization') != f'Bearer {settings.METRICS_TOKEN}':
+        return HttpResponse(status=403)
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def _server_sent_event(stats: dict | None) -> str:
+    # A comment line keeps idle connections open through proxies
+    return f"data: {json.dumps(stats)}\n\n" if stats is not None else ": keep-alive\n\n"
+
+
+async def real_time_stats_stream(request, dispatch_id):
+    """
+    Server-Sent Events stream of the dispatch stats, pushed by the in-process broadcaster.
+
+    Served under ASGI only. A WSGI worker would be held for as long as the page is open,
+    so there a single event is sent and the browser reconnects after DISPATCH_STATS_INTERVAL.
+    """
+    if not isinstance(request, ASGIRequest):
+        stats = await sync_to_async(dispatch_stats)(dispatch_id)
+        if stats is None:
+            raise Http404("No dispatch found matching the query")
+        retry = int(settings.DISPATCH_STATS_INTERVAL * 1000)
+        return HttpResponse(f"retry: {retry}\n{_server_sent_event(stats)}", content_type='text/event-stream')
+
+    if not await Dispatch.objects.filter(pk=dispatch_id).aexists():
+        raise Http404("No dispatch found matching the query")
+
+    async def events():
+        async for stats in broadcaster.subscribe(dispatch_id, keepalive=settings.DISPATCH_STATS_KEEPALIVE):
+            yield _server_sent_event(stats)
+
+    return StreamingHttpResponse(events(), content_type='text/event-stream',
+                                 headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
 class DispatchListView(ListView):
-    model = Dispatch
+    """
+    Dispatch cards, a page at a time with keyset pagination on the id (`?before=<id>`).
+
+    Every page is a single query: the send list (and its recipient counter) is joined in, and
+    instead of the whole `text` only the start shown on the card is read.
+    """
     template_name = 'core/dispatch_list.html'
     context_object_name = 'dispatches'
+    page_size = 30
+
+    def get_queryset(self):
+        # Newest first like Dispatch.Meta.ordering, but by id so that the primary key index serves the keyset
+        dispatches = (Dispatch.objects
+                      .select_related('send_list')
+                      .defer('text')
+                      .annotate(text_preview=Left('text', 300))
+                      .order_by('-pk'))
+        before = self.request.GET.get('before', '')
+        if before.isdigit():
+            dispatches = dispatches.filter(pk__lt=int(before))
+        return dispatches
+
+    def get_context_data(self, **kwargs):
+        dispatches = list(self.object_list[:self.page_size + 1])
+        has_next = len(dispatches) > self.page_size
+        dispatches = dispatches[:self.page_size]
+        kwargs.update(object_list=dispatches, next_before=dispatches[-1].pk if has_next else None)
+        return super().get_context_data(**kwargs)
 
 
 class DispatchDetailView(DetailView):
-    model = Dispatch
+    queryset = Dispatch.objects.select_related('send_list')
     template_name = 'core/dispatch_detail.html'
     context_object_name = 'dispatch'
+
+    def get_context_data(self, **kwargs):
+        # Read from the hourly rollups, never from the raw event log
+        kwargs['history'] = delivery_history(self.object.pk)
+        return super().get_context_data(**kwargs)
@@ -6,4 +6,5 @@ python manage.py migrate --noinput
 echo "Collecting static files..."
 python manage.py collectstatic --noinput
 
-exec gunicorn --bind "0.0.0.0:8000" "mailing_service.wsgi:application"
+# ASGI, so the live stats streams do not hold a worker each
+exec gunicorn --bind "0.0.0.0:8000" --worker-class uvicorn.workers.UvicornWorker "mailing_service.asgi:application"
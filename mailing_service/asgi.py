@@ -0,0 +1,17 @@
+"""
+ASGI config for mailing_service project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+The live dispatch stats stream needs it, under WSGI every viewer would hold a worker.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mailing_service.settings')
+
+application = get_asgi_application()
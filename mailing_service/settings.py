@@ -96,8 +96,12 @@ USE_TZ = True
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # This is for django-cron (must be substituted with celery/celery-beat)
+# `manage.py run_scheduler` (the `scheduler` service in docker-compose) sends dispatches as soon as they are due
+# and does not need this entry
 CRONJOBS = [
-    ('*/5 * * * *', 'django.core.management.call_command', ['send_dispatches'], {}, '>> /logfile.log')
+    ('*/5 * * * *', 'django.core.management.call_command', ['send_dispatches'], {}, '>> /logfile.log'),
+    ('30 3 * * *', 'django.core.management.call_command', ['reconcile_recipient_counts'], {}, '>> /logfile.log'),
+    ('5 * * * *', 'django.core.management.call_command', ['rollup_delivery_events'], {}, '>> /logfile.log'),
 ]
 
 # Email configuration
@@ -109,6 +113,82 @@ EMAIL_FILE_PATH = '/home/var/mailing/emails'
 # For actual sending with SMTP
 # EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
+# Dispatch sending
+# Number of messages pushed through the backend connection per `send_messages` call
+DISPATCH_CHUNK_SIZE = int(os.environ.get('DISPATCH_CHUNK_SIZE', 500))
+# Delivery engine: 'batched' (single connection), 'parallel' (worker pool), 'async' (asyncio SMTP connections)
+# or a dotted path to a callable
+DISPATCH_ENGINE = os.environ.get('DISPATCH_ENGINE', 'batched')
+# Parallel engine: number of workers, each with its own connection, and 'thread' or 'process' pool
+DISPATCH_WORKERS = int(os.environ.get('DISPATCH_WORKERS', 4))
+DISPATCH_POOL = os.environ.get('DISPATCH_POOL', 'thread')
+# Parallel and async engines: upper bound of messages queued for the workers but not sent yet
+DISPATCH_MAX_IN_FLIGHT = int(os.environ.get('DISPATCH_MAX_IN_FLIGHT', 5000))
+# Async engine (requires aiosmtplib, talks to EMAIL_HOST directly): open SMTP connections
+# and concurrent deliveries allowed per recipient domain
+DISPATCH_ASYNC_CONNECTIONS = int(os.environ.get('DISPATCH_ASYNC_CONNECTIONS', 20))
+DISPATCH_ASYNC_PER_HOST_LIMIT = int(os.environ.get('DISPATCH_ASYNC_PER_HOST_LIMIT', 10))
+# Envelope recipients per SMTP transaction. Above 1 a message goes out once to that many Bcc recipients,
+# only use it for lists where everybody gets identical content
+DISPATCH_RECIPIENTS_PER_MESSAGE = int(os.environ.get('DISPATCH_RECIPIENTS_PER_MESSAGE', 1))
+# Rate limiting: messages per second for the whole process and per recipient domain (0 disables),
+# both back off on 421/451 relay responses and recover after successes. A throttled message is
+# retried up to DISPATCH_THROTTLE_RETRIES times. The connection is renewed after
+# DISPATCH_MAX_MESSAGES_PER_CONNECTION messages (0 means never).
+DISPATCH_RATE_LIMIT = float(os.environ.get('DISPATCH_RATE_LIMIT', 0))
+DISPATCH_DOMAIN_RATE_LIMIT = float(os.environ.get('DISPATCH_DOMAIN_RATE_LIMIT', 0))
+DISPATCH_THROTTLE_RETRIES = int(os.environ.get('DISPATCH_THROTTLE_RETRIES', 3))
+DISPATCH_MAX_MESSAGES_PER_CONNECTION = int(os.environ.get('DISPATCH_MAX_MESSAGES_PER_CONNECTION', 0))
+# Delivery outbox: recipients claimed per batch, and seconds after which a claimed batch
+# or a running job without progress is considered abandoned by a dead worker
+DISPATCH_OUTBOX_BATCH_SIZE = int(os.environ.get('DISPATCH_OUTBOX_BATCH_SIZE', 1000))
+DISPATCH_OUTBOX_CLAIM_TIMEOUT = int(os.environ.get('DISPATCH_OUTBOX_CLAIM_TIMEOUT', 600))
+# "Send now" tasks: sends run at once by each `run_send_worker` process, and seconds without
+# a heartbeat after which a running task is considered abandoned by a dead worker and queued again
+SEND_WORKER_CONCURRENCY = int(os.environ.get('SEND_WORKER_CONCURRENCY', 4))
+SEND_TASK_TIMEOUT = int(os.environ.get('SEND_TASK_TIMEOUT', 120))
+# Transient delivery failures are retried up to DISPATCH_RETRY_ATTEMPTS attempts in total, waiting
+# DISPATCH_RETRY_BASE_DELAY seconds doubled on every attempt (with jitter) and at most DISPATCH_RETRY_MAX_DELAY
+DISPATCH_RETRY_ATTEMPTS = int(os.environ.get('DISPATCH_RETRY_ATTEMPTS', 5))
+DISPATCH_RETRY_BASE_DELAY = int(os.environ.get('DISPATCH_RETRY_BASE_DELAY', 60))
+DISPATCH_RETRY_MAX_DELAY = int(os.environ.get('DISPATCH_RETRY_MAX_DELAY', 3600))
+# Hard bounces in a row after which an address is deactivated
+DISPATCH_HARD_BOUNCE_LIMIT = int(os.environ.get('DISPATCH_HARD_BOUNCE_LIMIT', 3))
+# Suppression list: every worker keeps a Bloom filter of the suppressed addresses with SUPPRESSION_ERROR_RATE
+# false positives, checked against the table, and reads new suppressions every SUPPRESSION_REFRESH_INTERVAL seconds
+SUPPRESSION_ERROR_RATE = float(os.environ.get('SUPPRESSION_ERROR_RATE', 0.01))
+SUPPRESSION_REFRESH_INTERVAL = float(os.environ.get('SUPPRESSION_REFRESH_INTERVAL', 5))
+# Coalescing: dispatches due in the same scheduler run that have the same subject and text are sent
+# together, an address on several of their send lists gets the message once
+DISPATCH_COALESCE = bool(int(os.environ.get('DISPATCH_COALESCE', 0)))
+# Load smoothing: the relay takes DISPATCH_RELAY_CAPACITY messages per second. Dispatches of schedulers
+# with a send window are booked into slots of DISPATCH_PACING_SLOT seconds across it instead of sent at once
+DISPATCH_RELAY_CAPACITY = float(os.environ.get('DISPATCH_RELAY_CAPACITY', 100))
+DISPATCH_PACING_SLOT = int(os.environ.get('DISPATCH_PACING_SLOT', 60))
+# Scheduler nodes (`run_scheduler`, `send_dispatches`) send a heartbeat every CLUSTER_HEARTBEAT_INTERVAL seconds
+# and split the dispatches on a hash ring, a node silent for CLUSTER_NODE_TIMEOUT seconds leaves the ring
+CLUSTER_HEARTBEAT_INTERVAL = float(os.environ.get('CLUSTER_HEARTBEAT_INTERVAL', 10))
+CLUSTER_NODE_TIMEOUT = int(os.environ.get('CLUSTER_NODE_TIMEOUT', 30))
+CLUSTER_RING_REPLICAS = int(os.environ.get('CLUSTER_RING_REPLICAS', 64))
+# Address imports (`import_emails` command and the send list admin upload): rows written per batch
+IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', 5000))
+# Live stats stream: seconds between reads of a watched dispatch's stats (one read per dispatch,
+# not per viewer) and seconds of silence after which a keep-alive comment is sent
+DISPATCH_STATS_INTERVAL = float(os.environ.get('DISPATCH_STATS_INTERVAL', 1))
+DISPATCH_STATS_KEEPALIVE = float(os.environ.get('DISPATCH_STATS_KEEPALIVE', 15))
+# Delivery event log: events are written in bulk every DELIVERY_EVENT_BUFFER_SIZE events or
+# DELIVERY_EVENT_FLUSH_INTERVAL seconds. `rollup_delivery_events` keeps monthly partitions created
+# DELIVERY_EVENT_PARTITIONS_AHEAD months ahead (PostgreSQL) and drops events older than the retention
+DELIVERY_EVENT_BUFFER_SIZE = int(os.environ.get('DELIVERY_EVENT_BUFFER_SIZE', 5000))
+DELIVERY_EVENT_FLUSH_INTERVAL = float(os.environ.get('DELIVERY_EVENT_FLUSH_INTERVAL', 5))
+DELIVERY_EVENT_PARTITIONS_AHEAD = int(os.environ.get('DELIVERY_EVENT_PARTITIONS_AHEAD', 2))
+DELIVERY_EVENT_RETENTION_DAYS = int(os.environ.get('DELIVERY_EVENT_RETENTION_DAYS', 90))
+# Metrics: every process adds its counters to the database every METRICS_FLUSH_INTERVAL seconds,
+# /metrics serves the totals and requires "Authorization: Bearer <METRICS_TOKEN>" when a token is set
+METRICS_ENABLED = bool(int(os.environ.get('METRICS_ENABLED', 1)))
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 15))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -118,6 +198,9 @@ LOGGING = {
             'class': 'logging.FileHandler',
             'filename': 'debug.log',
         },
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
     },
     'loggers': {
         'django': {
@@ -125,5 +208,10 @@ LOGGING = {
             'level': 'ERROR',
             'propagate': True,
         },
+        # Send summaries are logged as one JSON object per line
+        'core': {
+            'handlers': ['console'],
+            'level': os.environ.get('LOG_LEVEL', 'INFO'),
+        },
     },
 }
@@ -1,13 +1,16 @@
-function updateRealTimeStats() {
-    $.ajax({
-        url: "{% url 'real_time_stats' dispatch.pk %}",
-        success: function (data) {
-            $('#recipients_count_id').text(data.recipients_count);
-            $('#sent_times_count_id').text(data.sent_times);
-        }
-    });
+function updateRealTimeStats(data) {
+    $('#recipients_count_id').text(data.recipients_count);
+    $('#sent_times_count_id').text(data.sent_times);
+    $('#sent_count_id').text(data.sent);
+    $('#failed_count_id').text(data.failed);
+    $('#in_progress_count_id').text(data.in_progress);
+    $('#send_status_id').text(data.status || '-');
 }
 
 $(document).ready(function () {
-    setInterval(updateRealTimeStats, 5000);  // Update stats every 5 seconds
-});
\ No newline at end of file
+    // Stats are pushed by the server as they change, EventSource reconnects by itself when the stream drops
+    const source = new EventSource($('#real_time_stats_id').data('stream-url'));
+    source.onmessage = function (event) {
+        updateRealTimeStats(JSON.parse(event.data));
+    };
+});